@@ -0,0 +1,362 @@
+"""
+Alpha-beta engine: negamax with iterative deepening, aspiration windows, a
+transposition table keyed by the Zobrist key and quiescence search on
+captures. Moves are ordered hash move first, then captures by MVV-LVA,
+then killer moves, then the rest by the history heuristic.
+
+It plays through the same interface as Mct, so either can drive a game or
+check the other's choice on the same position:
+
+    engine = AlphaBeta(state, render=False)
+    engine.time_limit = 1.0
+    move = engine.search()
+    print(engine.report())
+
+Scores are in hundredths of a pawn from the side to move, read from the
+running evaluation of SearchBoard (see evaluate.py). Checkmate and
+stalemate both lose, as everywhere else in this repo, and a position that
+repeats on the search path is a draw.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from attack import in_check
+from board import COLS, SQUARES
+from rollout import mvv_lva
+from state import SearchBoard, State, side_of
+from tree import encode_move
+from visutalize import Visualize
+
+MATE = 100000
+INFINITY = MATE + 1
+# 超过这个分数的都是杀棋, 存入置换表时按层数换算
+MATE_BOUND = MATE - 1000
+MAX_DEPTH = 64
+# 期望窗口的半宽, 单位同估值
+ASPIRATION = 50
+# 每搜这么多个节点看一次时间
+TIME_CHECK = 1024
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def _to_table(score, ply):
+    # 杀棋分数存成相对当前节点的步数, 在别的路径上取出时仍然正确
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _from_table(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class AlphaBeta:
+    def __init__(self, state: State, table_bits=18, render=True):
+        """
+        `table_bits` sets the transposition table to 2 ** table_bits entries,
+        each slot keeping the latest position hashed to it.
+        """
+        self.render = render
+        self.render_state(state)
+        self.root_state = state
+        self.table = [None] * (1 << table_bits)
+        self.mask = len(self.table) - 1
+        # 每步默认搜到的深度; time_limit (秒) 设置后按时间迭代加深
+        self.depth = 4
+        self.time_limit = None
+        self.history = [0] * (SQUARES * SQUARES)
+        self.killers = [[None, None] for _ in range(MAX_DEPTH + 1)]
+        self.last_move = None
+        self.score = 0
+        self.nodes = 0
+        self.search_time = 0.0
+        # 每轮迭代的 (深度, 分数, 节点数, 用时)
+        self.iterations = []
+        self._deadline = None
+        self._should_stop = None
+
+    def render_state(self, state: State):
+        if self.render:
+            Visualize.render_board_with_state(state.state)
+
+    @property
+    def state(self) -> State:
+        return self.root_state
+
+    @property
+    def nps(self):
+        return self.nodes / self.search_time if self.search_time else 0.0
+
+    def search(self, depth=None, time_limit=None, progress=None, should_stop=None):
+        """
+        Searches the root by iterative deepening and returns the best move,
+        or None if there is none. Stops after `depth` plies or, with
+        `time_limit`, when the time is up, keeping the result of the last
+        finished iteration; without either, self.time_limit and then
+        self.depth apply. `progress(best_move, nodes)` is called after every
+        iteration. `should_stop`, polled like the deadline, ends the search
+        early from outside; the first iteration always finishes.
+        """
+        if depth is None and time_limit is None:
+            time_limit = self.time_limit
+            if time_limit is None:
+                depth = self.depth
+        if depth is None:
+            depth = MAX_DEPTH
+        start = time.time()
+        self.nodes = 0
+        self.iterations = []
+        self.killers = [[None, None] for _ in range(MAX_DEPTH + 1)]
+        # 历史表跨步保留, 但逐步衰减
+        self.history = [value >> 2 for value in self.history]
+        best, score = None, 0
+        for current in range(1, min(depth, MAX_DEPTH) + 1):
+            # 第一轮总要搜完, 保证有棋可走
+            self._deadline = None if time_limit is None or current == 1 else start + time_limit
+            self._should_stop = None if current == 1 else should_stop
+            try:
+                move, score = self._aspiration(current, score)
+            except SearchTimeout:
+                break
+            if move is None:
+                break
+            best = move
+            self.iterations.append((current, score, self.nodes, time.time() - start))
+            if progress is not None:
+                progress(best, self.nodes)
+            if abs(score) > MATE_BOUND:
+                break
+            if time_limit is not None and time.time() - start >= time_limit:
+                break
+        self._deadline = None
+        self._should_stop = None
+        self.score = score
+        self.search_time = time.time() - start
+        return best
+
+    def report(self):
+        """
+        One line per finished iteration: depth, score, nodes and nodes/sec.
+        """
+        lines = []
+        for depth, score, nodes, elapsed in self.iterations:
+            rate = nodes / elapsed if elapsed else 0
+            lines.append(
+                f"depth {depth:2d} score {score:6d} nodes {nodes:9d} "
+                f"time {elapsed:6.2f}s {rate:9.0f} nodes/s"
+            )
+        return "\n".join(lines)
+
+    def _aspiration(self, depth, guess):
+        # 先在上一轮分数附近的窄窗口里搜, 落到窗口外再放宽重搜
+        if depth == 1:
+            return self._root(depth, -INFINITY, INFINITY)
+        delta = ASPIRATION
+        alpha, beta = guess - delta, guess + delta
+        while True:
+            move, score = self._root(depth, alpha, beta)
+            if score <= alpha:
+                alpha = -INFINITY if delta > 4 * ASPIRATION else score - delta
+            elif score >= beta:
+                beta = INFINITY if delta > 4 * ASPIRATION else score + delta
+            else:
+                return move, score
+            delta *= 2
+
+    def _root(self, depth, alpha, beta):
+        board = SearchBoard(self.root_state)
+        entry = self.table[board.key & self.mask]
+        hash_move = entry[4] if entry is not None and entry[0] == board.key else None
+        side = side_of(board.player)
+        best, best_move = -INFINITY, None
+        path = {board.key}
+        original = alpha
+        for move in self._order(board, list(board.moves()), hash_move, 0):
+            undo = board.make_move(move)
+            if in_check(board.board, board.generals, side):
+                board.unmake_move(undo)
+                continue
+            score = -self._negamax(board, depth - 1, -beta, -alpha, 1, path)
+            board.unmake_move(undo)
+            if score > best:
+                best, best_move = score, move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+        if best_move is None:
+            return None, -MATE
+        self._store(board.key, depth, original, beta, best, best_move, 0)
+        return best_move, best
+
+    def _negamax(self, board: SearchBoard, depth, alpha, beta, ply, path):
+        self._count()
+        key = board.key
+        if key in path:
+            return 0
+        if depth <= 0 or ply >= MAX_DEPTH:
+            return self._quiesce(board, alpha, beta, ply)
+        entry = self.table[key & self.mask]
+        hash_move = None
+        if entry is not None and entry[0] == key:
+            _, stored_depth, flag, stored, hash_move = entry
+            if stored_depth >= depth:
+                stored = _from_table(stored, ply)
+                if flag == EXACT:
+                    return stored
+                if flag == LOWER and stored >= beta:
+                    return stored
+                if flag == UPPER and stored <= alpha:
+                    return stored
+        side = side_of(board.player)
+        cells = board.board
+        best, best_move = -INFINITY, None
+        original = alpha
+        path.add(key)
+        for move in self._order(board, list(board.moves()), hash_move, ply):
+            undo = board.make_move(move)
+            if in_check(board.board, board.generals, side):
+                board.unmake_move(undo)
+                continue
+            score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1, path)
+            board.unmake_move(undo)
+            if score > best:
+                best, best_move = score, move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if not cells[move[2] * COLS + move[3]]:
+                    self._quiet_cutoff(move, depth, ply)
+                break
+        path.discard(key)
+        if best_move is None:
+            # 被将死或困毙, 越晚越好
+            return -MATE + ply
+        self._store(key, depth, original, beta, best, best_move, ply)
+        return best
+
+    def _quiesce(self, board: SearchBoard, alpha, beta, ply):
+        """
+        Searches captures only until the position is quiet, so the static
+        evaluation is never read in the middle of an exchange.
+        """
+        self._count()
+        best = board.player * board.score
+        if best >= beta:
+            return best
+        if best > alpha:
+            alpha = best
+        cells = board.board
+        captures = [(mvv_lva(cells, move), move) for move in board.moves()]
+        captures = sorted((item for item in captures if item[0]), reverse=True)
+        side = side_of(board.player)
+        for _, move in captures:
+            undo = board.make_move(move)
+            if in_check(board.board, board.generals, side):
+                board.unmake_move(undo)
+                continue
+            score = -self._quiesce(board, -beta, -alpha, ply + 1)
+            board.unmake_move(undo)
+            if score > best:
+                best = score
+            if score >= beta:
+                break
+            if score > alpha:
+                alpha = score
+        return best
+
+    def _count(self):
+        self.nodes += 1
+        if self.nodes % TIME_CHECK:
+            return
+        if self._deadline is not None and time.time() >= self._deadline:
+            raise SearchTimeout
+        if self._should_stop is not None and self._should_stop():
+            raise SearchTimeout
+
+    def _store(self, key, depth, alpha, beta, score, move, ply):
+        if score <= alpha:
+            flag = UPPER
+        elif score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table[key & self.mask] = (key, depth, flag, _to_table(score, ply), move)
+
+    def _quiet_cutoff(self, move, depth, ply):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1], killers[0] = killers[0], move
+        self.history[encode_move(move)] += depth * depth
+
+    def _order(self, board: SearchBoard, moves, hash_move, ply):
+        cells = board.board
+        killers = self.killers[ply]
+        history = self.history
+
+        def priority(move):
+            if move == hash_move:
+                return 3, 0
+            capture = mvv_lva(cells, move)
+            if capture:
+                return 2, capture
+            if move in killers:
+                return 1, -killers.index(move)
+            return 0, history[encode_move(move)]
+
+        moves.sort(key=priority, reverse=True)
+        return moves
+
+    def do_best_move(self, progress=None, should_stop=None):
+        if self.root_state.is_terminal():
+            return None
+        move = self.search(progress=progress, should_stop=should_stop)
+        if move is None:
+            return None
+        self.last_move = move
+        state = self.root_state.apply_move(move[:2], move[2:])
+        self.root_state = state
+        self.render_state(state)
+        return state
+
+    def do_human_move(self, from_pos, to_pos):
+        # 置换表按局面 key 存, 换根后之前搜过的结果照样可用
+        state = self.root_state.apply_move(from_pos, to_pos)
+        self.root_state = state
+        self.render_state(state)
+        return state
+
+
+def main(argv=None):
+    from perft import reference_state
+
+    parser = argparse.ArgumentParser(description="Alpha-beta search report")
+    parser.add_argument("--depth", type=int, default=None)
+    parser.add_argument("--time", type=float, default=None, help="seconds per search")
+    parser.add_argument("--position", default="midgame")
+    args = parser.parse_args(argv)
+    engine = AlphaBeta(reference_state(args.position), render=False)
+    if args.depth is None and args.time is None:
+        args.time = 2.0
+    move = engine.search(depth=args.depth, time_limit=args.time)
+    print(engine.report())
+    print(f"best move {move} score {engine.score} ({engine.nps:.0f} nodes/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
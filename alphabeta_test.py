@@ -0,0 +1,76 @@
+import unittest
+
+from alphabeta import MATE_BOUND, AlphaBeta
+from perft import reference_state
+from state import SearchBoard
+from testutil import make_state
+
+
+# 红车守住第 8 行, 另一只红车沉底将死黑帅 (或封住第 5 列困毙)
+MATE_IN_ONE = {(0, 3): "红帅", (8, 0): "红车", (7, 8): "红车", (9, 4): "黑帅"}
+
+
+class AlphaBetaTest(unittest.TestCase):
+    def test_finds_mate_in_one(self):
+        state = make_state(MATE_IN_ONE, -1)
+        engine = AlphaBeta(state, render=False)
+        x, y, nx, ny = engine.search(depth=3)
+        self.assertTrue(state.apply_move((x, y), (nx, ny)).is_terminal())
+        self.assertGreater(engine.score, MATE_BOUND)
+        # 第 2 层看到对方无棋可走, 不再加深
+        self.assertEqual(engine.iterations[-1][0], 2)
+
+    def test_wins_hanging_piece(self):
+        # 黑车无人保护, 红车可以白吃
+        state = make_state(
+            {(0, 4): "红帅", (2, 0): "红车", (2, 8): "黑车", (9, 3): "黑帅"}, -1
+        )
+        engine = AlphaBeta(state, render=False)
+        self.assertEqual(engine.search(depth=2), (2, 0, 2, 8))
+
+    def test_quiescence_sees_recapture(self):
+        # 吃兵会被黑车吃回, 一层搜索加静态搜索也不该贪
+        state = make_state(
+            {(0, 4): "红帅", (2, 0): "红车", (5, 0): "黑兵", (9, 0): "黑车", (9, 3): "黑帅"},
+            -1,
+        )
+        engine = AlphaBeta(state, render=False)
+        self.assertNotEqual(engine.search(depth=1), (2, 0, 5, 0))
+
+    def test_deterministic(self):
+        moves = set()
+        for _ in range(2):
+            engine = AlphaBeta(reference_state("midgame"), render=False)
+            moves.add(engine.search(depth=3))
+        self.assertEqual(len(moves), 1)
+        self.assertIn(moves.pop(), SearchBoard(reference_state("midgame")).legal_moves())
+
+    def test_time_limit(self):
+        engine = AlphaBeta(reference_state("initial"), render=False)
+        reports = []
+        move = engine.search(time_limit=0.3, progress=lambda m, nodes: reports.append(nodes))
+        self.assertIsNotNone(move)
+        self.assertLess(engine.search_time, 1.0)
+        self.assertEqual(len(reports), len(engine.iterations))
+        self.assertGreater(engine.nps, 0)
+        self.assertIn("nodes/s", engine.report())
+
+    def test_should_stop(self):
+        # 叫停后只留下必定搜完的第一轮
+        engine = AlphaBeta(reference_state("initial"), render=False)
+        move = engine.search(depth=10, should_stop=lambda: True)
+        self.assertIsNotNone(move)
+        self.assertEqual(len(engine.iterations), 1)
+
+    def test_plays_moves(self):
+        engine = AlphaBeta(reference_state("midgame"), render=False)
+        engine.depth = 2
+        state = engine.do_best_move()
+        x, y, nx, ny = engine.last_move
+        self.assertEqual(state, reference_state("midgame").apply_move((x, y), (nx, ny)))
+        x, y, nx, ny = SearchBoard(state).legal_moves()[0]
+        self.assertEqual(engine.do_human_move((x, y), (nx, ny)), engine.state)
+        self.assertEqual(engine.state.player, reference_state("midgame").player)
+
+
+unittest.main()
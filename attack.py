@@ -0,0 +1,112 @@
+"""
+Attack detection on the compact board.
+Every lookup starts from the attacked square and walks the moves backwards,
+so a check test costs a few ray walks instead of a full move generation.
+"""
+
+from board import BLACK, COLS, SQUARES, Kind
+from pieces_move import (
+    ELEPHANT_TABLE,
+    GENERAL_TABLE,
+    GURDIAN_TABLE,
+    HORSE_TABLE,
+    MINION_TABLE,
+    RAYS,
+)
+
+
+def _reverse_steps(table):
+    reverse = [[] for _ in range(16)]
+    for color in (0, BLACK):
+        targets = [[] for _ in range(SQUARES)]
+        for src in range(SQUARES):
+            for dst in table[color][src]:
+                targets[dst].append(src)
+        reverse[color] = [tuple(srcs) for srcs in targets]
+    return reverse
+
+
+def _reverse_blocked(table):
+    reverse = [[] for _ in range(16)]
+    for color in (0, BLACK):
+        targets = [[] for _ in range(SQUARES)]
+        for src in range(SQUARES):
+            for dst, block in table[color][src]:
+                targets[dst].append((src, block))
+        reverse[color] = [tuple(entries) for entries in targets]
+    return reverse
+
+
+# 按攻击方颜色索引: 格子 -> 能走到这个格子的起点 (以及蹩腿/塞眼的格子)
+REVERSE_MINION = _reverse_steps(MINION_TABLE)
+REVERSE_GURDIAN = _reverse_steps(GURDIAN_TABLE)
+REVERSE_GENERAL = _reverse_steps(GENERAL_TABLE)
+REVERSE_HORSE = _reverse_blocked(HORSE_TABLE)
+REVERSE_ELEPHANT = _reverse_blocked(ELEPHANT_TABLE)
+
+
+def is_attacked(board, sq, by_color):
+    """
+    Whether a piece of color bit `by_color` could capture on `sq`.
+    """
+    car = by_color | Kind.CAR
+    cannon = by_color | Kind.CANNON
+    for ray in RAYS[sq]:
+        screen = False
+        for s in ray:
+            code = board[s]
+            if not code:
+                continue
+            if not screen:
+                if code == car:
+                    return True
+                screen = True
+            else:
+                if code == cannon:
+                    return True
+                break
+
+    horse = by_color | Kind.HORSE
+    for src, leg in REVERSE_HORSE[by_color][sq]:
+        if board[src] == horse and not board[leg]:
+            return True
+    minion = by_color | Kind.MINION
+    for src in REVERSE_MINION[by_color][sq]:
+        if board[src] == minion:
+            return True
+    general = by_color | Kind.GENERAL
+    for src in REVERSE_GENERAL[by_color][sq]:
+        if board[src] == general:
+            return True
+    gurdian = by_color | Kind.GURDIAN
+    for src in REVERSE_GURDIAN[by_color][sq]:
+        if board[src] == gurdian:
+            return True
+    elephant = by_color | Kind.ELEPHANT
+    for src, eye in REVERSE_ELEPHANT[by_color][sq]:
+        if board[src] == elephant and not board[eye]:
+            return True
+    return False
+
+
+def generals_facing(board, generals):
+    """
+    Whether both generals stand on one file with nothing between them.
+    """
+    red, black = generals
+    if red < 0 or black < 0 or red % COLS != black % COLS:
+        return False
+    return not any(board[sq] for sq in range(red + COLS, black, COLS))
+
+
+def in_check(board, generals, side):
+    """
+    Whether the general of `side` (0 red, 1 black) is attacked or faces the
+    other general. A side that has lost its general counts as in check.
+    """
+    sq = generals[side]
+    if sq < 0:
+        return True
+    if is_attacked(board, sq, 0 if side else BLACK):
+        return True
+    return generals_facing(board, generals)
@@ -0,0 +1,58 @@
+import unittest
+
+from attack import generals_facing, in_check, is_attacked
+from board import BLACK
+from testutil import make_state
+
+
+class AttackTest(unittest.TestCase):
+    def test_generals_facing(self):
+        state = make_state({(0, 4): "红帅", (9, 4): "黑帅"}, -1)
+        self.assertTrue(generals_facing(state.board, state.generals))
+        self.assertTrue(state.in_check())
+        # 走开一格就不再照面, 但不能走回同一条线
+        legal = {
+            (child.generals[0] // 9, child.generals[0] % 9)
+            for child in state.get_legal_moves()
+        }
+        self.assertEqual(legal, {(0, 3), (0, 5)})
+        state = make_state({(0, 4): "红帅", (5, 4): "黑兵", (9, 4): "黑帅"}, -1)
+        self.assertFalse(generals_facing(state.board, state.generals))
+
+    def test_horse_and_cannon_attacks(self):
+        state = make_state(
+            {(0, 3): "红帅", (9, 4): "黑帅", (7, 3): "红马", (2, 4): "红炮"}, 1
+        )
+        # 马 (7,3) 可以跳到 (9,4), 炮前没有炮架
+        self.assertTrue(is_attacked(state.board, 9 * 9 + 4, 0))
+        state = make_state(
+            {(0, 3): "红帅", (9, 4): "黑帅", (7, 3): "红马", (8, 3): "黑士"}, 1
+        )
+        self.assertFalse(in_check(state.board, state.generals, 1))
+        state = make_state(
+            {(0, 3): "红帅", (9, 4): "黑帅", (2, 4): "红炮", (5, 4): "红兵"}, 1
+        )
+        self.assertTrue(state.in_check())
+        self.assertFalse(is_attacked(state.board, 9 * 9 + 3, 0))
+        self.assertTrue(is_attacked(state.board, 9 * 9 + 4, 0))
+        self.assertFalse(is_attacked(state.board, 9 * 9 + 4, BLACK))
+
+    def test_checkmate(self):
+        state = make_state(
+            {(0, 3): "红帅", (9, 4): "黑帅", (8, 0): "红车", (9, 8): "红车"}, 1
+        )
+        self.assertTrue(state.in_check())
+        self.assertTrue(state.is_checkmate())
+        self.assertTrue(state.is_terminal())
+        self.assertEqual(state.get_result(), -1)
+        self.assertEqual(state.get_legal_moves(), [])
+
+    def test_stalemate(self):
+        # 黑帅在 (9,3) 没有被将, 但走 (8,3) 被车吃, 走 (9,4) 与红帅照面
+        state = make_state({(0, 4): "红帅", (9, 3): "黑帅", (8, 8): "红车"}, 1)
+        self.assertFalse(state.in_check())
+        self.assertTrue(state.is_stalemate())
+        self.assertEqual(state.get_result(), -1)
+
+
+unittest.main()
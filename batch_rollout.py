@@ -0,0 +1,248 @@
+"""
+Lockstep batched random playouts over NumPy board arrays.
+
+All geometric move candidates (piece code, from, to, squares in between) are
+listed once. For a batch of N boards one ply is then:
+  * the squares of the (at most 16) pieces of the side to move,
+  * a gather of their candidate moves and of the squares in between,
+  * a masked random argmax to pick one pseudo-legal move per board,
+  * a scatter to apply the chosen moves.
+Games end when a general is captured, which includes the flying general
+capture when both generals face each other on an open file.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from board import BLACK, COLS, ROWS, SQUARES, Kind
+from pieces_move import (
+    ELEPHANT_TABLE,
+    GENERAL_TABLE,
+    GURDIAN_TABLE,
+    HORSE_TABLE,
+    MINION_TABLE,
+    RAYS,
+)
+
+RAY_LENGTH = max(ROWS, COLS) - 1
+# 一方最多两车两炮一将
+SLIDERS = 5
+
+_tables = None
+
+
+def _candidates():
+    codes, srcs, dsts, blocks, rays, cannon, general_only = [], [], [], [], [], [], []
+
+    def add(code, src, dst, block=SQUARES, ray=0, is_cannon=False, captures_general=False):
+        codes.append(code)
+        srcs.append(src)
+        dsts.append(dst)
+        blocks.append(block)
+        rays.append(ray)
+        cannon.append(is_cannon)
+        general_only.append(captures_general)
+
+    for color in (0, BLACK):
+        for sq in range(SQUARES):
+            for kind, table in (
+                (Kind.MINION, MINION_TABLE),
+                (Kind.GURDIAN, GURDIAN_TABLE),
+                (Kind.GENERAL, GENERAL_TABLE),
+            ):
+                for dst in table[color][sq]:
+                    add(color | kind, sq, dst)
+            for kind, table in (
+                (Kind.HORSE, HORSE_TABLE),
+                (Kind.ELEPHANT, ELEPHANT_TABLE),
+            ):
+                for dst, block in table[color][sq]:
+                    add(color | kind, sq, dst, block)
+            for index, ray in enumerate(RAYS[sq]):
+                for distance, dst in enumerate(ray):
+                    # 射线上前 distance 格的占用数, 见 pseudo_legal_moves
+                    ray_index = index * (RAY_LENGTH + 1) + distance
+                    add(color | Kind.CAR, sq, dst, ray=ray_index)
+                    add(color | Kind.CANNON, sq, dst, ray=ray_index, is_cannon=True)
+                    # 将帅照面时可以直接飞将吃掉对方
+                    if index < 2:
+                        add(
+                            color | Kind.GENERAL,
+                            sq,
+                            dst,
+                            ray=ray_index,
+                            captures_general=True,
+                        )
+
+    # 每个 (棋子编码, 起点) 的候选走法下标, 用 -1 补齐到同样长度
+    per_piece = [[[] for _ in range(SQUARES)] for _ in range(16)]
+    for i, (code, src) in enumerate(zip(codes, srcs)):
+        per_piece[code][src].append(i)
+    width = max(len(c) for row in per_piece for c in row)
+    by_piece = np.full((16, SQUARES, width), -1, dtype=np.intp)
+    for code, row in enumerate(per_piece):
+        for src, indices in enumerate(row):
+            by_piece[code, src, : len(indices)] = indices
+
+    # 每个格子四条射线上的格子, 用 SQUARES (一个永远为空的格子) 补齐
+    ray_squares = np.full((SQUARES, 4, RAY_LENGTH), SQUARES, dtype=np.intp)
+    for sq in range(SQUARES):
+        for index, ray in enumerate(RAYS[sq]):
+            ray_squares[sq, index, : len(ray)] = ray
+    return {
+        "src": np.array(srcs, dtype=np.intp),
+        "dst": np.array(dsts, dtype=np.intp),
+        "block": np.array(blocks, dtype=np.intp),
+        "ray": np.array(rays, dtype=np.intp),
+        "cannon": np.array(cannon, dtype=bool),
+        "general_only": np.array(general_only, dtype=bool),
+        "by_piece": by_piece,
+        "ray_squares": ray_squares,
+    }
+
+
+def move_tables():
+    """
+    Candidate move arrays, built on first use.
+    """
+    global _tables
+    if _tables is None:
+        _tables = _candidates()
+    return _tables
+
+
+def pseudo_legal_moves(boards, players):
+    """
+    Pseudo-legal moves of the side to move on every board.
+    `boards` is (N, 90) int8 and `players` is (N,) of 1/-1. Returns
+    (candidates, mask), both (N, L): indices into move_tables() and whether
+    each one is playable. Padding entries are masked out.
+    """
+    t = move_tables()
+    n = len(boards)
+    color = np.where(players == 1, BLACK, 0).astype(np.int8)[:, None]
+    occupied = boards != 0
+    own = occupied & ((boards & BLACK) == color)
+
+    # 每个棋盘最多 16 个本方棋子, 把它们的格子排到前面,
+    # 其中车、炮、将(最多 5 个, 需要射线)排在最前面
+    kinds = boards & 7
+    sliding = (kinds == Kind.CAR) | (kinds == Kind.CANNON) | (kinds == Kind.GENERAL)
+    order = np.where(own, np.where(sliding, 0, 1), 2).astype(np.int8)
+    squares = np.argsort(order, axis=1, kind="stable")[:, :16]
+    present = np.take_along_axis(own, squares, axis=1)
+    codes = np.take_along_axis(boards, squares, axis=1).astype(np.intp)
+    candidates = t["by_piece"].reshape(16 * SQUARES, -1)[codes * SQUARES + squares]
+    candidates[~present] = -1
+    mask = candidates >= 0
+    candidates = np.where(mask, candidates, 0)
+
+    # 下面都用展平后的 take, 比多维花式索引快得多
+    padded = np.zeros((n, SQUARES + 1), dtype=np.int8)
+    padded[:, :SQUARES] = occupied
+    padded = padded.ravel()
+    padded_rows = (np.arange(n) * (SQUARES + 1))[:, None]
+    # 沿车炮将的四条射线做前缀和, 得到走到每一格时中间的棋子数.
+    # 其余棋子的候选走法 ray 下标都是 0, 读到的是第一个棋子的 counts[..., 0] == 0
+    on_rays = padded.take(
+        t["ray_squares"][squares[:, :SLIDERS]] + padded_rows[:, :, None, None]
+    )
+    counts = np.zeros(on_rays.shape[:3] + (RAY_LENGTH + 1,), dtype=np.int8)
+    np.cumsum(on_rays, axis=3, out=counts[..., 1:])
+    width = 4 * (RAY_LENGTH + 1)
+    slot = np.arange(squares.shape[1])
+    slot = np.where(slot < SLIDERS, slot, 0)
+    piece_rows = ((np.arange(n)[:, None] * SLIDERS + slot) * width)[:, :, None]
+    blockers = counts.ravel().take(t["ray"][candidates] + piece_rows)
+    candidates = candidates.reshape(n, -1)
+    mask = mask.reshape(n, -1)
+    blockers = blockers.reshape(n, -1) + padded.take(t["block"][candidates] + padded_rows)
+    target = boards.ravel().take(t["dst"][candidates] + (np.arange(n) * SQUARES)[:, None])
+    empty = target == 0
+    enemy = ~empty & ((target & BLACK) != color)
+    clear = blockers == 0
+    plain = clear & (empty | enemy)
+    cannon = (clear & empty) | ((blockers == 1) & enemy)
+    mask &= np.where(t["cannon"][candidates], cannon, plain)
+    general = (target & 7) == Kind.GENERAL
+    mask &= ~t["general_only"][candidates] | (enemy & general & clear)
+    return candidates, mask
+
+
+def _too_many_sliders(boards):
+    kinds = boards & 7
+    sliding = (kinds == Kind.CAR) | (kinds == Kind.CANNON) | (kinds == Kind.GENERAL)
+    black = (boards & BLACK) != 0
+    per_side = np.maximum((sliding & black).sum(axis=1), (sliding & ~black).sum(axis=1))
+    return bool((per_side > SLIDERS).any())
+
+
+class BatchRollout:
+    """
+    Plays N random games in lockstep and returns one result per game:
+    1 if black wins, -1 if red wins, 0 when `max_plies` runs out.
+    """
+
+    def __init__(self, max_plies=200, seed=None):
+        self.max_plies = max_plies
+        self.rng = np.random.default_rng(seed)
+
+    def run(self, boards, players):
+        boards = np.array(boards, dtype=np.int8).reshape(-1, SQUARES)
+        players = np.array(players, dtype=np.int8).reshape(-1)
+        t = move_tables()
+        n = len(boards)
+        results = np.zeros(n, dtype=np.int8)
+        active = np.ones(n, dtype=bool)
+
+        if _too_many_sliders(boards):
+            raise ValueError(f"at most {SLIDERS} cars, cannons and generals per side")
+        # 开始时已经缺将的棋盘直接出结果
+        color = np.where(players == 1, BLACK, 0)
+        own_general = (boards == (color | Kind.GENERAL)[:, None]).any(axis=1)
+        other_general = (boards == ((BLACK - color) | Kind.GENERAL)[:, None]).any(axis=1)
+        results[~own_general] = -players[~own_general]
+        results[~other_general] = players[~other_general]
+        active &= own_general & other_general
+
+        for _ in range(self.max_plies):
+            if not active.any():
+                break
+            live = np.flatnonzero(active)
+            candidates, mask = pseudo_legal_moves(boards[live], players[live])
+            keys = self.rng.random(mask.shape, dtype=np.float32)
+            keys[~mask] = -1
+            pick = keys.argmax(axis=1)
+            picked = np.arange(len(live))
+            has_move = mask[picked, pick]
+            choice = candidates[picked, pick]
+
+            # 没有任何走法的一方判负
+            stuck = live[~has_move]
+            results[stuck] = -players[stuck]
+            active[stuck] = False
+
+            movers = live[has_move]
+            choice = choice[has_move]
+            src, dst = t["src"][choice], t["dst"][choice]
+            captured = boards[movers, dst]
+            boards[movers, dst] = boards[movers, src]
+            boards[movers, src] = 0
+
+            won = (captured & 7) == Kind.GENERAL
+            results[movers[won]] = players[movers[won]]
+            active[movers[won]] = False
+            players[movers] = -players[movers]
+        return results
+
+    def run_states(self, states):
+        boards = np.frombuffer(b"".join(bytes(s.board) for s in states), dtype=np.int8)
+        return self.run(boards.reshape(len(states), SQUARES), [s.player for s in states])
+
+
+def to_array(state) -> np.ndarray:
+    """
+    The board of a State as a (10, 9) int8 array.
+    """
+    return np.frombuffer(bytes(state.board), dtype=np.int8).reshape(ROWS, COLS).copy()
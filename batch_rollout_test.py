@@ -0,0 +1,44 @@
+import random
+import unittest
+
+import numpy as np
+
+from batch_rollout import BatchRollout, move_tables, pseudo_legal_moves
+from perft import reference_state
+from state import SearchBoard
+
+
+class BatchRolloutTest(unittest.TestCase):
+    def test_pseudo_legal_moves_match_search_board(self):
+        tables = move_tables()
+        rng = random.Random(7)
+        for name in ("initial", "midgame", "endgame"):
+            board = SearchBoard(reference_state(name))
+            for _ in range(40):
+                moves = set(board.moves())
+                if not board.valid() or not moves:
+                    break
+                boards = np.frombuffer(bytes(board.board), dtype=np.int8)[None]
+                candidates, mask = pseudo_legal_moves(boards, np.array([board.player]))
+                picked = candidates[0][mask[0] & ~tables["general_only"][candidates[0]]]
+                actual_moves = {
+                    (*divmod(int(tables["src"][i]), 9), *divmod(int(tables["dst"][i]), 9))
+                    for i in picked
+                }
+                self.assertEqual(actual_moves, moves)
+                board.make_move(rng.choice(sorted(moves)))
+
+    def test_run_states(self):
+        states = [reference_state("initial"), reference_state("endgame")] * 8
+        results = BatchRollout(max_plies=50, seed=1).run_states(states)
+        self.assertEqual(results.shape, (16,))
+        self.assertTrue(set(results.tolist()) <= {-1, 0, 1})
+        # 红方走, 黑帅已经不在棋盘上
+        state = reference_state("endgame")
+        board = SearchBoard(state)
+        board.board[8 * 9 + 4] = 0
+        results = BatchRollout(seed=1).run_states([board.to_state()])
+        self.assertEqual(results.tolist(), [-1])
+
+
+unittest.main()
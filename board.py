@@ -0,0 +1,121 @@
+from enum import IntEnum
+
+ROWS, COLS = 10, 9
+SQUARES = ROWS * COLS
+EMPTY_NAME = "一一"
+
+# 一个棋子编码 = 颜色位 | 兵种, 红方颜色位为 0, 黑方为 8, 0 表示空格
+BLACK = 8
+KIND_MASK = 7
+
+
+class Kind(IntEnum):
+    MINION = 1
+    CAR = 2
+    CANNON = 3
+    HORSE = 4
+    ELEPHANT = 5
+    GURDIAN = 6
+    GENERAL = 7
+
+
+class Code(IntEnum):
+    EMPTY = 0
+    RED_MINION = Kind.MINION
+    RED_CAR = Kind.CAR
+    RED_CANNON = Kind.CANNON
+    RED_HORSE = Kind.HORSE
+    RED_ELEPHANT = Kind.ELEPHANT
+    RED_GURDIAN = Kind.GURDIAN
+    RED_GENERAL = Kind.GENERAL
+    BLACK_MINION = BLACK | Kind.MINION
+    BLACK_CAR = BLACK | Kind.CAR
+    BLACK_CANNON = BLACK | Kind.CANNON
+    BLACK_HORSE = BLACK | Kind.HORSE
+    BLACK_ELEPHANT = BLACK | Kind.ELEPHANT
+    BLACK_GURDIAN = BLACK | Kind.GURDIAN
+    BLACK_GENERAL = BLACK | Kind.GENERAL
+
+
+NAME_TO_CODE = {
+    EMPTY_NAME: Code.EMPTY,
+    "红兵": Code.RED_MINION,
+    "红车": Code.RED_CAR,
+    "红炮": Code.RED_CANNON,
+    "红马": Code.RED_HORSE,
+    "红象": Code.RED_ELEPHANT,
+    "红士": Code.RED_GURDIAN,
+    "红帅": Code.RED_GENERAL,
+    "黑兵": Code.BLACK_MINION,
+    "黑车": Code.BLACK_CAR,
+    "黑炮": Code.BLACK_CANNON,
+    "黑马": Code.BLACK_HORSE,
+    "黑象": Code.BLACK_ELEPHANT,
+    "黑士": Code.BLACK_GURDIAN,
+    "黑帅": Code.BLACK_GENERAL,
+}
+CODE_TO_NAME = {int(code): name for name, code in NAME_TO_CODE.items()}
+
+# 子力价值, 以兵为 1; 将帅不计
+KIND_VALUES = {
+    Kind.MINION: 1,
+    Kind.CAR: 9,
+    Kind.CANNON: 4.5,
+    Kind.HORSE: 4,
+    Kind.ELEPHANT: 2,
+    Kind.GURDIAN: 2,
+    Kind.GENERAL: 0,
+}
+# 按棋子编码索引, 空格为 0
+PIECE_VALUES = tuple(KIND_VALUES.get(code & KIND_MASK, 0) for code in range(16))
+
+# 标准开局, 黑方先走
+# fmt: off
+INITIAL_STATE = [
+    ["红车", "红马", "红象", "红士", "红帅", "红士", "红象", "红马", "红车"],
+    ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
+    ["一一", "红炮", "一一", "一一", "一一", "一一", "一一", "红炮", "一一"],
+    ["红兵", "一一", "红兵", "一一", "红兵", "一一", "红兵", "一一", "红兵"],
+    ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
+    ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
+    ["黑兵", "一一", "黑兵", "一一", "黑兵", "一一", "黑兵", "一一", "黑兵"],
+    ["一一", "黑炮", "一一", "一一", "一一", "一一", "一一", "黑炮", "一一"],
+    ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
+    ["黑车", "黑马", "黑象", "黑士", "黑帅", "黑士", "黑象", "黑马", "黑车"],
+]
+# fmt: on
+INITIAL_PLAYER = 1
+
+
+def color_of(player):
+    """
+    Color bit of the side to move, player 1 is black and -1 is red.
+    """
+    return BLACK if player == 1 else 0
+
+
+def square(x, y):
+    return x * COLS + y
+
+
+def coords(sq):
+    return divmod(sq, COLS)
+
+
+def to_board(state_matrix) -> bytearray:
+    """
+    Converts a 10x9 matrix of piece names into a compact 90-cell board.
+    """
+    if len(state_matrix) != ROWS or any(len(row) != COLS for row in state_matrix):
+        raise ValueError(f"board must be {ROWS}x{COLS}")
+    return bytearray(NAME_TO_CODE[name] for row in state_matrix for name in row)
+
+
+def to_matrix(board) -> list[list[str]]:
+    """
+    Converts a compact board back into the matrix of piece names used by the UI.
+    """
+    return [
+        [CODE_TO_NAME[code] for code in board[x * COLS : (x + 1) * COLS]]
+        for x in range(ROWS)
+    ]
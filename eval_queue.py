@@ -0,0 +1,50 @@
+"""
+Batched leaf evaluation for PUCT search.
+
+Searches submit leaf positions with a callback and keep selecting other
+leaves while those are pending, spread apart by virtual loss. Once
+`batch_size` positions are queued, from one search or several sharing the
+queue, they are encoded together and evaluated with one model call.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from model import PolicyValueModel, encode_states, move_priors
+from state import SearchBoard
+from tree import encode_move
+
+
+class EvalQueue:
+    def __init__(self, model: PolicyValueModel, batch_size=32):
+        self.model = model
+        self.batch_size = batch_size
+        self.pending = []
+        self.batches = 0
+        self.positions = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def submit(self, board: SearchBoard, moves, callback):
+        """
+        Queues `board` (not copied, the caller hands it over) with its legal
+        `moves`. `callback(priors, value)` gets the move priors in the order
+        of `moves` and the value from black's point of view.
+        """
+        self.pending.append((board, moves, callback))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        logits, values = self.model.predict(encode_states([board for board, _, _ in pending]))
+        self.batches += 1
+        self.positions += len(pending)
+        for i, (board, moves, callback) in enumerate(pending):
+            codes = np.fromiter((encode_move(move) for move in moves), dtype=np.intp)
+            # 模型的价值从行棋方来看, 换成黑方视角
+            callback(move_priors(logits[i], codes), float(values[i]) * board.player)
@@ -0,0 +1,149 @@
+"""
+Static evaluation of a compact board: material plus piece-square tables.
+Scores are from black's point of view, like the 1 / -1 results of the search:
+positive is good for black.
+
+State and SearchBoard carry the score of their position in `score`, as an
+integer in hundredths of a pawn, and update it with move_score in O(1) the
+same way as the Zobrist key, so reading the evaluation at a rollout ply or a
+search leaf costs nothing.
+"""
+
+import math
+
+from board import BLACK, COLS, PIECE_VALUES, ROWS, SQUARES, Kind
+
+# 子力差为 EVAL_SCALE 个兵时, 缩放后的估值约为 0.76
+EVAL_SCALE = 10.0
+
+
+# 子力位置表, 单位为百分之一个兵, 从红方看: 第 0 行是红方底线, 黑方上下翻转
+# fmt: off
+PIECE_SQUARE_TABLES = {
+    Kind.MINION: [
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, -2, 0, 4, 0, -2, 0, 0],
+        [2, 0, 8, 0, 10, 0, 8, 0, 2],
+        [40, 50, 60, 70, 70, 70, 60, 50, 40],
+        [50, 60, 80, 100, 110, 100, 80, 60, 50],
+        [60, 80, 100, 120, 130, 120, 100, 80, 60],
+        [60, 80, 110, 130, 150, 130, 110, 80, 60],
+        [20, 30, 40, 60, 70, 60, 40, 30, 20],
+    ],
+    Kind.CAR: [
+        [-10, 10, 5, 15, 0, 15, 5, 10, -10],
+        [5, 10, 10, 15, 0, 15, 10, 10, 5],
+        [-5, 10, 5, 15, 15, 15, 5, 10, -5],
+        [5, 10, 10, 15, 20, 15, 10, 10, 5],
+        [10, 15, 15, 20, 20, 20, 15, 15, 10],
+        [10, 20, 20, 25, 25, 25, 20, 20, 10],
+        [10, 15, 15, 25, 30, 25, 15, 15, 10],
+        [5, 15, 15, 25, 20, 25, 15, 15, 5],
+        [10, 25, 15, 30, 40, 30, 15, 25, 10],
+        [5, 10, 10, 25, 30, 25, 10, 10, 5],
+    ],
+    Kind.CANNON: [
+        [0, 0, 5, 10, 10, 10, 5, 0, 0],
+        [0, 5, 5, 0, 0, 0, 5, 5, 0],
+        [5, 5, 5, 10, 20, 10, 5, 5, 5],
+        [0, 0, 0, 0, 5, 0, 0, 0, 0],
+        [0, 0, 5, 0, 10, 0, 5, 0, 0],
+        [0, 0, 0, 0, 10, 0, 0, 0, 0],
+        [0, 5, 5, 10, 15, 10, 5, 5, 0],
+        [5, 5, 5, 10, 20, 10, 5, 5, 5],
+        [5, 10, 5, 0, 10, 0, 5, 10, 5],
+        [10, 10, 0, -10, -10, -10, 0, 10, 10],
+    ],
+    Kind.HORSE: [
+        [0, -10, 0, 0, 0, 0, 0, -10, 0],
+        [0, 0, 0, -10, -20, -10, 0, 0, 0],
+        [5, 5, 10, 10, 0, 10, 10, 5, 5],
+        [5, 10, 15, 15, 15, 15, 15, 10, 5],
+        [5, 15, 20, 20, 20, 20, 20, 15, 5],
+        [10, 20, 20, 25, 25, 25, 20, 20, 10],
+        [10, 25, 25, 30, 30, 30, 25, 25, 10],
+        [10, 20, 30, 35, 30, 35, 30, 20, 10],
+        [5, 15, 25, 30, 20, 30, 25, 15, 5],
+        [0, 10, 10, 10, 10, 10, 10, 10, 0],
+    ],
+    Kind.ELEPHANT: [
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [-5, 0, 0, 0, 10, 0, 0, 0, -5],
+    ] + [[0] * COLS] * 7,
+    Kind.GURDIAN: [
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 10, 0, 0, 0, 0],
+        [0, 0, 0, -5, 0, -5, 0, 0, 0],
+    ] + [[0] * COLS] * 7,
+    Kind.GENERAL: [
+        [0, 0, 0, 0, 5, 0, 0, 0, 0],
+        [0, 0, 0, -10, -10, -10, 0, 0, 0],
+        [0, 0, 0, -20, -20, -20, 0, 0, 0],
+    ] + [[0] * COLS] * 7,
+}
+# fmt: on
+
+
+def _score_table():
+    # SCORE_TABLE[棋子编码][格子] = 这个棋子在这一格对黑方的估值贡献, 整数不会累积误差
+    table = [[0] * SQUARES for _ in range(16)]
+    for kind, rows in PIECE_SQUARE_TABLES.items():
+        value = round(PIECE_VALUES[kind] * 100)
+        for sq in range(SQUARES):
+            x, y = divmod(sq, COLS)
+            table[kind][sq] = -(value + rows[x][y])
+            table[BLACK | kind][sq] = value + rows[ROWS - 1 - x][y]
+    return table
+
+
+SCORE_TABLE = _score_table()
+
+
+def board_score(board) -> int:
+    """
+    Material and piece-square score of a position in hundredths of a pawn,
+    computed from scratch.
+    """
+    return sum(SCORE_TABLE[code][sq] for sq, code in enumerate(board) if code)
+
+
+def move_score(score, board, src, dst) -> int:
+    """
+    Returns the score after moving the piece on `src` to `dst`, in O(1).
+    `board` is the position before the move.
+    """
+    piece = board[src]
+    return (
+        score
+        - SCORE_TABLE[piece][src]
+        + SCORE_TABLE[piece][dst]
+        - SCORE_TABLE[board[dst]][dst]
+    )
+
+
+def evaluate(position) -> float:
+    """
+    Score of a State or SearchBoard in pawns, read from its running total.
+    """
+    return position.score / 100
+
+
+def material(board) -> float:
+    """
+    Black material minus red material, in pawns.
+    """
+    score = 0.0
+    for code in board:
+        if code:
+            score += PIECE_VALUES[code] if code & BLACK else -PIECE_VALUES[code]
+    return score
+
+
+def scaled(score, scale=EVAL_SCALE) -> float:
+    """
+    Maps a score onto (-1, 1) so it can stand in for a game result.
+    """
+    return math.tanh(score / scale)
@@ -0,0 +1,48 @@
+import random
+import unittest
+
+from board import BLACK, COLS, ROWS, SQUARES
+from evaluate import SCORE_TABLE, board_score, evaluate, material
+from perft import reference_state
+from state import SearchBoard
+
+
+class EvaluateTest(unittest.TestCase):
+    def test_initial_position_is_even(self):
+        state = reference_state("initial")
+        self.assertEqual(state.score, 0)
+        self.assertEqual(evaluate(state), 0)
+
+    def test_colors_mirror(self):
+        for code in range(1, 8):
+            for sq in range(SQUARES):
+                x, y = divmod(sq, COLS)
+                mirrored = (ROWS - 1 - x) * COLS + y
+                self.assertEqual(SCORE_TABLE[code][sq], -SCORE_TABLE[BLACK | code][mirrored])
+
+    def test_incremental_score(self):
+        rng = random.Random(11)
+        for name in ("initial", "midgame", "endgame"):
+            state = reference_state(name)
+            board = SearchBoard(state)
+            undos = []
+            for _ in range(60):
+                moves = board.legal_moves()
+                if not moves:
+                    break
+                x, y, nx, ny = move = rng.choice(moves)
+                state = state.apply_move((x, y), (nx, ny))
+                undos.append((board.score, board.make_move(move)))
+                self.assertEqual(state.score, board_score(state.board))
+                self.assertEqual(board.score, state.score)
+            for score, undo in reversed(undos):
+                board.unmake_move(undo)
+                self.assertEqual(board.score, score)
+            self.assertEqual(board.score, reference_state(name).score)
+
+    def test_score_follows_material(self):
+        state = reference_state("midgame")
+        self.assertAlmostEqual(evaluate(state), material(state.board), delta=3)
+
+
+unittest.main()
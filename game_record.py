@@ -0,0 +1,267 @@
+"""
+Compact binary game records. A game file starts with a magic string and
+holds games back to back, each one a small header followed by its moves,
+16 bits each (tree.encode_move, from square * 90 + to square):
+
+    header    uint8 flags, int8 player to move, int8 result,
+              uint16 metadata bytes, uint16 move count
+    board     90 bytes, only with the CUSTOM_START flag; otherwise the
+              game starts from the standard position
+    metadata  UTF-8 JSON, may be empty
+    moves     uint16 each, little endian
+
+Files are only ever appended to. Next to each game file, "<path>.idx" holds
+the byte offset of every game as uint64, so game i is one seek away.
+Results are 1 when black wins, -1 when red wins, 0 for a draw and
+UNKNOWN_RESULT when unknown.
+
+    with GameWriter("games.xqg") as writer:
+        writer.write(state, moves, result=1, metadata={"event": "selfplay"})
+    reader = GameReader("games.xqg")
+    for state in reader[10].states():
+        ...
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+
+from board import INITIAL_PLAYER, INITIAL_STATE, SQUARES, to_board
+from state import State
+from tree import decode_move, encode_move
+
+MAGIC = b"XQGAME1\0"
+RECORD = struct.Struct("<BbbHH")
+CUSTOM_START = 1
+UNKNOWN_RESULT = 127
+INDEX_SUFFIX = ".idx"
+# 不带 CUSTOM_START 的对局从标准开局开始
+INITIAL_BOARD = bytes(to_board(INITIAL_STATE))
+
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+class GameRecord:
+    """
+    One game: start position, 16-bit move codes, result and metadata.
+    """
+
+    __slots__ = ("start", "codes", "result", "metadata")
+
+    def __init__(self, start: State, codes, result=None, metadata=None):
+        self.start = start
+        self.codes = codes
+        self.result = result
+        self.metadata = metadata or {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def moves(self):
+        return [decode_move(code) for code in self.codes]
+
+    def states(self):
+        """
+        Yields the start position and then the position after every move.
+        """
+        state = self.start
+        yield state
+        for code in self.codes:
+            x, y, nx, ny = decode_move(code)
+            state = state.apply_move((x, y), (nx, ny))
+            yield state
+
+
+class GameWriter:
+    """
+    Appends games to a game file and its offset index.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path):
+            # 上次写到一半断掉的对局截掉, 索引按文件重建
+            offsets, end = _scan(path)
+            if end < os.path.getsize(path):
+                os.truncate(path, end)
+            index = index_path(path)
+            if not os.path.exists(index) or os.path.getsize(index) != 8 * len(offsets):
+                np.array(offsets, dtype="<u8").tofile(index)
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._index = open(index_path(path), "ab")
+        self.count = self._index.tell() // 8
+
+    def write(self, start: State, moves, result=None, metadata=None):
+        """
+        Appends a game of `moves` ((x, y, nx, ny) or ((x, y), (nx, ny)))
+        from `start` and returns its number in the file.
+        """
+        codes = np.array(
+            [encode_move(tuple(move[0]) + tuple(move[1]) if len(move) == 2 else move)
+             for move in moves],
+            dtype="<u2",
+        )
+        board = bytes(start.board)
+        custom = board != INITIAL_BOARD or start.player != INITIAL_PLAYER
+        meta = json.dumps(metadata, ensure_ascii=False).encode() if metadata else b""
+        offset = self._file.tell()
+        self._file.write(
+            RECORD.pack(
+                CUSTOM_START if custom else 0,
+                start.player,
+                UNKNOWN_RESULT if result is None else result,
+                len(meta),
+                len(codes),
+            )
+        )
+        if custom:
+            self._file.write(board)
+        self._file.write(meta)
+        self._file.write(codes.tobytes())
+        # 先写完对局再记偏移, 中途断掉时索引里不会有写了一半的对局
+        self._index.write(struct.pack("<Q", offset))
+        self.count += 1
+        return self.count - 1
+
+    def flush(self):
+        self._file.flush()
+        self._index.flush()
+
+    def close(self):
+        self._file.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _read_record(f) -> GameRecord | None:
+    header = f.read(RECORD.size)
+    if len(header) < RECORD.size:
+        return None
+    flags, player, result, meta_size, count = RECORD.unpack(header)
+    board = f.read(SQUARES) if flags & CUSTOM_START else INITIAL_BOARD
+    meta = f.read(meta_size)
+    data = f.read(2 * count)
+    if len(board) < SQUARES or len(meta) < meta_size or len(data) < 2 * count:
+        # 文件末尾写了一半的对局
+        return None
+    return GameRecord(
+        State(bytearray(board), player),
+        np.frombuffer(data, dtype="<u2"),
+        None if result == UNKNOWN_RESULT else result,
+        json.loads(meta) if meta else {},
+    )
+
+
+def _scan(path):
+    # 只读每局的头, 跳过棋步; 返回完整对局的偏移和它们的结尾
+    offsets = []
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a game file")
+        size = os.fstat(f.fileno()).st_size
+        offset = f.tell()
+        while offset + RECORD.size <= size:
+            flags, _, _, meta_size, count = RECORD.unpack(f.read(RECORD.size))
+            end = offset + RECORD.size + meta_size + 2 * count
+            if flags & CUSTOM_START:
+                end += SQUARES
+            if end > size:
+                break
+            offsets.append(offset)
+            offset = end
+            f.seek(offset)
+    return offsets, offset
+
+
+def build_index(path):
+    """
+    Offsets of every complete game in a game file, found by skipping from
+    header to header; rewrites "<path>.idx".
+    """
+    offsets, _ = _scan(path)
+    np.array(offsets, dtype="<u8").tofile(index_path(path))
+    return offsets
+
+
+class GameReader:
+    """
+    Reads a game file: iterate for a stream of games, index for one game.
+    Only the offset index is loaded; games are read as they are asked for.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a game file")
+        if os.path.exists(index_path(path)):
+            self.offsets = np.fromfile(index_path(path), dtype="<u8")
+        else:
+            self.offsets = np.array(build_index(path), dtype="<u8")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index) -> GameRecord:
+        with open(self.path, "rb") as f:
+            f.seek(int(self.offsets[index]))
+            record = _read_record(f)
+        if record is None:
+            raise IndexError(index)
+        return record
+
+    def __iter__(self):
+        with open(self.path, "rb", buffering=1 << 20) as f:
+            f.seek(len(MAGIC))
+            while True:
+                record = _read_record(f)
+                if record is None:
+                    return
+                yield record
+
+    def states(self):
+        """
+        Yields (game number, State) for every position of every game.
+        """
+        for number, record in enumerate(self):
+            for state in record.states():
+                yield number, state
+
+
+def main(argv=None):
+    from selfplay import read_games, record_state
+
+    parser = argparse.ArgumentParser(description="Convert self-play shards to a game file")
+    parser.add_argument("shards", nargs="+")
+    parser.add_argument("--out", default="games.xqg")
+    args = parser.parse_args(argv)
+    with GameWriter(args.out) as writer:
+        for record in read_games(args.shards):
+            metadata = {"game": record["game"], "seed": record["seed"]}
+            writer.write(
+                record_state(record), record["moves"], record["result"], metadata
+            )
+        count = writer.count
+    size = os.path.getsize(args.out)
+    text = sum(os.path.getsize(shard) for shard in args.shards)
+    print(f"{count} games, {size} bytes ({text} bytes of compressed shards)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
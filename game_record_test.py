@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from board import INITIAL_PLAYER, INITIAL_STATE
+from game_record import MAGIC, RECORD, GameReader, GameWriter, build_index, index_path
+from perft import reference_state
+from state import State
+from testutil import random_moves
+from visutalize import MoveSeries
+
+
+class GameRecordTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "games.xqg")
+        initial = State(INITIAL_STATE, INITIAL_PLAYER)
+        self.games = [
+            (initial, random_moves(initial, 40, 1), 1, None),
+            (reference_state("midgame"), random_moves(reference_state("midgame"), 25, 2), None,
+             {"event": "测试", "round": 2}),
+            (initial, [], 0, None),
+        ]
+        with GameWriter(self.path) as writer:
+            for state, moves, result, metadata in self.games:
+                writer.write(state, moves, result, metadata)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        reader = GameReader(self.path)
+        self.assertEqual(len(reader), 3)
+        for record, (state, moves, result, metadata) in zip(reader, self.games):
+            self.assertEqual(record.moves, moves)
+            self.assertEqual(record.result, result)
+            self.assertEqual(record.metadata, metadata or {})
+            expected = state
+            states = list(record.states())
+            self.assertEqual(len(states), len(moves) + 1)
+            self.assertEqual(states[0].key, state.key)
+            for (x, y, nx, ny), replayed in zip(moves, states[1:]):
+                expected = expected.apply_move((x, y), (nx, ny))
+                self.assertEqual(replayed.key, expected.key)
+        self.assertEqual(reader[1].moves, self.games[1][1])
+        self.assertEqual(sum(1 for _ in reader.states()), 40 + 26 + 1 + 1)
+
+    def test_two_bytes_per_move(self):
+        meta = len('{"event": "测试", "round": 2}'.encode())
+        size = len(MAGIC) + 3 * RECORD.size + 90 + meta + 2 * (40 + 25)
+        self.assertEqual(os.path.getsize(self.path), size)
+
+    def test_torn_write(self):
+        with open(self.path, "ab") as f:
+            f.write(RECORD.pack(0, 1, 0, 0, 50) + b"\x01\x02")
+        os.remove(index_path(self.path))
+        self.assertEqual(len(list(GameReader(self.path))), 3)
+        self.assertEqual(len(GameReader(self.path)), 3)
+        with GameWriter(self.path) as writer:
+            self.assertEqual(writer.write(*self.games[0][:3]), 3)
+        reader = GameReader(self.path)
+        self.assertEqual(len(reader), 4)
+        self.assertEqual(reader[3].moves, self.games[0][1])
+        self.assertEqual(build_index(self.path), list(reader.offsets))
+
+    def test_move_series(self):
+        series = MoveSeries(reference_state("midgame"))
+        for x, y, nx, ny in self.games[1][1]:
+            series.add_move(((x, y), (nx, ny)))
+        number = series.save(self.path, result=-1)
+        loaded = MoveSeries.load(self.path, number)
+        self.assertEqual(loaded.move_series, series.move_series)
+        self.assertEqual(loaded.state.key, series.state.key)
+
+
+unittest.main()
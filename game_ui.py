@@ -1,33 +1,85 @@
 from __future__ import annotations
 import sys
+import threading
 from PyQt5.QtWidgets import QApplication, QWidget
 from PyQt5.QtGui import QPixmap, QMouseEvent, QPainter, QColor
-from PyQt5.QtCore import Qt, QTimer, QEventLoop, pyqtSignal
+from PyQt5.QtCore import Qt, QObject, QThread, pyqtSignal, pyqtSlot
 
+from board import INITIAL_PLAYER, INITIAL_STATE
 from state import State, StateMachine
 from mcts import Mct
+from visutalize import Visualize
 
+TITLE = "Chinese Chess - Click Test"
 
-def get_player_move(chessboard: ChessBoard):
-    loop = QEventLoop()
-    move = {}
 
-    def on_move_made(pos):
-        move["action"] = pos
-        loop.quit()
+class SearchWorker(QObject):
+    """
+    Runs the engine in its own thread so the window stays responsive.
+    Everything that touches the Mct happens in this thread; the window
+    only reads mct.state. Results come back through signals. The engine
+    must be built with render=False: the window draws the board image
+    itself, so no other thread writes the file it reads.
+    """
 
-    chessboard.move_made.connect(on_move_made)
-    loop.exec_()  # This will block until loop.quit() is called
+    progress = pyqtSignal(object, int)  # 当前最佳走法, 模拟次数
+    move_ready = pyqtSignal(object)  # AI 的走法, 没有可走的棋时为 None
+    pondering = pyqtSignal(object)  # 后台思考所猜的人类走法
 
-    return move["action"][:2], move["action"][2:]  # from_pos, to_pos
+    def __init__(self, mct: Mct, ponder=True):
+        super().__init__()
+        self.mct = mct
+        # AlphaBeta 引擎没有后台思考
+        self.ponder = ponder and hasattr(mct, "ponder")
+        # 置位时在人类的回合后台思考, 人类落子时由界面线程清除
+        self._pondering = threading.Event()
+        # 关窗时置位, 叫停正在进行的搜索
+        self._shutdown = threading.Event()
+
+    def stop_pondering(self):
+        # 可以在任何线程调用
+        self._pondering.clear()
+
+    def shutdown(self):
+        # 可以在任何线程调用
+        self._shutdown.set()
+        self._pondering.clear()
+
+    @pyqtSlot(object)
+    def play_human_move(self, move):
+        x, y, nx, ny = move
+        self.mct.do_human_move((x, y), (nx, ny))
+        self.think()
+
+    @pyqtSlot()
+    def think(self):
+        state = self.mct.do_best_move(
+            progress=self.progress.emit, should_stop=self._shutdown.is_set
+        )
+        if self._shutdown.is_set():
+            return
+        move = None if state is None else self.mct.last_move
+        if not self.ponder or state is None or state.is_terminal():
+            self.move_ready.emit(move)
+            return
+        # 先置位再通知界面, 人类再快落子也能叫停这次后台思考
+        self._pondering.set()
+        self.move_ready.emit(move)
+        predicted = self.mct.ponder(
+            should_stop=lambda: not self._pondering.is_set(), progress=self.progress.emit
+        )
+        if predicted is not None:
+            self.pondering.emit(predicted)
 
 
 class ChessBoard(QWidget):
     move_made = pyqtSignal(tuple)
+    # 转给后台线程的人类走法 (x, y, nx, ny)
+    human_move = pyqtSignal(object)
 
-    def __init__(self, mct: Mct):
+    def __init__(self, mct: Mct, ponder=True):
         super().__init__()
-        self.setWindowTitle("Chinese Chess - Click Test")
+        self.setWindowTitle(TITLE)
         self.mct = mct
         self.board_pixmap = QPixmap("./imgs/board.png")
         self.setFixedSize(self.board_pixmap.size())  # 设置窗口尺寸为图像大小
@@ -41,8 +93,52 @@ class ChessBoard(QWidget):
 
         self.last_clicked = None
         self.human_action = []
+        self.render_state(mct.state)
+
+        # AI 思考时不接受点击
+        self.engine_busy = False
+        self.worker = SearchWorker(mct, ponder)
+        self.search_thread = QThread()
+        self.worker.moveToThread(self.search_thread)
+        self.human_move.connect(self.worker.play_human_move)
+        self.worker.move_ready.connect(self.on_engine_move)
+        self.worker.progress.connect(self.on_search_progress)
+        self.worker.pondering.connect(self.on_pondering)
+        self.search_thread.start()
+
+    def on_engine_move(self, move):
+        self.engine_busy = False
+        if move is not None:
+            print(f"AI 选择了动作: {move[:2]} -> {move[2:]}")
+        if self.mct.state.is_terminal():
+            self.setWindowTitle(f"{TITLE} - 对局结束")
+        else:
+            self.setWindowTitle(TITLE)
+        self.render_state(self.mct.state)
+        self.update()
+
+    def render_state(self, state: State):
+        # 棋盘图片只在界面线程里写, paintEvent 不会读到写了一半的文件
+        Visualize.render_board_with_state(state.state)
+
+    def on_search_progress(self, move, playouts):
+        stage = "思考中" if self.engine_busy else "后台思考"
+        self.setWindowTitle(f"{TITLE} - {stage}: {move} ({playouts} 次模拟)")
+
+    def on_pondering(self, move):
+        print(f"后台思考猜测的人类走法: {move[:2]} -> {move[2:]}")
+
+    def closeEvent(self, event):
+        # 叫停思考和后台思考, 不必等到这一步的时间用完
+        self.worker.shutdown()
+        self.search_thread.quit()
+        self.search_thread.wait()
+        super().closeEvent(event)
 
     def mousePressEvent(self, event: QMouseEvent):
+        if self.engine_busy:
+            print("AI 正在思考, 请稍候")
+            return
         if event.button() == Qt.LeftButton:
             x, y = event.x(), event.y()
             col = round((x - self.origin_x) / self.cell_width)
@@ -74,24 +170,43 @@ class ChessBoard(QWidget):
             painter.drawEllipse(
                 int(x - radius), int(y - radius), radius * 2, radius * 2
             )
+        self.draw_legal_destinations(painter)
         self.check_and_update_human_action()
 
+    def draw_legal_destinations(self, painter):
+        # 第一次点击后, 标出这个棋子所有的合法落点
+        if len(self.human_action) != 1:
+            return
+        row, col = self.human_action[0]
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(0, 160, 0, 160))
+        radius = 8
+        for nx, ny in self.mct.state.get_moves_from(row, col):
+            x = self.origin_x + ny * self.cell_width
+            y = self.origin_y + nx * self.cell_height
+            painter.drawEllipse(
+                int(x - radius), int(y - radius), radius * 2, radius * 2
+            )
+
     def check_and_update_human_action(self):
         if len(self.human_action) == 2:
             from_pos = (self.human_action[-2][0], self.human_action[-2][1])
             to_pos = (self.human_action[-1][0], self.human_action[-1][1])
             print(f"人类选择了动作: {from_pos} -> {to_pos}")
             legal_moves = StateMachine.get_legal_moves_from_pos(
-                self.mct.cur.state, from_pos, self.mct.cur.state.player
+                self.mct.state, from_pos, self.mct.state.player
             )
             if to_pos in legal_moves:
-                # 更新棋盘状态
-                self.mct.do_human_move(from_pos, to_pos)
+                # 停下后台思考, 由后台线程更新棋盘状态并接着思考 AI 的回应
+                self.engine_busy = True
+                self.worker.stop_pondering()
                 self.human_action = []
                 self.last_clicked = None
-                painter = QPainter(self)
-                painter.drawPixmap(0, 0, self.getCurrentStateImage())
-                self.move_made.emit((from_pos[0], from_pos[1], to_pos[0], to_pos[1]))
+                move = (from_pos[0], from_pos[1], to_pos[0], to_pos[1])
+                self.render_state(self.mct.state.apply_move(from_pos, to_pos))
+                self.human_move.emit(move)
+                self.move_made.emit(move)
+                self.update()
             else:
                 print("非法移动，点击无效")
                 self.human_action = []
@@ -99,65 +214,14 @@ class ChessBoard(QWidget):
 
 
 if __name__ == "__main__":
-
-    # 我希望 get_player_move() 能listen到人类的点击动作
-    # mct = Mct(initial_state)
-
-    # while not mct.cur.state.is_terminal():
-    #     mct.search()
-
-    #     best_node = max(mct.cur.children.values(), key=lambda n: n.visits)
-
-    #     print(f"AI 选择了动作: {best_node.state}")
-
-    #     mct.cur = best_node
-    #     mct.root = mct.cur
-    #     mct.cur.parent = None
-
-    #     opponent_action = get_player_move()
-    #     next_state = best_node.state.apply_move(opponent_action)
-
-    #     for child in mct.cur.children.values():
-    #         if child.state == next_state:
-    #             mct.cur = child
-    #             mct.root = mct.cur
-    #             mct.cur.parent = None
-    #             break
-    #     else:
-    #         mct = Mct(next_state)
-    state = State(
-        [
-            ["红车", "红马", "红象", "红士", "红帅", "红士", "红象", "红马", "红车"],
-            ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
-            ["一一", "红炮", "一一", "一一", "一一", "一一", "一一", "红炮", "一一"],
-            ["红兵", "一一", "红兵", "一一", "红兵", "一一", "红兵", "一一", "红兵"],
-            ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
-            ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
-            ["黑兵", "一一", "黑兵", "一一", "黑兵", "一一", "黑兵", "一一", "黑兵"],
-            ["一一", "黑炮", "一一", "一一", "一一", "一一", "一一", "黑炮", "一一"],
-            ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
-            ["黑车", "黑马", "黑象", "黑士", "黑帅", "黑士", "黑象", "黑马", "黑车"],
-        ],
-        1,
-    )
+    state = State(INITIAL_STATE, INITIAL_PLAYER)
     app = QApplication(sys.argv)
-    mct = Mct(state)
+    # 棋盘图片由界面线程画, 引擎不画
+    mct = Mct(state, render=False)
+    # 按时间搜索, 每步的等待时间固定
+    mct.time_limit = 5.0
 
+    # 人类先走, AI 的回合由 ChessBoard 在人类落子后交给后台线程
     window = ChessBoard(mct)
     window.show()
-
-    def game_loop():
-
-        while not mct.cur.state.is_terminal():
-            # Human turn
-            get_player_move(window)
-            window.update()
-
-            # AI turn
-            mct.search()
-            mct.do_best_move()
-
-            window.update()
-
-    QTimer.singleShot(0, game_loop)  # Start loop after window shows
     sys.exit(app.exec_())
@@ -1,99 +1,540 @@
 from __future__ import annotations
 
-from math import sqrt, log
-from state import State
-import random
+from board import COLS, PIECE_VALUES
+from state import SearchBoard, State
+import math
+import time
+from functools import partial
+
+import numpy as np
+
+from batch_rollout import BatchRollout
+from evaluate import EVAL_SCALE, evaluate, scaled
+from rollout import UniformPolicy
+from tree import ArrayTree
 
 from visutalize import Visualize
 
-inf = float("inf")
+
+# 每隔多少次模拟检查一次能否提前结束
+EARLY_STOP_INTERVAL = 8
+# 搜索进度回调的最短间隔 (秒)
+PROGRESS_INTERVAL = 0.25
+# 随机对局的总步数 (包括重复局面) 最多是 rollout_depth 的几倍
+ROLLOUT_PLY_FACTOR = 4
+# 搜索参数, 多进程搜索时复制给每个 worker
+SEARCH_SETTINGS = (
+    "rollout_depth",
+    "early_stop",
+    "widening",
+    "rollout_policy",
+    "rollout_cutoff",
+    "eval_scale",
+    "tablebase",
+)
+
+
+def order_moves(board: SearchBoard, moves):
+    """
+    Moves ordered by a cheap prior for progressive widening: captures
+    first, most valuable victim first, then quiet moves in generation order.
+    """
+    cells = board.board
+    return sorted(moves, key=lambda move: -PIECE_VALUES[cells[move[2] * COLS + move[3]]])
 
 
-def _calculate(total_visits, values, visits):
+class SearchBudget:
     """
-    Calculate the UCT value for a node.
+    Limits of one search: wall time, playouts and graph size. Any limit
+    left as None is unbounded. The deadline is wall clock time so that
+    worker processes can share it. `should_stop`, a callable polled
+    between playouts, ends the search from outside, e.g. from a GUI thread.
     """
-    if visits == 0:
-        return inf
-    return values / visits + sqrt(2 * log(total_visits) / visits)
 
+    def __init__(self, time_limit=None, max_playouts=None, max_nodes=None, should_stop=None):
+        self.start = time.time()
+        self.deadline = None if time_limit is None else self.start + time_limit
+        self.max_playouts = max_playouts
+        self.max_nodes = max_nodes
+        self.should_stop = should_stop
 
-class MctNode:
-    def __init__(self, state: State, parent=None):
-        self.state = state
-        self.parent = parent
-        self.children: dict[int, MctNode] = {}
-        self.visits = 0
-        self.values = 0
+    def elapsed(self):
+        return time.time() - self.start
 
-    def select(self):
-        return max(
-            self.children.values(),
-            key=lambda node: _calculate(self.visits, node.values, node.visits),
-        )
+    def exhausted(self, playouts, tree=None):
+        if self.max_playouts is not None and playouts >= self.max_playouts:
+            return True
+        if self.max_nodes is not None and tree is not None and len(tree) >= self.max_nodes:
+            return True
+        if self.should_stop is not None and self.should_stop():
+            return True
+        return self.deadline is not None and time.time() >= self.deadline
 
-    def expand(self):
-        for _state in self.state.get_legal_moves():
-            self.children[_state] = MctNode(_state, self)
+    def batch(self, size, playouts, tree):
+        """
+        `size` capped so that a batch of playouts stays within the playout
+        and node limits; every playout adds at most one node.
+        """
+        if self.max_playouts is not None:
+            size = min(size, self.max_playouts - playouts)
+        if self.max_nodes is not None:
+            size = min(size, self.max_nodes - len(tree))
+        return size
 
-    def backpropagate(self, value):
-        print("Backpropagating value:", value)
-        self.visits += 1
-        self.values += value
-        if self.parent:
-            self.parent.backpropagate(value)
+    def remaining(self, playouts):
+        """
+        Upper estimate of the playouts left, from the playout limit and
+        the rate so far against the deadline.
+        """
+        left = math.inf
+        if self.max_playouts is not None:
+            left = self.max_playouts - playouts
+        if self.deadline is not None and playouts:
+            now = time.time()
+            rate = playouts / max(now - self.start, 1e-9)
+            left = min(left, rate * max(self.deadline - now, 0))
+        return left
 
 
 class Mct:
-    def __init__(self, state: State):
-        Visualize.render_board_with_state(state.state)
-        self.root = MctNode(state)
-        self.cur = self.root
+    def __init__(
+        self,
+        state: State,
+        max_nodes=None,
+        workers=1,
+        parallel="tree",
+        render=True,
+        max_memory=None,
+        evaluator=None,
+        book=None,
+        tablebase=None,
+    ):
+        """
+        `max_nodes` and `max_memory` (bytes) bound the node pool; when it is
+        full the least visited leaves are pruned. The pool starts smaller
+        when `max_memory` is below its default size, see ArrayTree. It is
+        kept across moves, with the subtree below the new position reused.
+        `workers` > 1 spreads each search over that many processes, either
+        with one shared graph ("tree") or with independent graphs whose root
+        statistics are merged ("root"), see parallel_mcts.
+        With an `evaluator` (an EvalQueue over a policy/value model) the
+        search uses PUCT with model priors and values instead of rollouts;
+        the parallel modes always use rollouts.
+        With a `book` (an opening_book.OpeningBook), do_best_move plays
+        book moves without searching while the position is in the book.
+        With a `tablebase` (a tablebase.Tablebase), playouts end with the
+        exact result as soon as they reach a position in the tables, and
+        do_best_move plays the tablebase move there.
+        """
+        self.render = render
+        self.render_state(state)
+        self.root_state = state
+        self.max_nodes = max_nodes
+        self.max_memory = max_memory
+        self.evaluator = evaluator
+        self.book = book
+        self.tablebase = tablebase
+        self.c_puct = 1.5
+        self.workers = workers
+        self.parallel = parallel
+        self.tree = self._new_tree(state)
+        # 每步默认的模拟次数; time_limit (秒) 设置后按时间搜索
         self.rounds = 300
+        self.time_limit = None
+        # 随机对局最多走多少步 (不计重复局面)
+        self.rollout_depth = 300
+        self.early_stop = True
+        # 随机对局的走法策略, 见 rollout.py; rollout_cutoff 步后改用局面估值
+        self.rollout_policy = UniformPolicy()
+        self.rollout_cutoff = None
+        self.eval_scale = EVAL_SCALE
+        # 渐进展开 (k, alpha): 访问 n 次的节点只考虑前 k * n ** alpha 个走法
+        self.widening = (2.0, 0.5)
+        self.playouts = 0
+        self.search_time = 0.0
+        # 最近一次 do_best_move 走的棋; 后台思考时的实际局面 (见 ponder)
+        self.last_move = None
+        self.ponder_from = None
+        self._progress = None
+        self._reported = 0.0
+        # 已提交给 evaluator 还没评估完的叶子
+        self._queued = set()
+
+    def settings(self):
+        """
+        The per-search settings, for copying onto another Mct.
+        """
+        return {name: getattr(self, name) for name in SEARCH_SETTINGS}
+
+    def render_state(self, state: State):
+        if self.render:
+            Visualize.render_board_with_state(state.state)
+
+    def _new_tree(self, state: State):
+        tree = ArrayTree(max_nodes=self.max_nodes, max_bytes=self.max_memory)
+        tree.add_node(state.key)
+        return tree
 
-    def simulate(self, state: State):
-        current = state
+    @property
+    def state(self) -> State:
+        """
+        The game position. While pondering the search root is the predicted
+        reply instead, see ponder.
+        """
+        ponder_from = self.ponder_from
+        return self.root_state if ponder_from is None else ponder_from
+
+    def simulate(self, state: State | SearchBoard):
+        """
+        Plays the position out with `rollout_policy` and returns the result,
+        1 black wins, -1 red wins. With `rollout_cutoff` set the playout
+        stops after that many plies and returns the scaled static evaluation.
+        """
+        current = SearchBoard(state) if isinstance(state, State) else state
+        policy = self.rollout_policy
         seen_states = set()
-        seen_states.add(hash(current))
-        rounds = self.rounds
-        while not current.is_terminal() and rounds > 0:
-            moves = current.get_legal_moves()
-            current = random.choice(moves)
-            if hash(current) in seen_states:
+        seen_states.add(current.key)
+        rounds = self.rollout_depth
+        # 子力很少时新局面可能走不满 rollout_depth, 总步数另设上限
+        plies = ROLLOUT_PLY_FACTOR * rounds
+        if self.rollout_cutoff is not None:
+            plies = min(plies, self.rollout_cutoff)
+        while rounds > 0 and plies > 0:
+            value = self._probe(current)
+            if value is not None:
+                return value
+            moves = current.legal_moves()
+            if not moves:
+                # 被将死或困毙, 行棋方负
+                return -current.player
+            current.make_move(policy.choose(current, moves))
+            plies -= 1
+            if current.key in seen_states:
                 continue
-            seen_states.add(hash(current))
+            seen_states.add(current.key)
             rounds -= 1
+        if self.rollout_cutoff is not None:
+            if not current.has_legal_move():
+                return -current.player
+            return scaled(evaluate(current), self.eval_scale)
         return current.get_result()
 
-    def search(self):
-        for _ in range(self.rounds):
-            node = self.root
-            while node.children:
-                node = node.select()
-            if node.visits:
-                node.expand()
-                node = node.select()
-            value = self.simulate(node.state)
-            node.backpropagate(value)
-
-    def do_best_move(self):
-        if not self.root.children:
+    def _select_leaf(self):
+        """
+        Walks down from the root, expanding the first visited leaf it meets.
+        Returns the nodes and edges of the path, a SearchBoard holding the
+        leaf position and whether the path ran into a repetition.
+        Transpositions are followed into their shared node.
+        """
+        tree = self.tree
+        board = SearchBoard(self.root_state)
+        node = 0
+        nodes, edges = [node], []
+        while True:
+            if not tree.is_expanded(node):
+                if not tree.visits[node]:
+                    break
+                tree.expand(node, order_moves(board, board.legal_moves()))
+            if not tree.num_edges[node]:
+                break
+            edge = tree.select_edge(node, widening=self.widening)
+            board.make_move(tree.edge_move_of(edge))
+            node = tree.child(edge, board.key)
+            edges.append(edge)
+            # 局面重复 (图里有环), 按和棋处理
+            repeated = node in nodes
+            nodes.append(node)
+            if repeated:
+                return nodes, edges, board, True
+            if not tree.visits[node]:
+                break
+        return nodes, edges, board, False
+
+    def _probe(self, board: SearchBoard):
+        """
+        The exact result (1 black wins) of a position in the tablebase, or
+        None.
+        """
+        if self.tablebase is None:
+            return None
+        hit = self.tablebase.probe_position(board)
+        return None if hit is None else hit[0] * board.player
+
+    def _evaluate(self, board: SearchBoard, repeated):
+        return 0 if repeated else self.simulate(board)
+
+    def search(
+        self,
+        batch_size=None,
+        time_limit=None,
+        max_playouts=None,
+        max_nodes=None,
+        should_stop=None,
+        progress=None,
+    ):
+        """
+        Searches until a budget runs out and returns the best root move, or
+        None if the root has no moves. Budgets: `time_limit` seconds,
+        `max_playouts` playouts and `max_nodes` nodes in the graph. Without
+        any, `time_limit` falls back to self.time_limit and then
+        `max_playouts` to self.rounds. With `early_stop`, the search also ends
+        once no other root move can catch up with the most visited one
+        within the playouts that are left.
+
+        With `batch_size`, leaves are collected `batch_size` at a time and
+        their rollouts are played together by BatchRollout; the leaves of a
+        batch are spread out with virtual loss.
+
+        `should_stop` is polled between playouts and ends the search when it
+        returns true. `progress(best_move, playouts)` is called at most every
+        PROGRESS_INTERVAL seconds while searching; the parallel modes only
+        report at the end.
+        """
+        if time_limit is None and max_playouts is None and max_nodes is None:
+            time_limit = self.time_limit
+            if time_limit is None:
+                max_playouts = self.rounds
+        budget = SearchBudget(time_limit, max_playouts, max_nodes, should_stop)
+        self._progress = progress
+        self._reported = budget.start
+        if self.workers > 1:
+            import parallel_mcts
+
+            self.playouts = parallel_mcts.SEARCHES[self.parallel](self, self.workers, budget)
+        elif self.evaluator is not None:
+            self.playouts = self._search_puct(budget)
+        elif batch_size:
+            self.playouts = self._search_batch(batch_size, budget)
+        else:
+            self.playouts = self._search_serial(budget)
+        self.search_time = budget.elapsed()
+        self._progress = None
+        move = self.best_move()
+        if progress is not None:
+            progress(move, self.playouts)
+        return move
+
+    def _report(self, playouts):
+        if self._progress is None:
+            return
+        now = time.time()
+        if now - self._reported >= PROGRESS_INTERVAL:
+            self._reported = now
+            self._progress(self.best_move(), playouts)
+
+    def best_move(self):
+        edge = self.tree.best_edge(0)
+        return None if edge < 0 else self.tree.edge_move_of(edge)
+
+    def root_visits(self):
+        """
+        [(move, visits)] of the root moves searched so far, the search
+        policy recorded by self-play.
+        """
+        tree = self.tree
+        if not tree.is_expanded(0):
+            return []
+        return [
+            (tree.edge_move_of(edge), int(tree.edge_visits[edge]))
+            for edge in tree.edges(0)
+            if tree.edge_visits[edge]
+        ]
+
+    def _decided(self, budget: SearchBudget, playouts):
+        """
+        Whether the most visited root move stays ahead even if every
+        remaining playout went to the runner-up.
+        """
+        tree = self.tree
+        if not self.early_stop or not tree.is_expanded(0):
+            return False
+        visits = tree.edge_visits[tree.edges(0)]
+        if len(visits) < 2:
+            return True
+        second, first = np.partition(visits, -2)[-2:]
+        return first - second > budget.remaining(playouts)
+
+    def _search_serial(self, budget: SearchBudget):
+        tree = self.tree
+        playouts = 0
+        while not budget.exhausted(playouts, tree):
+            if tree.is_full():
+                tree.evict()
+            nodes, edges, board, repeated = self._select_leaf()
+            player = board.player
+            value = self._evaluate(board, repeated)
+            tree.backpropagate(nodes, edges, value, player)
+            playouts += 1
+            self._report(playouts)
+            if playouts % EARLY_STOP_INTERVAL == 0 and self._decided(budget, playouts):
+                break
+        return playouts
+
+    def _search_batch(self, batch_size, budget: SearchBudget):
+        tree = self.tree
+        rollout = BatchRollout(max_plies=self.rollout_depth)
+        playouts = 0
+        while not budget.exhausted(playouts, tree) and not self._decided(budget, playouts):
+            # 一个批次内的路径持有节点下标, 只在批次之间回收
+            if tree.is_full():
+                tree.evict()
+            leaves = []
+            for _ in range(budget.batch(batch_size, playouts, tree)):
+                nodes, edges, board, repeated = self._select_leaf()
+                leaves.append((nodes, edges, board, repeated))
+                # 虚拟损失, 让同一批次的后续选择走向别的节点
+                tree.add_virtual_loss(nodes, edges)
+            pending = [
+                i
+                for i, (_, _, board, repeated) in enumerate(leaves)
+                if not repeated and board.has_legal_move()
+            ]
+            results = rollout.run_states([leaves[i][2].to_state() for i in pending])
+            values = dict(zip(pending, results.tolist()))
+            for i, (nodes, edges, board, repeated) in enumerate(leaves):
+                tree.remove_virtual_loss(nodes, edges)
+                value = 0 if repeated else values.get(i, -board.player)
+                tree.backpropagate(nodes, edges, value, board.player)
+            playouts += len(leaves)
+            self._report(playouts)
+        return playouts
+
+    def _select_leaf_puct(self):
+        """
+        Walks down by PUCT to the first node that has not been evaluated.
+        Returns the same tuple as _select_leaf.
+        """
+        tree = self.tree
+        board = SearchBoard(self.root_state)
+        node = 0
+        nodes, edges = [node], []
+        while tree.is_expanded(node) and tree.num_edges[node]:
+            edge = tree.select_edge_puct(node, self.c_puct)
+            board.make_move(tree.edge_move_of(edge))
+            node = tree.child(edge, board.key)
+            edges.append(edge)
+            repeated = node in nodes
+            nodes.append(node)
+            if repeated:
+                return nodes, edges, board, True
+        return nodes, edges, board, False
+
+    def _search_puct(self, budget: SearchBudget):
+        tree = self.tree
+        queue = self.evaluator
+        playouts = 0
+        while not budget.exhausted(playouts, tree):
+            if tree.is_full():
+                # 排队中的叶子持有节点下标, 回收之前先评估完
+                queue.flush()
+                tree.evict()
+            nodes, edges, board, repeated = self._select_leaf_puct()
+            if nodes[-1] in self._queued:
+                # 叶子已在队列里等评估, 不再重复提交: 先评估这一批再往下选
+                queue.flush()
+                continue
+            playouts += 1
+            moves = [] if repeated else board.legal_moves()
+            if not moves:
+                value = 0 if repeated else -board.player
+                tree.backpropagate(nodes, edges, value, board.player)
+                continue
+            value = self._probe(board)
+            if value is not None:
+                tree.backpropagate(nodes, edges, value, board.player)
+                continue
+            tree.add_virtual_loss(nodes, edges)
+            self._queued.add(nodes[-1])
+            queue.submit(board, moves, partial(self._evaluated, nodes, edges, board.player, moves))
+            self._report(playouts)
+            if playouts % EARLY_STOP_INTERVAL == 0 and self._decided(budget, playouts):
+                break
+        queue.flush()
+        return playouts
+
+    def _evaluated(self, nodes, edges, player, moves, priors, value):
+        tree = self.tree
+        tree.remove_virtual_loss(nodes, edges)
+        leaf = nodes[-1]
+        self._queued.discard(leaf)
+        tree.expand(leaf, moves, priors)
+        tree.backpropagate(nodes, edges, value, player)
+
+    def _reroot(self, state: State, render=True):
+        """
+        Moves the root to `state`, keeping whatever the search already knows
+        below it and recycling the rest of the pool.
+        """
+        # 走到的局面可能经由别的走法已经在图里
+        node = self.tree.lookup(state.key)
+        if node >= 0:
+            self.tree.compact(node)
+        else:
+            self.tree.reset(state.key)
+        self.root_state = state
+        if render:
+            self.render_state(state)
+        return state
+
+    def ponder(self, should_stop, progress=None, min_playouts=32):
+        """
+        Thinks on the opponent's time: searches the position after the
+        opponent's most likely reply until `should_stop()` returns true, and
+        returns that reply (None if there is nothing to ponder).
+        The pool is rerooted at the predicted position; the next
+        do_human_move keeps the deepened subtree if the prediction was
+        right and starts afresh otherwise. Up to `min_playouts` are first
+        spent on the real position when its root has too few visits to
+        predict from.
+        """
+        state = self.state
+        if self.ponder_from is not None or state.is_terminal():
+            return None
+        visits = int(self.tree.visits[0])
+        if visits < min_playouts:
+            self.search(max_playouts=min_playouts - visits, should_stop=should_stop)
+        move = self.best_move()
+        if move is None or should_stop():
+            return None
+        # 先记下实际局面, 其他线程通过 state 读到的始终是它
+        self.ponder_from = state
+        predicted = self._reroot(state.apply_move(move[:2], move[2:]), render=False)
+        if predicted.is_terminal():
+            return move
+        total = 0
+
+        def report(best, playouts):
+            progress(best, total + playouts)
+
+        # 按 rounds 分段搜索, 直到外部叫停
+        while not should_stop():
+            self.search(
+                max_playouts=self.rounds,
+                should_stop=should_stop,
+                progress=None if progress is None else report,
+            )
+            total += self.playouts
+        return move
+
+    def do_best_move(self, progress=None, should_stop=None):
+        state = self.state
+        if state.is_terminal():
             return None
-        if all(not child.state.valid() for child in self.root.children.values()):
+        if self.ponder_from is not None:
+            self.ponder_from = None
+            self._reroot(state, render=False)
+        move = None if self.book is None else self.book.choose(state)
+        if move is None and self.tablebase is not None:
+            move = self.tablebase.best_move(state)
+        if move is None:
+            move = self.search(should_stop=should_stop, progress=progress)
+        if move is None:
             return None
-        self.search()
-        best_node = max(self.root.children.values(), key=lambda n: n.values / n.visits)
-        Visualize.render_board_with_state(best_node.state.state)
-        self.root = best_node
-        self.cur = best_node
-        self.cur.parent = None
-        return best_node.state
+        self.last_move = move
+        return self._reroot(state.apply_move(move[:2], move[2:]))
 
     def do_human_move(self, from_pos, to_pos):
-        next_state = self.cur.state.apply_move(from_pos, to_pos)
-        Visualize.render_board_with_state(next_state.state)
-        node = self.cur.children.get(hash(next_state), MctNode(next_state, self.root))
-        self.root = node
-        self.cur = node
-        self.cur.parent = None
-        return node.state
+        # 后台思考猜中时, 新局面就是当前搜索根, 经置换表直接复用
+        state = self._reroot(self.state.apply_move(from_pos, to_pos))
+        self.ponder_from = None
+        return state
@@ -0,0 +1,177 @@
+import random
+import unittest
+
+from mcts import Mct, SearchBudget, order_moves
+from perft import reference_state
+from state import SearchBoard
+from testutil import make_state
+from tree import ArrayTree
+
+
+class SearchBudgetTest(unittest.TestCase):
+    def test_limits(self):
+        budget = SearchBudget(max_playouts=10)
+        self.assertFalse(budget.exhausted(9))
+        self.assertTrue(budget.exhausted(10))
+        self.assertEqual(budget.remaining(4), 6)
+        self.assertTrue(SearchBudget(time_limit=0).exhausted(0))
+        self.assertEqual(SearchBudget(time_limit=60).remaining(0), float("inf"))
+        self.assertTrue(SearchBudget(max_playouts=10, should_stop=lambda: True).exhausted(0))
+
+
+class AnytimeSearchTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(5)
+        self.mct = Mct(reference_state("midgame"), render=False)
+        self.mct.rollout_depth = 20
+
+    def test_playout_budget(self):
+        self.mct.early_stop = False
+        move = self.mct.search(max_playouts=30)
+        self.assertEqual(self.mct.playouts, 30)
+        self.assertIn(move, SearchBoard(self.mct.state).legal_moves())
+
+    def test_time_budget(self):
+        self.mct.search(time_limit=0.2)
+        self.assertGreater(self.mct.playouts, 0)
+        self.assertLess(self.mct.search_time, 0.5)
+
+    def test_node_budget(self):
+        self.mct.search(max_nodes=10)
+        self.assertEqual(len(self.mct.tree), 10)
+
+    def test_batch_budgets(self):
+        # 批次按剩余预算截短, 不会超出模拟次数和节点数
+        self.mct.early_stop = False
+        self.mct.search(batch_size=16, max_playouts=20)
+        self.assertEqual(self.mct.playouts, 20)
+        mct = Mct(reference_state("midgame"), render=False)
+        mct.rollout_depth = 20
+        mct.search(batch_size=16, max_nodes=10)
+        self.assertLessEqual(len(mct.tree), 10)
+
+    def test_early_stop(self):
+        self.mct.search(max_playouts=60)
+        self.assertLessEqual(self.mct.playouts, 60)
+        visits = sorted(self.mct.tree.edge_visits[self.mct.tree.edges(0)])
+        self.assertTrue(self.mct.playouts == 60 or visits[-1] - visits[-2] > 60 - self.mct.playouts)
+
+    def test_single_move_stops_at_once(self):
+        # 黑车控制第 1 行和第 3 列, 红帅只能走到 (0, 5)
+        state = make_state({(0, 4): "红帅", (1, 3): "黑车", (9, 3): "黑帅"}, -1)
+        mct = Mct(state, render=False)
+        self.assertEqual(len(state.get_legal_moves()), 1)
+        mct.search(max_playouts=100)
+        self.assertLessEqual(mct.playouts, 8)
+
+
+class OrderMovesTest(unittest.TestCase):
+    def test_captures_first(self):
+        state = make_state(
+            {(0, 4): "红帅", (2, 0): "红车", (5, 0): "黑兵", (2, 8): "黑车", (9, 3): "黑帅"}, -1
+        )
+        board = SearchBoard(state)
+        moves = order_moves(board, board.legal_moves())
+        self.assertEqual(moves[:2], [(2, 0, 2, 8), (2, 0, 5, 0)])
+        self.assertEqual(sorted(moves), sorted(board.legal_moves()))
+
+
+class SubtreeReuseTest(unittest.TestCase):
+    def test_human_move_keeps_subtree(self):
+        random.seed(2)
+        mct = Mct(reference_state("midgame"), render=False)
+        mct.rollout_depth = 10
+        mct.early_stop = False
+        mct.search(max_playouts=80)
+        tree = mct.tree
+        edge = max(tree.edges(0), key=lambda edge: tree.edge_visits[edge])
+        visits = tree.visits[tree.edge_child[edge]]
+        x, y, nx, ny = tree.edge_move_of(edge)
+        mct.do_human_move((x, y), (nx, ny))
+        self.assertEqual(mct.tree.visits[0], visits)
+        self.assertEqual(mct.tree.key[0], mct.state.key)
+        self.assertLess(len(mct.tree), 80)
+
+    def test_bounded_pool(self):
+        random.seed(4)
+        mct = Mct(reference_state("midgame"), render=False, max_nodes=30)
+        mct.rollout_depth = 10
+        mct.early_stop = False
+        mct.search(max_playouts=100)
+        self.assertLessEqual(len(mct.tree), 30)
+        self.assertGreater(mct.tree.evictions, 0)
+
+    def test_memory_ceiling_below_initial_pool(self):
+        random.seed(4)
+        max_memory = ArrayTree().nbytes() // 2
+        mct = Mct(reference_state("midgame"), render=False, max_memory=max_memory)
+        mct.rollout_depth = 10
+        mct.early_stop = False
+        mct.search(max_playouts=200)
+        self.assertEqual(mct.tree.evictions, 0)
+        self.assertGreater(len(mct.tree), 100)
+        self.assertLessEqual(mct.tree.nbytes(), max_memory)
+
+
+def stop_after(calls):
+    count = iter(range(calls))
+    return lambda: next(count, None) is None
+
+
+class PonderTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(6)
+        self.mct = Mct(reference_state("midgame"), render=False)
+        self.mct.rollout_depth = 10
+        self.mct.early_stop = False
+
+    def test_stop_and_progress(self):
+        reports = []
+        self.mct.search(max_playouts=1000, should_stop=stop_after(20),
+                        progress=lambda move, playouts: reports.append((move, playouts)))
+        self.assertEqual(self.mct.playouts, 20)
+        self.assertEqual(reports[-1], (self.mct.best_move(), 20))
+
+    def test_ponder_hit(self):
+        mct = self.mct
+        actual = mct.state
+        move = mct.ponder(stop_after(60))
+        self.assertIsNotNone(move)
+        self.assertIs(mct.state, actual)
+        self.assertIs(mct.ponder_from, actual)
+        visits = mct.tree.visits[0]
+        self.assertGreater(visits, 0)
+        x, y, nx, ny = move
+        mct.do_human_move((x, y), (nx, ny))
+        self.assertIsNone(mct.ponder_from)
+        self.assertEqual(mct.tree.visits[0], visits)
+        self.assertEqual(mct.tree.key[0], mct.state.key)
+
+    def test_ponder_miss(self):
+        mct = self.mct
+        move = mct.ponder(stop_after(60))
+        other = next(m for m in SearchBoard(mct.state).legal_moves() if m != move)
+        x, y, nx, ny = other
+        state = mct.do_human_move((x, y), (nx, ny))
+        self.assertEqual(state, mct.state)
+        self.assertEqual(mct.tree.key[0], state.key)
+        self.assertEqual(mct.tree.visits[0], 0)
+
+    def test_best_move_after_ponder(self):
+        mct = self.mct
+        actual = mct.state
+        mct.ponder(stop_after(40))
+        mct.rounds = 20
+        state = mct.do_best_move()
+        x, y, nx, ny = mct.last_move
+        self.assertEqual(state, actual.apply_move((x, y), (nx, ny)))
+
+    def test_best_move_can_be_stopped(self):
+        mct = self.mct
+        mct.time_limit = 60.0
+        calls = stop_after(10)
+        mct.do_best_move(should_stop=calls)
+        self.assertLessEqual(mct.playouts, 10)
+
+
+unittest.main()
@@ -0,0 +1,87 @@
+"""
+Policy/value model for PUCT search, evaluated on the CPU with NumPy.
+
+Positions are encoded as 14 one-hot piece planes (7 kinds x 2 colors) of 90
+squares plus one input for the side to move. The model is a one hidden layer
+network: a batch of positions is a single matrix multiply per layer. The
+policy head scores all 90 * 90 (src, dst) pairs, the same codes as
+tree.encode_move; the value head predicts the result from the point of view
+of the side to move, in (-1, 1).
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from board import BLACK, KIND_MASK, SQUARES
+
+PLANES = 14
+INPUT_SIZE = PLANES * SQUARES + 1
+MOVE_COUNT = SQUARES * SQUARES
+
+
+def encode_boards(boards, players) -> np.ndarray:
+    """
+    Encodes (N, 90) boards with (N,) players (1 black, -1 red) as (N, INPUT_SIZE).
+    """
+    boards = np.asarray(boards, dtype=np.intp).reshape(-1, SQUARES)
+    n = len(boards)
+    x = np.zeros((n, INPUT_SIZE), dtype=np.float32)
+    rows, squares = np.nonzero(boards)
+    codes = boards[rows, squares]
+    planes = (codes & KIND_MASK) - 1 + np.where(codes & BLACK, 7, 0)
+    x[rows, planes * SQUARES + squares] = 1
+    x[:, -1] = np.asarray(players, dtype=np.float32)
+    return x
+
+
+def encode_states(states) -> np.ndarray:
+    """
+    Encodes States or SearchBoards.
+    """
+    boards = np.frombuffer(b"".join(bytes(s.board) for s in states), dtype=np.uint8)
+    return encode_boards(boards.reshape(len(states), SQUARES), [s.player for s in states])
+
+
+class PolicyValueModel:
+    WEIGHTS = ("w1", "b1", "wp", "bp", "wv", "bv")
+
+    def __init__(self, hidden=128, seed=0):
+        rng = np.random.default_rng(seed)
+        self.w1 = (rng.standard_normal((INPUT_SIZE, hidden)) * np.sqrt(2 / INPUT_SIZE)).astype(
+            np.float32
+        )
+        self.b1 = np.zeros(hidden, dtype=np.float32)
+        self.wp = (rng.standard_normal((hidden, MOVE_COUNT)) * 0.01).astype(np.float32)
+        self.bp = np.zeros(MOVE_COUNT, dtype=np.float32)
+        self.wv = (rng.standard_normal((hidden, 1)) * 0.01).astype(np.float32)
+        self.bv = np.zeros(1, dtype=np.float32)
+
+    def predict(self, x):
+        """
+        (policy logits (N, MOVE_COUNT), values (N,)) for encoded positions.
+        """
+        hidden = np.maximum(x @ self.w1 + self.b1, 0)
+        logits = hidden @ self.wp + self.bp
+        values = np.tanh(hidden @ self.wv + self.bv)[:, 0]
+        return logits, values
+
+    def save(self, path):
+        np.savez(path, **{name: getattr(self, name) for name in self.WEIGHTS})
+
+    @classmethod
+    def load(cls, path) -> PolicyValueModel:
+        data = np.load(path)
+        model = cls.__new__(cls)
+        for name in cls.WEIGHTS:
+            setattr(model, name, data[name].astype(np.float32))
+        return model
+
+
+def move_priors(logits, codes) -> np.ndarray:
+    """
+    Softmax of one position's policy logits over its legal move codes.
+    """
+    scores = logits[codes]
+    scores = np.exp(scores - scores.max())
+    return scores / scores.sum()
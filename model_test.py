@@ -0,0 +1,74 @@
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from eval_queue import EvalQueue
+from mcts import Mct
+from model import INPUT_SIZE, MOVE_COUNT, PolicyValueModel, encode_states, move_priors
+from perft import reference_state
+from state import SearchBoard
+
+
+class ModelTest(unittest.TestCase):
+    def test_encode(self):
+        state = reference_state("initial")
+        x = encode_states([state, SearchBoard(state)])
+        self.assertEqual(x.shape, (2, INPUT_SIZE))
+        self.assertEqual(x[0, :-1].sum(), 32)
+        self.assertEqual(x[0, -1], state.player)
+        np.testing.assert_array_equal(x[0], x[1])
+        # 红车在 (0, 0), 第 1 个平面 (红车) 的第 0 格
+        self.assertEqual(x[0, 1 * 90 + 0], 1)
+        # 黑车在 (9, 0), 第 8 个平面 (黑车)
+        self.assertEqual(x[0, 8 * 90 + 81], 1)
+
+    def test_predict_and_save(self):
+        model = PolicyValueModel(hidden=8, seed=1)
+        x = encode_states([reference_state(name) for name in ("initial", "midgame")])
+        logits, values = model.predict(x)
+        self.assertEqual(logits.shape, (2, MOVE_COUNT))
+        self.assertTrue(np.all(np.abs(values) < 1))
+        priors = move_priors(logits[0], np.array([3, 50, 700]))
+        self.assertAlmostEqual(float(priors.sum()), 1, places=5)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "model.npz")
+            model.save(path)
+            loaded = PolicyValueModel.load(path)
+        np.testing.assert_array_equal(loaded.predict(x)[0], logits)
+
+
+class PuctSearchTest(unittest.TestCase):
+    def test_searches_share_a_queue(self):
+        random.seed(1)
+        queue = EvalQueue(PolicyValueModel(hidden=16), batch_size=8)
+        searches = [
+            Mct(reference_state(name), render=False, evaluator=queue)
+            for name in ("midgame", "endgame")
+        ]
+        for mct in searches:
+            mct.early_stop = False
+            move = mct.search(max_playouts=40)
+            self.assertIn(move, SearchBoard(mct.state).legal_moves())
+            self.assertEqual(mct.tree.visits[0], 40)
+            self.assertEqual(len(queue), 0)
+            priors = mct.tree.edge_prior[mct.tree.edges(0)]
+            self.assertAlmostEqual(float(priors.sum()), 1, places=5)
+        self.assertLessEqual(queue.batches, 12)
+        self.assertIsNotNone(searches[0].do_best_move())
+
+    def test_batch_leaves_are_distinct(self):
+        # 一个批次里同一个叶子只提交一次, 每次评估都展开一个新节点
+        random.seed(1)
+        queue = EvalQueue(PolicyValueModel(hidden=16), batch_size=32)
+        mct = Mct(reference_state("initial"), render=False, evaluator=queue)
+        mct.early_stop = False
+        mct.search(max_playouts=32)
+        self.assertEqual(queue.positions, 32)
+        self.assertEqual(len(mct.tree), 32)
+        self.assertEqual(mct.tree.visits[0], 32)
+
+
+unittest.main()
@@ -0,0 +1,189 @@
+"""
+Opening book: move statistics by position, in a sorted binary file that is
+probed in place through mmap, so opening a book costs nothing however big
+it is.
+
+File layout, little endian:
+
+    header   8s magic, uint32 entry count
+    entries  uint64 position key, uint16 move code, uint32 games, float32 score
+
+Entries are sorted by (key, move code); the key is the Zobrist key of
+State, the move code tree.encode_move, and the score the sum of the game
+results from the point of view of the side that played the move.
+
+    build_book(games, "book.bin")
+    with OpeningBook("book.bin") as book:
+        move = book.choose(state)
+"""
+
+from __future__ import annotations
+
+import argparse
+import mmap
+import random
+import struct
+from collections import defaultdict
+
+from evaluate import evaluate, scaled
+from state import SearchBoard, State
+from tree import decode_move, encode_move
+
+MAGIC = b"XQBOOK1\0"
+HEADER = struct.Struct("<8sI")
+ENTRY = struct.Struct("<QHIf")
+# 默认只收录前这么多步
+BOOK_PLIES = 16
+
+
+def build_book(games, path, max_plies=BOOK_PLIES, min_games=1):
+    """
+    Aggregates `games`, an iterable of (start State, moves, result), into a
+    book file at `path` and returns the number of entries written. Moves
+    are (x, y, nx, ny); the result is 1 when black wins, -1 when red wins,
+    or anything in between. Only the first `max_plies` moves of a game and
+    moves seen in at least `min_games` games are kept.
+    """
+    stats = defaultdict(lambda: [0, 0.0])
+    for state, moves, result in games:
+        for move in moves[:max_plies]:
+            x, y, nx, ny = move
+            entry = stats[state.key, encode_move(move)]
+            entry[0] += 1
+            entry[1] += result * state.player
+            state = state.apply_move((x, y), (nx, ny))
+    entries = sorted(
+        (key, code, played, score)
+        for (key, code), (played, score) in stats.items()
+        if played >= min_games
+    )
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        for entry in entries:
+            f.write(ENTRY.pack(*entry))
+    return len(entries)
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+        if len(self._map) < HEADER.size + self.count * ENTRY.size:
+            self.close()
+            raise ValueError(f"{path} is truncated")
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+    def _key_at(self, index):
+        return struct.unpack_from("<Q", self._map, HEADER.size + index * ENTRY.size)[0]
+
+    def probe(self, key):
+        """
+        Book moves of the position with Zobrist key `key`, as
+        [(move, games, score)] in move code order; empty if it is not in
+        the book.
+        """
+        # 二分查找第一个 key 不小于目标的条目
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        moves = []
+        offset = HEADER.size + lo * ENTRY.size
+        for _ in range(lo, self.count):
+            entry_key, code, games, score = ENTRY.unpack_from(self._map, offset)
+            if entry_key != key:
+                break
+            moves.append((decode_move(code), games, score))
+            offset += ENTRY.size
+        return moves
+
+    def choose(self, state: State, rng=None):
+        """
+        A legal book move for `state`, or None. Without `rng` the most
+        played move, ties broken by the better score; with `rng` a move
+        drawn in proportion to how often it was played.
+        """
+        moves = self.probe(state.key)
+        if not moves:
+            return None
+        # 64 位 key 也可能碰撞, 只走合法的棋
+        legal = set(SearchBoard(state).legal_moves())
+        moves = [entry for entry in moves if entry[0] in legal]
+        if not moves:
+            return None
+        if rng is not None:
+            return rng.choices([move for move, _, _ in moves], [games for _, games, _ in moves])[0]
+        return max(moves, key=lambda entry: (entry[1], entry[2] / entry[1]))[0]
+
+
+def self_play_openings(state: State, games, plies=BOOK_PLIES, rounds=100, seed=0):
+    """
+    Plays the first `plies` moves of `games` MCTS self-play games from
+    `state` and scores each by its result, or by the scaled static
+    evaluation if it is still going. Yields (start State, moves, result).
+    """
+    from mcts import Mct
+
+    random.seed(seed)
+    for _ in range(games):
+        mct = Mct(state, render=False)
+        mct.rounds = rounds
+        mct.rollout_cutoff = 40
+        moves = []
+        while len(moves) < plies and mct.do_best_move() is not None:
+            moves.append(mct.last_move)
+        current = mct.state
+        result = current.get_result() if current.is_terminal() else scaled(evaluate(current))
+        yield state, moves, result
+
+
+def main(argv=None):
+    from perft import reference_state
+
+    parser = argparse.ArgumentParser(description="Build an opening book by MCTS self-play")
+    parser.add_argument("records", nargs="*", help="selfplay.py shards to build from instead")
+    parser.add_argument("--out", default="book.bin")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--plies", type=int, default=BOOK_PLIES)
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.records:
+        from selfplay import read_games, record_state
+
+        games = (
+            (record_state(record), [tuple(move) for move in record["moves"]], record["result"])
+            for record in read_games(args.records)
+        )
+    else:
+        games = self_play_openings(
+            reference_state("initial"), args.games, args.plies, args.rounds, args.seed
+        )
+    count = build_book(games, args.out, args.plies)
+    print(f"{count} entries written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
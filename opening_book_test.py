@@ -0,0 +1,74 @@
+import os
+import random
+import tempfile
+import unittest
+
+from mcts import Mct
+from opening_book import ENTRY, HEADER, OpeningBook, build_book
+from perft import reference_state
+from testutil import random_moves
+
+
+def random_games(state, count, plies, seed):
+    rng = random.Random(seed)
+    for game in range(count):
+        yield state, random_moves(state, plies, seed * count + game), rng.choice([1, 0, -1])
+
+
+class OpeningBookTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".bin")
+        os.close(fd)
+        self.state = reference_state("initial")
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_probe_matches_games(self):
+        games = list(random_games(self.state, 30, 6, seed=1))
+        count = build_book(games, self.path, max_plies=4)
+        self.assertEqual(os.path.getsize(self.path), HEADER.size + count * ENTRY.size)
+        with OpeningBook(self.path) as book:
+            self.assertEqual(len(book), count)
+            moves = book.probe(self.state.key)
+            self.assertEqual(sum(games for _, games, _ in moves), 30)
+            first = {}
+            for _, game, result in games:
+                entry = first.setdefault(game[0], [0, 0.0])
+                entry[0] += 1
+                entry[1] += result * self.state.player
+            self.assertEqual({move: [n, score] for move, n, score in moves}, first)
+            # 第 5 步以后不收录
+            state = self.state
+            for x, y, nx, ny in games[0][1][:4]:
+                state = state.apply_move((x, y), (nx, ny))
+            self.assertEqual(book.probe(state.key), [])
+            self.assertEqual(book.probe(0), [])
+            self.assertEqual(book.probe(2**64 - 1), [])
+
+    def test_choose(self):
+        move = (9, 1, 7, 2)
+        games = [(self.state, [move], 1)] * 3 + [(self.state, [(6, 4, 5, 4)], -1)]
+        build_book(games, self.path)
+        with OpeningBook(self.path) as book:
+            self.assertEqual(book.choose(self.state), move)
+            self.assertIn(book.choose(self.state, random.Random(0)), [move, (6, 4, 5, 4)])
+            self.assertIsNone(book.choose(self.state.apply_move((9, 1), (7, 2))))
+
+    def test_rejects_other_files(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a book at all")
+        with self.assertRaises(ValueError):
+            OpeningBook(self.path)
+
+    def test_mct_plays_from_book(self):
+        move = (9, 7, 7, 6)
+        build_book([(self.state, [move], 0)], self.path)
+        with OpeningBook(self.path) as book:
+            mct = Mct(self.state, render=False, book=book)
+            mct.do_best_move()
+            self.assertEqual(mct.last_move, move)
+            self.assertEqual(mct.playouts, 0)
+
+
+unittest.main()
@@ -0,0 +1,322 @@
+"""
+Multi-process Monte Carlo search.
+
+Root parallelism: every worker searches its own graph from the root position
+and the visit counts and values of the root moves are summed into the main
+graph afterwards.
+
+Tree parallelism: the node, edge and transposition arrays live in one shared
+memory block that every worker maps. Selection, expansion and backup run
+under a lock; the rollouts, which take almost all of the time, run outside
+it. A path is marked with a virtual loss while its rollout is pending so the
+other workers choose different branches. The shared block has a fixed size,
+sized for the search budget; workers stop early if it fills up.
+
+    python parallel_mcts.py --workers 1 --workers 2 --workers 4 --mode tree
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import math
+import multiprocessing as mp
+import random
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from mcts import Mct, SearchBudget, order_moves
+from state import SearchBoard, State
+from tree import MAX_MOVES, ArrayTree, decode_move
+
+MODES = ("root", "tree")
+# 只限时间时共享内存按这么多节点分配
+TIMED_NODES = 1 << 14
+
+
+class SharedTree(ArrayTree):
+    """
+    ArrayTree over a fixed-size shared memory block.
+    Node and edge counts are kept in the block too, so every process sees
+    the same sizes. The inherited evict compacts in place within the block,
+    but workers never call it: the other workers hold paths into the graph,
+    so a search stops once is_full() is true instead.
+    """
+
+    def __init__(self, capacity, edge_capacity, name=None):
+        self.max_nodes = capacity
+        self.evictions = 0
+        layout, total = self._layout(capacity, edge_capacity)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=total)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        for field, (offset, dtype, length) in layout.items():
+            view = np.ndarray(length, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            setattr(self, field, view)
+        self.capacity = capacity
+        self.edge_capacity = edge_capacity
+
+    def _layout(self, capacity, edge_capacity):
+        fields = [
+            ("visits", np.int32, capacity),
+            ("values", np.float64, capacity),
+            ("key", np.uint64, capacity),
+            ("first_edge", np.int32, capacity),
+            ("num_edges", np.int32, capacity),
+            ("edge_move", np.int16, edge_capacity),
+            ("edge_child", np.int32, edge_capacity),
+            ("edge_visits", np.int32, edge_capacity),
+            ("edge_prior", np.float32, edge_capacity),
+            ("_table", np.int32, self._table_size(capacity)),
+            ("_counts", np.int64, 2),
+        ]
+        layout, offset = {}, 0
+        for field, dtype, length in fields:
+            layout[field] = (offset, dtype, length)
+            offset += -(-np.dtype(dtype).itemsize * length // 8) * 8
+        return layout, offset
+
+    @property
+    def size(self):
+        return int(self._counts[0])
+
+    @size.setter
+    def size(self, value):
+        self._counts[0] = value
+
+    @property
+    def edge_size(self):
+        return int(self._counts[1])
+
+    @edge_size.setter
+    def edge_size(self, value):
+        self._counts[1] = value
+
+    @classmethod
+    def from_tree(cls, tree: ArrayTree, capacity, edge_capacity):
+        shared = cls(max(capacity, len(tree)), max(edge_capacity, tree.edge_size))
+        for name in cls.NODE_ARRAYS:
+            getattr(shared, name)[: tree.size] = getattr(tree, name)[: tree.size]
+        for name in cls.EDGE_ARRAYS:
+            getattr(shared, name)[: tree.edge_size] = getattr(tree, name)[: tree.edge_size]
+        shared.size = tree.size
+        shared.edge_size = tree.edge_size
+        shared._table[:] = -1
+        for node in range(tree.size):
+            shared._insert(node)
+        return shared
+
+    def to_tree(self) -> ArrayTree:
+        tree = ArrayTree(capacity=max(self.size, 16))
+        tree.edge_size = self.edge_size
+        tree._grow(tree.EDGE_ARRAYS, tree, 0, self.edge_size)
+        for name in self.NODE_ARRAYS:
+            getattr(tree, name)[: self.size] = getattr(self, name)[: self.size]
+        for name in self.EDGE_ARRAYS:
+            getattr(tree, name)[: self.edge_size] = getattr(self, name)[: self.edge_size]
+        tree.size = self.size
+        tree._rebuild_table()
+        return tree
+
+    def _grow(self, arrays, owner, used, needed):
+        if needed > len(getattr(owner, arrays[0])):
+            raise MemoryError("shared search tree is full")
+        return False
+
+    def is_full(self):
+        return (
+            self.size + 1 >= self.capacity
+            or self.edge_size + MAX_MOVES > self.edge_capacity
+        )
+
+    def close(self, unlink=False):
+        for field in self.NODE_ARRAYS + self.EDGE_ARRAYS + ("_table", "_counts"):
+            setattr(self, field, None)
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _worker_mct(board, player, settings, seed, max_nodes=None):
+    random.seed(seed)
+    mct = Mct(State(bytearray(board), player), max_nodes=max_nodes, render=False)
+    for name, value in settings.items():
+        setattr(mct, name, value)
+    return mct
+
+
+def _root_worker(args):
+    board, player, settings, budget, seed, max_nodes = args
+    mct = _worker_mct(board, player, settings, seed, max_nodes)
+    playouts = mct._search_serial(budget)
+    tree = mct.tree
+    stats = []
+    for edge in tree.edges(0):
+        child = tree.edge_child[edge]
+        if child >= 0 and tree.edge_visits[edge]:
+            stats.append(
+                (int(tree.edge_move[edge]), int(tree.edge_visits[edge]),
+                 int(tree.visits[child]), float(tree.values[child]))
+            )
+    return playouts, stats
+
+
+def _tree_worker(name, capacity, edge_capacity, lock, done, board, player, settings,
+                 budget, seed):
+    tree = SharedTree(capacity, edge_capacity, name=name)
+    mct = _worker_mct(board, player, settings, seed)
+    mct.tree = tree
+    try:
+        while True:
+            with lock:
+                if budget.exhausted(done.value, tree) or tree.is_full():
+                    break
+                done.value += 1
+                nodes, edges, leaf, repeated = mct._select_leaf()
+                tree.add_virtual_loss(nodes, edges)
+            value = mct._evaluate(leaf, repeated)
+            with lock:
+                tree.remove_virtual_loss(nodes, edges)
+                tree.backpropagate(nodes, edges, value, leaf.player)
+    finally:
+        del mct
+        tree.close()
+
+
+def _merge_root(mct: Mct, results):
+    """
+    Adds the root move statistics of every worker to the main graph.
+    """
+    tree = mct.tree
+    board = SearchBoard(mct.root_state)
+    if not tree.is_expanded(0):
+        tree.expand(0, order_moves(board, board.legal_moves()))
+    for _, stats in results:
+        for code, edge_visits, visits, values in stats:
+            move = decode_move(code)
+            edge = tree.find_edge(0, move)
+            undo = board.make_move(move)
+            child = tree.child(edge, board.key)
+            board.unmake_move(undo)
+            tree.edge_visits[edge] += edge_visits
+            tree.visits[child] += visits
+            tree.values[child] += values
+            tree.visits[0] += edge_visits
+
+
+def _worker_budget(budget: SearchBudget):
+    # should_stop 只在本进程里有意义, 也未必能 pickle; 并行搜索只按预算结束
+    share = copy.copy(budget)
+    share.should_stop = None
+    return share
+
+
+def root_parallel_search(mct: Mct, workers, budget: SearchBudget):
+    """
+    Splits the playout budget over independent searches in `workers`
+    processes; time and node limits apply to each of them.
+    Returns the number of playouts run.
+    """
+    share = _worker_budget(budget)
+    if budget.max_playouts is not None:
+        share.max_playouts = math.ceil(budget.max_playouts / workers)
+    board = bytes(mct.root_state.board)
+    jobs = [
+        (board, mct.root_state.player, mct.settings(), share, random.getrandbits(32),
+         mct.max_nodes)
+        for _ in range(workers)
+    ]
+    with mp.Pool(workers) as pool:
+        results = pool.map(_root_worker, jobs)
+    _merge_root(mct, results)
+    return sum(playouts for playouts, _ in results)
+
+
+def tree_parallel_search(mct: Mct, workers, budget: SearchBudget):
+    """
+    Runs the budget over one graph in shared memory, grown by `workers`
+    processes. Returns the number of playouts run.
+    """
+    tree = mct.tree
+    # 每次模拟最多新增一个节点; 只限时间时按 TIMED_NODES 预留
+    grow = budget.max_playouts if budget.max_playouts is not None else TIMED_NODES
+    capacity = tree.size + grow + workers + 1
+    for limit in (budget.max_nodes, mct.max_nodes):
+        if limit:
+            capacity = max(min(capacity, limit), tree.size + workers + 1)
+    edge_capacity = tree.edge_size + (capacity - tree.size + 1) * MAX_MOVES
+    shared = SharedTree.from_tree(tree, capacity, edge_capacity)
+    lock = mp.Lock()
+    done = mp.Value("i", 0, lock=False)
+    board = bytes(mct.root_state.board)
+    share = _worker_budget(budget)
+    processes = [
+        mp.Process(
+            target=_tree_worker,
+            args=(shared.shm.name, shared.capacity, shared.edge_capacity, lock, done,
+                  board, mct.root_state.player, mct.settings(), share,
+                  random.getrandbits(32)),
+        )
+        for _ in range(workers)
+    ]
+    try:
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        mct.tree = shared.to_tree()
+        mct.tree.max_nodes = mct.max_nodes
+        mct.tree.max_bytes = mct.max_memory
+    finally:
+        shared.close(unlink=True)
+    return done.value
+
+
+SEARCHES = {"root": root_parallel_search, "tree": tree_parallel_search}
+
+
+def scaling_report(state: State, worker_counts, rounds, mode="tree"):
+    """
+    Searches `state` once per worker count and prints playouts/sec and the
+    scaling efficiency against the smallest worker count.
+    Returns [(workers, playouts, seconds)].
+    """
+    rows = []
+    for workers in worker_counts:
+        mct = Mct(state, workers=workers, parallel=mode, render=False)
+        mct.early_stop = False
+        mct.search(max_playouts=rounds)
+        rows.append((workers, mct.playouts, mct.search_time))
+    base_workers, base_playouts, base_time = rows[0]
+    base_rate = base_playouts / max(base_time, 1e-9)
+    print(f"{mode} parallel, {rounds} playouts")
+    for workers, playouts, seconds in rows:
+        rate = playouts / max(seconds, 1e-9)
+        efficiency = rate / base_rate * base_workers / workers
+        print(
+            f"  {workers:>3} workers {seconds:8.3f}s {rate:>10.1f} playouts/sec "
+            f"{efficiency:7.1%} efficiency"
+        )
+    return rows
+
+
+def main(argv=None):
+    from perft import reference_state
+
+    parser = argparse.ArgumentParser(description="Parallel MCTS scaling report")
+    parser.add_argument(
+        "--workers", type=int, action="append", help="worker count, may repeat"
+    )
+    parser.add_argument("--mode", choices=MODES, default="tree")
+    parser.add_argument("--rounds", type=int, default=300)
+    parser.add_argument("--position", default="midgame")
+    args = parser.parse_args(argv)
+    counts = args.workers or [1, 2, 4, mp.cpu_count()]
+    scaling_report(reference_state(args.position), sorted(set(counts)), args.rounds, args.mode)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,61 @@
+import random
+import unittest
+
+from mcts import Mct
+from parallel_mcts import SharedTree
+from perft import reference_state
+from tree import ArrayTree
+
+
+class SharedTreeTest(unittest.TestCase):
+    def test_round_trip(self):
+        tree = ArrayTree()
+        root = tree.add_node(7)
+        first = tree.expand(root, [(6, 0, 5, 0), (6, 2, 5, 2)])
+        child = tree.child(first + 1, 9)
+        tree.backpropagate([root, child], [first + 1], 1, -1)
+        shared = SharedTree.from_tree(tree, 8, 64)
+        try:
+            self.assertEqual((len(shared), shared.edge_size), (2, 2))
+            self.assertEqual(shared.lookup(9), child)
+            shared.child(first, 8)
+            copy = shared.to_tree()
+        finally:
+            shared.close(unlink=True)
+        self.assertEqual(len(copy), 3)
+        self.assertEqual(copy.lookup(8), 2)
+        self.assertEqual(copy.values[child], 1)
+        self.assertEqual(copy.edge_move_of(first), (6, 0, 5, 0))
+
+    def test_evict_in_place(self):
+        tree = ArrayTree()
+        root = tree.add_node(7)
+        first = tree.expand(root, [(6, 0, 5, 0), (6, 2, 5, 2)])
+        kept, dropped = tree.child(first, 9), tree.child(first + 1, 10)
+        for child, edge in ((kept, first), (kept, first), (dropped, first + 1)):
+            tree.backpropagate([root, child], [edge], 1, -1)
+        shared = SharedTree.from_tree(tree, 8, 64)
+        try:
+            self.assertEqual(shared.evict(keep=0.7), 2)
+            self.assertEqual(shared.lookup(9), 1)
+            self.assertEqual(shared.lookup(10), -1)
+            self.assertEqual(shared.capacity, 8)
+        finally:
+            shared.close(unlink=True)
+
+
+class ParallelSearchTest(unittest.TestCase):
+    def test_modes(self):
+        random.seed(3)
+        for mode in ("root", "tree"):
+            mct = Mct(reference_state("endgame"), workers=2, parallel=mode, render=False)
+            mct.early_stop = False
+            mct.search(max_playouts=20)
+            self.assertEqual(mct.playouts, 20)
+            visits = sum(mct.tree.edge_visits[edge] for edge in mct.tree.edges(0))
+            self.assertGreaterEqual(visits, 18)
+            self.assertIsNotNone(mct.do_best_move())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+"""
+Perft: counts the leaf nodes of the move tree to a fixed depth.
+Used to check every move generator against known node counts and to measure
+their speed side by side.
+
+    python perft.py --depth 3
+    python perft.py --position midgame --depth 2 --divide
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from board import COLS, EMPTY_NAME, INITIAL_STATE
+from pieces import Piece
+from pieces_move import board_moves_lut
+from state import SearchBoard, State, side_of
+
+# fmt: off
+MIDGAME_STATE = [
+    ["一一", "红马", "一一", "红士", "红帅", "红士", "红象", "一一", "一一"],
+    ["红车", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
+    ["红车", "一一", "一一", "一一", "红象", "一一", "一一", "一一", "红马"],
+    ["红兵", "一一", "红兵", "一一", "一一", "一一", "一一", "一一", "红兵"],
+    ["一一", "一一", "一一", "一一", "红兵", "一一", "红兵", "一一", "一一"],
+    ["黑兵", "一一", "黑兵", "一一", "黑兵", "一一", "一一", "一一", "一一"],
+    ["一一", "一一", "一一", "一一", "一一", "黑炮", "黑兵", "一一", "一一"],
+    ["一一", "一一", "黑炮", "一一", "黑象", "红炮", "一一", "红炮", "黑车"],
+    ["黑车", "黑马", "一一", "一一", "黑帅", "一一", "一一", "一一", "一一"],
+    ["一一", "一一", "一一", "黑士", "一一", "黑士", "黑象", "黑马", "一一"],
+]
+ENDGAME_STATE = [
+    ["一一", "一一", "一一", "红士", "红帅", "一一", "一一", "一一", "一一"],
+    ["一一", "一一", "一一", "一一", "红士", "一一", "一一", "一一", "一一"],
+    ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
+    ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
+    ["一一", "一一", "红兵", "一一", "一一", "一一", "一一", "一一", "一一"],
+    ["一一", "一一", "一一", "一一", "一一", "一一", "黑马", "一一", "一一"],
+    ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
+    ["一一", "一一", "一一", "一一", "一一", "红车", "一一", "一一", "一一"],
+    ["一一", "一一", "一一", "一一", "黑帅", "一一", "一一", "一一", "一一"],
+    ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
+]
+# fmt: on
+
+# name: (matrix, player to move, known node counts for depth 1, 2, 3, ...)
+# 伪合法走法计数: 没有将军判定, 吃掉将帅即终局
+REFERENCE_POSITIONS = {
+    "initial": (INITIAL_STATE, 1, [44, 1926, 80288, 3343044]),
+    "midgame": (MIDGAME_STATE, 1, [40, 1658, 67094, 2852861]),
+    "endgame": (ENDGAME_STATE, -1, [22, 262, 4994, 51488, 979882]),
+}
+# 合法走法计数 (不能送将, 将帅不能照面), 初始局面与公开的象棋 perft 数据一致
+LEGAL_COUNTS = {
+    "initial": [44, 1920, 79666, 3290240],
+    "midgame": [40, 1658, 66875, 2835295],
+    "endgame": [19, 187, 3282, 28482, 488700],
+}
+
+
+def _matrix_moves(matrix, player):
+    color = "黑" if player == 1 else "红"
+    mapping = Piece.get_name_to_cls_mapping()
+    for x, row in enumerate(matrix):
+        for y, name in enumerate(row):
+            if name.startswith(color):
+                for nx, ny in mapping[name].get_next_legal_move(matrix, x, y):
+                    yield x, y, nx, ny
+
+
+def _perft_matrix(matrix, player, depth):
+    # 原来的字符串矩阵走法生成, 作为正确性参照
+    if depth == 0:
+        return 1
+    general = "黑帅" if player == 1 else "红帅"
+    if not any(general in row for row in matrix):
+        return 0
+    nodes = 0
+    for x, y, nx, ny in _matrix_moves(matrix, player):
+        child = [row[:] for row in matrix]
+        child[nx][ny], child[x][y] = child[x][y], EMPTY_NAME
+        nodes += 1 if depth == 1 else _perft_matrix(child, -player, depth - 1)
+    return nodes
+
+
+def _perft_state(state: State, depth):
+    if depth == 0:
+        return 1
+    if not state.valid():
+        return 0
+    children = state.get_pseudo_legal_moves()
+    if depth == 1:
+        return len(children)
+    return sum(_perft_state(child, depth - 1) for child in children)
+
+
+def _perft_search(board: SearchBoard, depth):
+    if depth == 0:
+        return 1
+    if not board.valid():
+        return 0
+    moves = list(board.moves())
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        undo = board.make_move(move)
+        nodes += _perft_search(board, depth - 1)
+        board.unmake_move(undo)
+    return nodes
+
+
+def _perft_legal(board: SearchBoard, depth):
+    if depth == 0:
+        return 1
+    moves = board.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        undo = board.make_move(move)
+        nodes += _perft_legal(board, depth - 1)
+        board.unmake_move(undo)
+    return nodes
+
+
+def _lut_moves(board: SearchBoard):
+    color = 8 if side_of(board.player) else 0
+    for src, dst in board_moves_lut(board.board, color):
+        yield src // COLS, src % COLS, dst // COLS, dst % COLS
+
+
+def _perft_lut(board: SearchBoard, depth):
+    if depth == 0:
+        return 1
+    if not board.valid():
+        return 0
+    moves = list(_lut_moves(board))
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        undo = board.make_move(move)
+        nodes += _perft_lut(board, depth - 1)
+        board.unmake_move(undo)
+    return nodes
+
+
+GENERATORS = {
+    "matrix": lambda state, depth: _perft_matrix(state.state, state.player, depth),
+    "state": _perft_state,
+    "search": lambda state, depth: _perft_search(SearchBoard(state), depth),
+    "lut": lambda state, depth: _perft_lut(SearchBoard(state), depth),
+    "legal": lambda state, depth: _perft_legal(SearchBoard(state), depth),
+}
+
+
+def perft(state: State, depth, generator="search"):
+    """
+    Number of leaf positions `depth` plies below `state`.
+    Leaves are counted as they are; an inner position whose side to move
+    has lost its general has no moves.
+    """
+    return GENERATORS[generator](state, depth)
+
+
+def divide(state: State, depth, generator="search"):
+    """
+    Perft split by root move, {(x, y, nx, ny): nodes}.
+    """
+    board = SearchBoard(state)
+    if depth < 1 or not board.valid():
+        return {}
+    moves = board.legal_moves() if generator == "legal" else board.moves()
+    return {
+        move: perft(state.apply_move(move[:2], move[2:]), depth - 1, generator)
+        for move in moves
+    }
+
+
+def known_counts(name, generator):
+    return LEGAL_COUNTS[name] if generator == "legal" else REFERENCE_POSITIONS[name][2]
+
+
+def reference_state(name) -> State:
+    matrix, player, _ = REFERENCE_POSITIONS[name]
+    return State(matrix, player)
+
+
+def run_benchmark(positions, depth, generators, show_divide=False):
+    """
+    Runs perft on each reference position with every generator, checks the
+    node counts against the stored ones and prints nodes/sec.
+    Returns False if any count disagrees.
+    """
+    ok = True
+    for name in positions:
+        state = reference_state(name)
+        print(f"{name} depth {depth}")
+        if show_divide:
+            for move, nodes in sorted(divide(state, depth).items()):
+                print(f"  {move}: {nodes}")
+        for generator in generators:
+            known = known_counts(name, generator)
+            expect = known[depth - 1] if depth <= len(known) else None
+            start = time.perf_counter()
+            nodes = perft(state, depth, generator)
+            elapsed = time.perf_counter() - start
+            status = "" if expect is None else (" ok" if nodes == expect else " MISMATCH")
+            ok = ok and (expect is None or nodes == expect)
+            print(
+                f"  {generator:<7}{nodes:>10} nodes {elapsed:8.3f}s "
+                f"{nodes / max(elapsed, 1e-9):>12.0f} nodes/sec{status}"
+            )
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft move generator benchmark")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument(
+        "--position",
+        action="append",
+        choices=sorted(REFERENCE_POSITIONS),
+        help="reference position, may repeat (default: all)",
+    )
+    parser.add_argument(
+        "--generator",
+        action="append",
+        choices=sorted(GENERATORS),
+        help="move generator, may repeat (default: all)",
+    )
+    parser.add_argument("--divide", action="store_true", help="print per-move counts")
+    args = parser.parse_args(argv)
+    ok = run_benchmark(
+        args.position or list(REFERENCE_POSITIONS),
+        args.depth,
+        args.generator or list(GENERATORS),
+        args.divide,
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,49 @@
+import unittest
+
+from perft import (
+    GENERATORS,
+    REFERENCE_POSITIONS,
+    divide,
+    known_counts,
+    perft,
+    reference_state,
+)
+
+
+class PerftTest(unittest.TestCase):
+    def test_known_counts(self):
+        for name in REFERENCE_POSITIONS:
+            state = reference_state(name)
+            for generator in GENERATORS:
+                known = known_counts(name, generator)
+                for depth in (1, 2):
+                    self.assertEqual(
+                        perft(state, depth, generator),
+                        known[depth - 1],
+                        f"{name} {generator} depth {depth}",
+                    )
+
+    def test_endgame_depth_4(self):
+        # 残局第 4 层有被将死/困毙的局面, 伪合法计数不能把它们剪掉
+        state = reference_state("endgame")
+        for generator in GENERATORS:
+            self.assertEqual(
+                perft(state, 4, generator),
+                known_counts("endgame", generator)[3],
+                generator,
+            )
+
+    def test_divide(self):
+        state = reference_state("endgame")
+        counts = divide(state, 3)
+        self.assertEqual(len(counts), 22)
+        self.assertEqual(sum(counts.values()), perft(state, 3))
+
+    def test_divide_legal(self):
+        state = reference_state("endgame")
+        counts = divide(state, 2, "legal")
+        self.assertEqual(len(counts), 19)
+        self.assertEqual(sum(counts.values()), 187)
+
+
+unittest.main()
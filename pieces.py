@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from board import NAME_TO_CODE
 from pieces_move import (
     car_filter,
     cannon_filter,
@@ -24,15 +25,19 @@ class AbstractPiece(ABC):
 
 class Piece(AbstractPiece):
     available_pieces = []
+    name_to_cls = {}
 
     name = None
+    code = None
     move_func = None
     filter_func = None
 
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
         if cls.name:
+            cls.code = NAME_TO_CODE[cls.name]
             Piece.available_pieces.append(cls)
+            Piece.name_to_cls[cls.name] = cls
         if cls.name and cls.move_func:
             color = cls.name[0]
             cls.get_next_legal_move = filter_legal_moves(color, cls.filter_func)(
@@ -49,7 +54,7 @@ class Piece(AbstractPiece):
 
     @staticmethod
     def get_name_to_cls_mapping():
-        return {piece.name: piece for piece in Piece.available_pieces}
+        return Piece.name_to_cls
 
 
 class BlackMinion(Piece):
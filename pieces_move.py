@@ -1,3 +1,6 @@
+from board import BLACK, COLS, KIND_MASK, ROWS, SQUARES, Kind
+
+
 def is_legal_by_bound(state, x, y):
     return 0 <= x < len(state) and 0 <= y < len(state[0])
 
@@ -121,3 +124,296 @@ car_filter = lambda s, x, y, nx, ny: linear_move_filter(
 cannon_filter = lambda s, x, y, nx, ny: linear_move_filter(
     s, x, y, nx, ny, allow_jump=True
 )
+
+
+# 以下为紧凑棋盘(board.py)上的走法生成, 格子下标 sq = x * COLS + y
+
+
+def _in_palace(color, x, y):
+    return 3 <= y <= 5 and (7 <= x <= 9 if color else 0 <= x <= 2)
+
+
+def _on_own_side(color, x):
+    return x >= 5 if color else x <= 4
+
+
+def _build_step_table(offsets, allowed):
+    table = [[] for _ in range(16)]
+    for color in (0, BLACK):
+        rows = []
+        for sq in range(SQUARES):
+            x, y = divmod(sq, COLS)
+            rows.append(
+                tuple(
+                    (x + dx) * COLS + y + dy
+                    for dx, dy in offsets(color, x)
+                    if 0 <= x + dx < ROWS
+                    and 0 <= y + dy < COLS
+                    and allowed(color, x + dx, y + dy)
+                )
+            )
+        table[color] = rows
+    return table
+
+
+def _build_blocked_table(offsets, allowed):
+    # 每一项为 (目标格, 蹩马腿/塞象眼的格子)
+    table = [[] for _ in range(16)]
+    for color in (0, BLACK):
+        rows = []
+        for sq in range(SQUARES):
+            x, y = divmod(sq, COLS)
+            entries = []
+            for dx, dy in offsets:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < ROWS and 0 <= ny < COLS and allowed(color, nx, ny)):
+                    continue
+                if abs(dx) == 2:
+                    block = (x + dx // 2) * COLS + y + (dy // 2 if abs(dy) == 2 else 0)
+                else:
+                    block = x * COLS + y + dy // 2
+                entries.append((nx * COLS + ny, block))
+            rows.append(tuple(entries))
+        table[color] = rows
+    return table
+
+
+def _minion_offsets(color, x):
+    if color:
+        return [(-1, 0)] if x > 4 else [(-1, 0), (0, 1), (0, -1)]
+    return [(1, 0)] if x < 5 else [(1, 0), (0, 1), (0, -1)]
+
+
+MINION_TABLE = _build_step_table(_minion_offsets, lambda color, x, y: True)
+GURDIAN_TABLE = _build_step_table(
+    lambda color, x: [(-1, -1), (-1, 1), (1, -1), (1, 1)], _in_palace
+)
+GENERAL_TABLE = _build_step_table(
+    lambda color, x: [(-1, 0), (1, 0), (0, -1), (0, 1)], _in_palace
+)
+HORSE_TABLE = _build_blocked_table(
+    [(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)],
+    lambda color, x, y: True,
+)
+ELEPHANT_TABLE = _build_blocked_table(
+    [(2, 2), (2, -2), (-2, 2), (-2, -2)],
+    lambda color, x, y: _on_own_side(color, x),
+)
+
+
+def _step_move(table):
+    def move(board, sq):
+        color = board[sq] & BLACK
+        moves = []
+        for to in table[color][sq]:
+            target = board[to]
+            if not target or (target & BLACK) != color:
+                moves.append(to)
+        return moves
+
+    return move
+
+
+def _blocked_move(table):
+    def move(board, sq):
+        color = board[sq] & BLACK
+        moves = []
+        for to, block in table[color][sq]:
+            if board[block]:
+                continue
+            target = board[to]
+            if not target or (target & BLACK) != color:
+                moves.append(to)
+        return moves
+
+    return move
+
+
+board_minion_move = _step_move(MINION_TABLE)
+board_gurdian_move = _step_move(GURDIAN_TABLE)
+board_general_move = _step_move(GENERAL_TABLE)
+board_horse_move = _blocked_move(HORSE_TABLE)
+board_elephant_move = _blocked_move(ELEPHANT_TABLE)
+
+
+def _build_rays():
+    rays = []
+    for sq in range(SQUARES):
+        x, y = divmod(sq, COLS)
+        rays.append(
+            (
+                tuple(i * COLS + y for i in range(x + 1, ROWS)),
+                tuple(i * COLS + y for i in range(x - 1, -1, -1)),
+                tuple(x * COLS + i for i in range(y + 1, COLS)),
+                tuple(x * COLS + i for i in range(y - 1, -1, -1)),
+            )
+        )
+    return rays
+
+
+# 每个格子向下、上、右、左四个方向的射线, 由近及远
+RAYS = _build_rays()
+
+
+def board_car_move(board, sq):
+    color = board[sq] & BLACK
+    moves = []
+    for ray in RAYS[sq]:
+        for to in ray:
+            target = board[to]
+            if not target:
+                moves.append(to)
+                continue
+            if (target & BLACK) != color:
+                moves.append(to)
+            break
+    return moves
+
+
+def board_cannon_move(board, sq):
+    color = board[sq] & BLACK
+    moves = []
+    for ray in RAYS[sq]:
+        screen = False
+        for to in ray:
+            target = board[to]
+            if not screen:
+                if target:
+                    screen = True
+                else:
+                    moves.append(to)
+            elif target:
+                if (target & BLACK) != color:
+                    moves.append(to)
+                break
+    return moves
+
+
+def _scan_line(occ, length, pos, step, quiet):
+    i = pos + step
+    while 0 <= i < length and not occ >> i & 1:
+        quiet.append(i)
+        i += step
+    if not 0 <= i < length:
+        return -1, -1
+    car_capture = i
+    i += step
+    while 0 <= i < length and not occ >> i & 1:
+        i += step
+    return car_capture, i if 0 <= i < length else -1
+
+
+def _build_slide_table(length):
+    """
+    For a line of `length` cells, maps [occupancy bitmask][position] to
+    (empty cells reachable, (car, cannon) capture cell forward, same backward).
+    Missing captures are -1.
+    """
+    table = []
+    for occ in range(1 << length):
+        entries = []
+        for pos in range(length):
+            quiet = []
+            forward = _scan_line(occ, length, pos, 1, quiet)
+            backward = _scan_line(occ, length, pos, -1, quiet)
+            entries.append((tuple(quiet), forward, backward))
+        table.append(entries)
+    return table
+
+
+RANK_SLIDES = _build_slide_table(COLS)
+FILE_SLIDES = _build_slide_table(ROWS)
+
+
+def line_occupancy(board):
+    """
+    Returns the occupancy bitmask of every rank (row) and every file (column).
+    """
+    ranks = [0] * ROWS
+    files = [0] * COLS
+    for sq in range(SQUARES):
+        if board[sq]:
+            x, y = divmod(sq, COLS)
+            ranks[x] |= 1 << y
+            files[y] |= 1 << x
+    return ranks, files
+
+
+def board_slider_move_lut(board, sq, ranks, files):
+    """
+    Car or cannon moves from rank/file occupancy lookup tables.
+    `ranks` and `files` come from line_occupancy and must match `board`.
+    """
+    code = board[sq]
+    color = code & BLACK
+    capture_index = 0 if code & KIND_MASK == Kind.CAR else 1
+    x, y = divmod(sq, COLS)
+    moves = []
+    quiet, forward, backward = RANK_SLIDES[ranks[x]][y]
+    row = x * COLS
+    moves.extend(row + i for i in quiet)
+    for i in (forward[capture_index], backward[capture_index]):
+        if i >= 0 and (board[row + i] & BLACK) != color:
+            moves.append(row + i)
+    quiet, forward, backward = FILE_SLIDES[files[y]][x]
+    moves.extend(i * COLS + y for i in quiet)
+    for i in (forward[capture_index], backward[capture_index]):
+        if i >= 0 and (board[i * COLS + y] & BLACK) != color:
+            moves.append(i * COLS + y)
+    return moves
+
+
+BOARD_MOVE_FUNCS = {
+    Kind.MINION: board_minion_move,
+    Kind.CAR: board_car_move,
+    Kind.CANNON: board_cannon_move,
+    Kind.HORSE: board_horse_move,
+    Kind.ELEPHANT: board_elephant_move,
+    Kind.GURDIAN: board_gurdian_move,
+    Kind.GENERAL: board_general_move,
+}
+
+
+def board_moves(board, color):
+    """
+    Yields every (from, to) square pair for the side whose color bit is `color`.
+    """
+    move_funcs = _MOVE_FUNCS_BY_CODE
+    for sq in range(SQUARES):
+        code = board[sq]
+        if code and (code & BLACK) == color:
+            for to in move_funcs[code](board, sq):
+                yield sq, to
+
+
+def piece_moves(board, squares):
+    """
+    Yields every (from, to) square pair for the pieces standing on `squares`.
+    """
+    move_funcs = _MOVE_FUNCS_BY_CODE
+    for sq in squares:
+        for to in move_funcs[board[sq]](board, sq):
+            yield sq, to
+
+
+def board_moves_lut(board, color):
+    """
+    Same as board_moves, but cars and cannons use the occupancy lookup tables.
+    """
+    ranks, files = line_occupancy(board)
+    move_funcs = _MOVE_FUNCS_BY_CODE
+    for sq in range(SQUARES):
+        code = board[sq]
+        if code and (code & BLACK) == color:
+            if code & KIND_MASK in (Kind.CAR, Kind.CANNON):
+                targets = board_slider_move_lut(board, sq, ranks, files)
+            else:
+                targets = move_funcs[code](board, sq)
+            for to in targets:
+                yield sq, to
+
+
+_MOVE_FUNCS_BY_CODE = [None] * 16
+for _kind, _func in BOARD_MOVE_FUNCS.items():
+    _MOVE_FUNCS_BY_CODE[_kind] = _func
+    _MOVE_FUNCS_BY_CODE[BLACK | _kind] = _func
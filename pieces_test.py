@@ -16,6 +16,13 @@ from pieces import (
     BlackGurdian,
     cannon_filter,
 )
+from board import to_board
+from pieces_move import (
+    board_car_move,
+    board_cannon_move,
+    board_slider_move_lut,
+    line_occupancy,
+)
 from state import StateMachine
 
 
@@ -228,5 +235,39 @@ class TestPieces(unittest.TestCase):
         expect_moves = {(7, 3), (7, 5), (9, 5)}
         self.assertEqual(actual_moves, expect_moves)
 
+    def test_board_slider_moves(self):
+        # fmt: off
+        state = [
+            ["红车", "红马", "红象", "红士", "红帅", "红士", "红象", "红马", "红车"],
+            ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
+            ["一一", "红炮", "一一", "一一", "一一", "一一", "一一", "红炮", "一一"],
+            ["红兵", "一一", "红兵", "一一", "红兵", "一一", "红兵", "一一", "红兵"],
+            ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
+            ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
+            ["黑兵", "一一", "黑兵", "一一", "黑兵", "一一", "黑兵", "一一", "黑兵"],
+            ["一一", "黑炮", "一一", "一一", "一一", "一一", "一一", "黑炮", "一一"],
+            ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
+            ["黑车", "黑马", "黑象", "黑士", "黑帅", "黑士", "黑象", "黑马", "黑车"],
+        ]
+        # fmt: on
+        board = to_board(state)
+        ranks, files = line_occupancy(board)
+        for sq, move_func in [(64, board_cannon_move), (81, board_car_move)]:
+            x, y = divmod(sq, 9)
+            expect_moves = {
+                nx * 9 + ny
+                for nx, ny in Piece.get_name_to_cls_mapping()[
+                    state[x][y]
+                ].get_next_legal_move(state, x, y)
+            }
+            self.assertEqual(set(move_func(board, sq)), expect_moves)
+            self.assertEqual(
+                set(board_slider_move_lut(board, sq, ranks, files)), expect_moves
+            )
+        self.assertEqual(
+            set(board_cannon_move(board, 64)),
+            {1, 28, 37, 46, 55, 73, 63, 65, 66, 67, 68, 69},
+        )
+
 
 unittest.main()
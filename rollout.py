@@ -0,0 +1,106 @@
+"""
+Rollout policies: how Mct.simulate picks the next move of a playout.
+A policy sees the SearchBoard and its legal moves and returns one of them.
+
+    mct.rollout_policy = make_policy("capture")
+"""
+
+from __future__ import annotations
+
+import random
+from abc import ABC, abstractmethod
+
+from board import COLS, PIECE_VALUES
+from evaluate import evaluate
+from state import SearchBoard
+
+
+class RolloutPolicy(ABC):
+    name = None
+
+    @abstractmethod
+    def choose(self, board: SearchBoard, moves, rng=random):
+        pass
+
+
+class UniformPolicy(RolloutPolicy):
+    """
+    Every legal move equally likely.
+    """
+
+    name = "uniform"
+
+    def choose(self, board: SearchBoard, moves, rng=random):
+        return rng.choice(moves)
+
+
+def mvv_lva(board, move):
+    """
+    Capture order score: most valuable victim first, then least valuable
+    attacker. 0 for quiet moves.
+    """
+    x, y, nx, ny = move
+    victim = PIECE_VALUES[board[nx * COLS + ny]]
+    if not victim:
+        return 0
+    return victim * 10 - PIECE_VALUES[board[x * COLS + y]] + 1
+
+
+class CapturePolicy(RolloutPolicy):
+    """
+    Plays the best capture by MVV-LVA with probability `capture_rate`,
+    otherwise a uniformly random move.
+    """
+
+    name = "capture"
+
+    def __init__(self, capture_rate=0.9):
+        self.capture_rate = capture_rate
+
+    def choose(self, board: SearchBoard, moves, rng=random):
+        if rng.random() < self.capture_rate:
+            cells = board.board
+            score, move = max((mvv_lva(cells, move), move) for move in moves)
+            if score:
+                return move
+        return rng.choice(moves)
+
+
+class EpsilonGreedyPolicy(RolloutPolicy):
+    """
+    With probability 1 - `epsilon`, the move whose resulting position
+    `evaluate_fn` rates best for the mover (ties broken at random); otherwise
+    a uniformly random move. `evaluate_fn` takes a SearchBoard and scores
+    it from black's point of view; the default reads the running
+    material and piece-square score.
+    """
+
+    name = "greedy"
+
+    def __init__(self, epsilon=0.1, evaluate_fn=None):
+        self.epsilon = epsilon
+        self.evaluate_fn = evaluate_fn or evaluate
+
+    def choose(self, board: SearchBoard, moves, rng=random):
+        if rng.random() < self.epsilon:
+            return rng.choice(moves)
+        player = board.player
+        best, best_score = [], None
+        for move in moves:
+            undo = board.make_move(move)
+            score = player * self.evaluate_fn(board)
+            board.unmake_move(undo)
+            if best_score is None or score > best_score:
+                best, best_score = [move], score
+            elif score == best_score:
+                best.append(move)
+        return rng.choice(best)
+
+
+POLICIES = {
+    policy.name: policy for policy in (UniformPolicy, CapturePolicy, EpsilonGreedyPolicy)
+}
+
+
+def make_policy(name, **kwargs) -> RolloutPolicy:
+    return POLICIES[name](**kwargs)
@@ -0,0 +1,89 @@
+import random
+import unittest
+
+from evaluate import evaluate, material, scaled
+from mcts import Mct
+from perft import reference_state
+from rollout import (
+    POLICIES,
+    CapturePolicy,
+    EpsilonGreedyPolicy,
+    RolloutPolicy,
+    make_policy,
+    mvv_lva,
+)
+from state import SearchBoard
+from testutil import make_state
+
+
+# 红车可以吃黑车或黑兵, 红兵可以吃黑车
+CAPTURES = {
+    (0, 4): "红帅",
+    (2, 0): "红车",
+    (5, 0): "黑兵",
+    (2, 8): "黑车",
+    (1, 8): "红兵",
+    (9, 3): "黑帅",
+}
+
+
+class RolloutPolicyTest(unittest.TestCase):
+    def test_material(self):
+        self.assertEqual(material(reference_state("initial").board), 0)
+        board = SearchBoard(make_state(CAPTURES, -1))
+        self.assertEqual(material(board.board), 9 + 1 - 9 - 1)
+        self.assertAlmostEqual(scaled(0), 0)
+        self.assertGreater(scaled(5), 0)
+        self.assertLess(scaled(-100), -0.99)
+
+    def test_mvv_lva(self):
+        board = SearchBoard(make_state(CAPTURES, -1)).board
+        self.assertEqual(mvv_lva(board, (2, 0, 1, 0)), 0)
+        # 同样吃车, 用兵吃比用车吃好
+        self.assertGreater(mvv_lva(board, (1, 8, 2, 8)), mvv_lva(board, (2, 0, 2, 8)))
+        self.assertGreater(mvv_lva(board, (2, 0, 2, 8)), mvv_lva(board, (2, 0, 5, 0)))
+
+    def test_capture_policy(self):
+        board = SearchBoard(make_state(CAPTURES, -1))
+        moves = board.legal_moves()
+        policy = CapturePolicy(capture_rate=1)
+        self.assertEqual(policy.choose(board, moves, random.Random(1)), (1, 8, 2, 8))
+
+    def test_greedy_policy(self):
+        board = SearchBoard(make_state(CAPTURES, -1))
+        moves = board.legal_moves()
+        policy = EpsilonGreedyPolicy(epsilon=0)
+        self.assertIn(policy.choose(board, moves, random.Random(1)), [(1, 8, 2, 8), (2, 0, 2, 8)])
+        self.assertEqual(board.board, SearchBoard(make_state(CAPTURES, -1)).board)
+
+    def test_policies_play_legal_moves(self):
+        rng = random.Random(3)
+        for name in POLICIES:
+            policy = make_policy(name)
+            board = SearchBoard(reference_state("midgame"))
+            for _ in range(20):
+                moves = board.legal_moves()
+                if not moves:
+                    break
+                move = policy.choose(board, moves, rng)
+                self.assertIn(move, moves)
+                board.make_move(move)
+
+    def test_policy_must_define_choose(self):
+        class Incomplete(RolloutPolicy):
+            name = "incomplete"
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_cutoff_returns_scaled_evaluation(self):
+        random.seed(1)
+        mct = Mct(reference_state("midgame"), render=False)
+        mct.rollout_cutoff = 0
+        self.assertAlmostEqual(mct.simulate(mct.state), scaled(evaluate(mct.state), mct.eval_scale))
+        mct.rollout_cutoff = 4
+        mct.rollout_policy = make_policy("greedy")
+        self.assertTrue(-1 <= mct.simulate(mct.state) <= 1)
+
+
+unittest.main()
@@ -0,0 +1,231 @@
+"""
+Self-play data generation: engine against engine games over a process
+pool, streamed to sharded gzip JSON lines files as they finish.
+
+    python selfplay.py --games 1000 --out selfplay --rounds 200
+
+Every game gets its own seed (base seed + game number), so a game can be
+replayed on its own and the output does not depend on the number of
+workers. Each line is one game:
+
+    {"game": 7, "seed": 7, "board": "<hex of the 90 square start board>",
+     "player": 1, "moves": [[x, y, nx, ny], ...],
+     "visits": [[[x, y, nx, ny, visits], ...], ...],
+     "result": 1, "termination": "mate"}
+
+`visits` holds the root visit counts of the MCTS search behind every move
+(empty for alpha-beta moves); `result` is 1 when black wins, -1 when red
+wins and 0 for games stopped at the ply limit or by repetition.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import multiprocessing as mp
+import os
+import random
+import time
+
+from alphabeta import AlphaBeta
+from mcts import Mct
+from rollout import make_policy
+from state import State
+
+ENGINES = ("mcts", "alphabeta")
+SHARD_PATTERN = "selfplay-{:05d}.jsonl.gz"
+
+DEFAULT_CONFIG = {
+    "red": "mcts",
+    "black": "mcts",
+    "rounds": 100,
+    "time_limit": None,
+    "depth": 3,
+    "rollout_policy": "uniform",
+    "rollout_cutoff": 40,
+    "max_plies": 200,
+    # 前这么多步按访问次数随机选, 让对局各不相同
+    "sample_plies": 8,
+}
+
+
+def _engine(name, state: State, config):
+    if name == "alphabeta":
+        engine = AlphaBeta(state, render=False)
+        engine.depth = config["depth"]
+    else:
+        engine = Mct(state, render=False)
+        engine.rounds = config["rounds"]
+        engine.rollout_policy = make_policy(config["rollout_policy"])
+        engine.rollout_cutoff = config["rollout_cutoff"]
+    engine.time_limit = config["time_limit"]
+    return engine
+
+
+def play_game(args):
+    """
+    Plays game number `game` from `state` with `seed` and returns its record.
+    """
+    game, seed, state, config = args
+    rng = random.Random(seed)
+    # 随机对局用的是 random 模块的全局状态
+    random.seed(seed)
+    engines = {-1: _engine(config["red"], state, config), 1: _engine(config["black"], state, config)}
+    record = {
+        "game": game,
+        "seed": seed,
+        "board": bytes(state.board).hex(),
+        "player": state.player,
+        "moves": [],
+        "visits": [],
+    }
+    seen = {state.key}
+    termination = "max_plies"
+    current = state
+    for ply in range(config["max_plies"]):
+        if current.is_terminal():
+            termination = "mate"
+            break
+        engine = engines[current.player]
+        move = engine.search()
+        visits = engine.root_visits() if isinstance(engine, Mct) else []
+        if ply < config["sample_plies"] and visits:
+            moves, counts = zip(*visits)
+            move = rng.choices(moves, counts)[0]
+        x, y, nx, ny = move
+        for each in engines.values():
+            each.do_human_move((x, y), (nx, ny))
+        current = engines[1].state
+        record["moves"].append(list(move))
+        record["visits"].append([[*m, n] for m, n in visits])
+        if current.key in seen:
+            # 局面重复, 按和棋结束
+            termination = "repetition"
+            break
+        seen.add(current.key)
+    else:
+        if current.is_terminal():
+            termination = "mate"
+    record["result"] = current.get_result() if termination == "mate" else 0
+    record["termination"] = termination
+    return record
+
+
+class ShardWriter:
+    """
+    Appends game records to gzip JSON lines shards of `shard_size` games,
+    counting the positions written.
+    """
+
+    def __init__(self, directory, shard_size=1000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_size = shard_size
+        self.shard = -1
+        self.count = 0
+        self._file = None
+        self.paths = []
+        self.positions = 0
+
+    def write(self, record):
+        if self._file is None or self.count == self.shard_size:
+            self._open_next()
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.count += 1
+        self.positions += len(record["moves"])
+
+    def _open_next(self):
+        self.close()
+        self.shard += 1
+        self.count = 0
+        path = os.path.join(self.directory, SHARD_PATTERN.format(self.shard))
+        self.paths.append(path)
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_games(paths):
+    """
+    Yields the records of self-play shards, in file order.
+    """
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def record_state(record) -> State:
+    """
+    The start position of a game record.
+    """
+    return State(bytearray.fromhex(record["board"]), record["player"])
+
+
+def self_play(state: State, games, directory, workers=None, seed=0, shard_size=1000, config=None):
+    """
+    Plays `games` games from `state` over `workers` processes and writes
+    them to shards in `directory` as they finish. Returns the shard paths
+    and the number of positions (moves) written.
+    """
+    settings = dict(DEFAULT_CONFIG)
+    settings.update(config or {})
+    jobs = ((game, seed + game, state, settings) for game in range(games))
+    with ShardWriter(directory, shard_size) as writer:
+        if workers == 1:
+            for job in jobs:
+                writer.write(play_game(job))
+        else:
+            # 对局结束一局写一局, 先结束的先写
+            with mp.Pool(workers) as pool:
+                for record in pool.imap_unordered(play_game, jobs):
+                    writer.write(record)
+    return writer.paths, writer.positions
+
+
+def main(argv=None):
+    from perft import reference_state
+
+    parser = argparse.ArgumentParser(description="Parallel self-play games")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    parser.add_argument("--out", default="selfplay")
+    parser.add_argument("--shard-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--position", default="initial")
+    parser.add_argument("--red", choices=ENGINES, default=DEFAULT_CONFIG["red"])
+    parser.add_argument("--black", choices=ENGINES, default=DEFAULT_CONFIG["black"])
+    parser.add_argument("--rounds", type=int, default=DEFAULT_CONFIG["rounds"])
+    parser.add_argument("--time-limit", type=float, default=None)
+    parser.add_argument("--depth", type=int, default=DEFAULT_CONFIG["depth"])
+    parser.add_argument("--rollout-policy", default=DEFAULT_CONFIG["rollout_policy"])
+    parser.add_argument("--rollout-cutoff", type=int, default=DEFAULT_CONFIG["rollout_cutoff"])
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_CONFIG["max_plies"])
+    parser.add_argument("--sample-plies", type=int, default=DEFAULT_CONFIG["sample_plies"])
+    args = parser.parse_args(argv)
+    config = {name: getattr(args, name) for name in DEFAULT_CONFIG}
+    start = time.time()
+    paths, positions = self_play(
+        reference_state(args.position), args.games, args.out, args.workers, args.seed,
+        args.shard_size, config,
+    )
+    elapsed = time.time() - start
+    print(
+        f"{args.games} games, {positions} positions in {len(paths)} shards, "
+        f"{elapsed:.1f}s ({positions / max(elapsed, 1e-9):.1f} positions/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from perft import reference_state
+from selfplay import DEFAULT_CONFIG, play_game, read_games, record_state, self_play
+from state import SearchBoard
+
+CONFIG = {"rounds": 8, "rollout_cutoff": 4, "max_plies": 6, "sample_plies": 2}
+
+
+class SelfPlayTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_shards_hold_every_game(self):
+        paths, positions = self_play(
+            reference_state("initial"), 5, self.directory, workers=2, shard_size=2, config=CONFIG
+        )
+        self.assertEqual([os.path.basename(path) for path in paths], [
+            "selfplay-00000.jsonl.gz", "selfplay-00001.jsonl.gz", "selfplay-00002.jsonl.gz"
+        ])
+        records = list(read_games(paths))
+        self.assertEqual(sorted(record["game"] for record in records), list(range(5)))
+        self.assertEqual(positions, sum(len(record["moves"]) for record in records))
+        for record in records:
+            board = SearchBoard(record_state(record))
+            self.assertEqual(len(record["visits"]), len(record["moves"]))
+            for move, visits in zip(record["moves"], record["visits"]):
+                self.assertIn(tuple(move), board.legal_moves())
+                self.assertIn(tuple(move), [tuple(v[:4]) for v in visits])
+                board.make_move(tuple(move))
+            self.assertIn(record["termination"], ("mate", "max_plies", "repetition"))
+
+    def test_games_repeat_by_seed(self):
+        config = dict(CONFIG, red="alphabeta", depth=1)
+        job = (3, 3, reference_state("initial"), dict(DEFAULT_CONFIG, **config))
+        first, second = play_game(job), play_game(job)
+        self.assertEqual(first, second)
+        # 红方是 alpha-beta, 没有访问次数
+        red = 0 if reference_state("initial").player == -1 else 1
+        self.assertEqual(first["visits"][red], [])
+
+
+unittest.main()
@@ -1,23 +1,69 @@
 from __future__ import annotations
-import copy
-from collections import defaultdict
+from collections import OrderedDict
 from random import choice
 
-from pieces import Piece
+from board import BLACK, COLS, KIND_MASK, Code, Kind, to_board, to_matrix
+from attack import in_check
+from pieces_move import piece_moves
 from visutalize import Visualize
+from zobrist import board_key, move_key
+from evaluate import board_score, move_score
+
+
+def piece_lists(board):
+    """
+    Returns ([red squares, black squares], [red general, black general]).
+    A captured general is recorded as -1.
+    """
+    pieces = [[], []]
+    generals = [-1, -1]
+    for sq, code in enumerate(board):
+        if code:
+            side = 1 if code & BLACK else 0
+            pieces[side].append(sq)
+            if code & KIND_MASK == Kind.GENERAL:
+                generals[side] = sq
+    return pieces, generals
+
+
+def side_of(player):
+    """
+    Index into piece lists for a player, 0 for red (-1) and 1 for black (1).
+    """
+    return 1 if player == 1 else 0
+
+
+# (局面 key, 格子) -> 该格棋子的合法落点, 供界面点击时反复查询
+_MOVES_FROM_CACHE = OrderedDict()
+MOVES_FROM_CACHE_SIZE = 4096
 
 
 class State:
-    def __init__(self, state, player):
-        self.state = state
+    __slots__ = ("board", "player", "key", "pieces", "generals", "score")
+
+    def __init__(self, state, player, key=None, pieces=None, generals=None, score=None):
+        # 接受紧凑棋盘(bytearray)或者原来的中文字符串矩阵
+        self.board = state if isinstance(state, bytearray) else to_board(state)
         self.player = player
+        # 64 位 Zobrist key, 包含行棋方
+        self.key = board_key(self.board, player) if key is None else key
+        # 子力加位置分, 黑方为正, 见 evaluate.py
+        self.score = board_score(self.board) if score is None else score
+        # 双方棋子所在格子和将帅位置, 随每一步更新
+        if pieces is None:
+            pieces, generals = piece_lists(self.board)
+        self.pieces = pieces
+        self.generals = generals
+
+    @property
+    def state(self) -> list[list[str]]:
+        return to_matrix(self.board)
 
     def draw(self):
         Visualize.render_board_with_state(self.state)
 
     def valid(self):
-        general = "黑帅" if self.player == 1 else "红帅"
-        return any(general in row for row in self.state)
+        return self.generals[side_of(self.player)] >= 0
 
     def __str__(self):
         return (
@@ -29,30 +75,236 @@ class State:
         return iter(self.state)
 
     def __hash__(self):
-        return hash(",".join([",".join(row) for row in self.state]) + str(self.player))
+        return hash(self.key)
+
+    def __eq__(self, other):
+        if not isinstance(other, State):
+            return NotImplemented
+        return (
+            self.key == other.key
+            and self.player == other.player
+            and self.board == other.board
+        )
 
     def random_move(self):
         new_state = StateMachine.get_random_mutation(self, self.player)
         return State(new_state, -self.player) if new_state else self
 
+    def get_pseudo_legal_moves(self) -> list[State]:
+        """
+        Children for every move the pieces can make, ignoring checks.
+        """
+        return [
+            self._child(src, dst)
+            for src, dst in piece_moves(self.board, self.pieces[side_of(self.player)])
+        ]
+
     def get_legal_moves(self) -> list[State]:
         return [
-            State(state=new_board, player=-self.player)
-            for new_board, _ in StateMachine.get_all_legal_mutations(self, self.player)
+            self._child(x * COLS + y, nx * COLS + ny)
+            for x, y, nx, ny in SearchBoard(self).legal_moves()
         ]
 
+    def in_check(self):
+        return in_check(self.board, self.generals, side_of(self.player))
+
+    def has_legal_move(self):
+        return SearchBoard(self).has_legal_move()
+
+    def get_moves_from(self, x, y) -> frozenset:
+        """
+        Legal destinations (nx, ny) of the piece on (x, y), empty if the square
+        does not hold a piece of the side to move. Only that piece's moves
+        are generated, and results are cached by position key.
+        """
+        cache_key = (self.key, x * COLS + y)
+        moves = _MOVES_FROM_CACHE.get(cache_key)
+        if moves is not None:
+            _MOVES_FROM_CACHE.move_to_end(cache_key)
+            return moves
+        moves = frozenset(SearchBoard(self).legal_moves_from(x * COLS + y))
+        _MOVES_FROM_CACHE[cache_key] = moves
+        if len(_MOVES_FROM_CACHE) > MOVES_FROM_CACHE_SIZE:
+            _MOVES_FROM_CACHE.popitem(last=False)
+        return moves
+
+    def is_checkmate(self):
+        return self.in_check() and not self.has_legal_move()
+
+    def is_stalemate(self):
+        return not self.in_check() and not self.has_legal_move()
+
     def is_terminal(self):
-        return not self.valid()
+        # 将帅被吃, 被将死或者困毙都算终局, 象棋里困毙也判负
+        return not self.valid() or not self.has_legal_move()
 
     def get_result(self):
-        return -self.player if not self.valid() else 0
+        return -self.player if self.is_terminal() else 0
 
     def apply_move(self, src, dst) -> State:
-        x1, y1 = src
-        x2, y2 = dst
-        new_board = [row[:] for row in self.state]
-        new_board[x2][y2], new_board[x1][y1] = new_board[x1][y1], "一一"
-        return State(new_board, -self.player)
+        return self._child(src[0] * COLS + src[1], dst[0] * COLS + dst[1])
+
+    def _child(self, src, dst) -> State:
+        board = self.board
+        key = move_key(self.key, board, src, dst)
+        score = move_score(self.score, board, src, dst)
+        piece, captured = board[src], board[dst]
+        new_board = board[:]
+        new_board[dst], new_board[src] = piece, Code.EMPTY
+
+        side = 1 if piece & BLACK else 0
+        pieces = self.pieces[:]
+        generals = self.generals
+        mine = pieces[side] = pieces[side][:]
+        mine[mine.index(src)] = dst
+        if piece & KIND_MASK == Kind.GENERAL:
+            generals = generals[:]
+            generals[side] = dst
+        if captured:
+            theirs = pieces[1 - side] = pieces[1 - side][:]
+            theirs.remove(dst)
+            if captured & KIND_MASK == Kind.GENERAL:
+                generals = generals[:]
+                generals[1 - side] = -1
+        return State(new_board, -self.player, key, pieces, generals, score)
+
+
+class SearchBoard:
+    """
+    Mutable board for search and rollouts.
+    Moves are applied in place with make_move and taken back with unmake_move,
+    so walking the tree costs no board copies.
+    """
+
+    __slots__ = ("board", "player", "key", "pieces", "generals", "score")
+
+    def __init__(self, state: State):
+        self.board = state.board[:]
+        self.player = state.player
+        self.key = state.key
+        self.score = state.score
+        self.pieces = [state.pieces[0][:], state.pieces[1][:]]
+        self.generals = state.generals[:]
+
+    def moves(self):
+        """
+        Yields every move of the side to move as (x, y, nx, ny).
+        """
+        for src, dst in piece_moves(self.board, self.pieces[side_of(self.player)]):
+            yield src // COLS, src % COLS, dst // COLS, dst % COLS
+
+    def legal_moves(self):
+        """
+        Moves that do not leave the mover's general attacked or facing the
+        other general.
+        """
+        side = side_of(self.player)
+        moves = []
+        for move in list(self.moves()):
+            undo = self.make_move(move)
+            if not in_check(self.board, self.generals, side):
+                moves.append(move)
+            self.unmake_move(undo)
+        return moves
+
+    def legal_moves_from(self, sq):
+        """
+        Legal destinations (nx, ny) of the piece on square `sq`.
+        """
+        code = self.board[sq]
+        side = side_of(self.player)
+        if not code or (1 if code & BLACK else 0) != side:
+            return []
+        x, y = divmod(sq, COLS)
+        moves = []
+        for _, dst in list(piece_moves(self.board, (sq,))):
+            nx, ny = divmod(dst, COLS)
+            undo = self.make_move((x, y, nx, ny))
+            if not in_check(self.board, self.generals, side):
+                moves.append((nx, ny))
+            self.unmake_move(undo)
+        return moves
+
+    def has_legal_move(self):
+        side = side_of(self.player)
+        for move in list(self.moves()):
+            undo = self.make_move(move)
+            legal = not in_check(self.board, self.generals, side)
+            self.unmake_move(undo)
+            if legal:
+                return True
+        return False
+
+    def in_check(self):
+        return in_check(self.board, self.generals, side_of(self.player))
+
+    def make_move(self, move):
+        x, y, nx, ny = move
+        src, dst = x * COLS + y, nx * COLS + ny
+        board = self.board
+        piece, captured = board[src], board[dst]
+        side = 1 if piece & BLACK else 0
+        mine = self.pieces[side]
+        index = mine.index(src)
+        mine[index] = dst
+        if piece & KIND_MASK == Kind.GENERAL:
+            self.generals[side] = dst
+        captured_index = -1
+        if captured:
+            # 交换到末尾再删除, unmake_move 按 captured_index 原样放回
+            theirs = self.pieces[1 - side]
+            captured_index = theirs.index(dst)
+            theirs[captured_index] = theirs[-1]
+            theirs.pop()
+            if captured & KIND_MASK == Kind.GENERAL:
+                self.generals[1 - side] = -1
+        undo = (src, dst, captured, self.key, index, captured_index, self.score)
+        self.key = move_key(self.key, board, src, dst)
+        self.score = move_score(self.score, board, src, dst)
+        board[dst], board[src] = piece, Code.EMPTY
+        self.player = -self.player
+        return undo
+
+    def unmake_move(self, undo):
+        src, dst, captured, key, index, captured_index, score = undo
+        board = self.board
+        piece = board[dst]
+        board[src], board[dst] = piece, captured
+        side = 1 if piece & BLACK else 0
+        self.pieces[side][index] = src
+        if piece & KIND_MASK == Kind.GENERAL:
+            self.generals[side] = src
+        if captured:
+            theirs = self.pieces[1 - side]
+            if captured_index == len(theirs):
+                theirs.append(dst)
+            else:
+                theirs.append(theirs[captured_index])
+                theirs[captured_index] = dst
+            if captured & KIND_MASK == Kind.GENERAL:
+                self.generals[1 - side] = dst
+        self.key = key
+        self.score = score
+        self.player = -self.player
+
+    def valid(self):
+        return self.generals[side_of(self.player)] >= 0
+
+    def is_terminal(self):
+        return not self.valid() or not self.has_legal_move()
+
+    def get_result(self):
+        return -self.player if self.is_terminal() else 0
+
+    def to_state(self) -> State:
+        return State(
+            self.board[:],
+            self.player,
+            self.key,
+            [self.pieces[0][:], self.pieces[1][:]],
+            self.generals[:],
+            self.score,
+        )
 
 
 class StateMachine:
@@ -60,31 +312,26 @@ class StateMachine:
     def get_all_legal_mutations(state: State | list[list[str]], player: int | str):
         if isinstance(state, list):
             state = State(state, 1 if player == "黑" else -1)
-        color = "红" if state.player == -1 else "黑"
-        visited = set()
-
-        for x, row in enumerate(state.state):
-            for y, name in enumerate(row):
-                if name == "一一" or not name.startswith(color):
-                    continue
-                piece_cls = Piece.get_name_to_cls_mapping().get(name)
-                if piece_cls and piece_cls._is(state.state, x, y):
-                    for nx, ny in piece_cls.get_next_legal_move(state.state, x, y):
-                        key = (x, y, nx, ny)
-                        if key in visited:
-                            continue
-                        visited.add(key)
-                        yield state.apply_move((x, y), (nx, ny)).state, (x, y, nx, ny)
+        board = state.board
+
+        for x, y, nx, ny in SearchBoard(state).legal_moves():
+            src, dst = x * COLS + y, nx * COLS + ny
+            new_board = board[:]
+            new_board[dst], new_board[src] = new_board[src], Code.EMPTY
+            yield new_board, (x, y, nx, ny)
+
+    @staticmethod
+    def get_all_legal_moves(state: State):
+        yield from SearchBoard(state).legal_moves()
 
     @staticmethod
     def get_legal_moves_from_pos(state: State, pos, player):
-        return {
-            move[2:]
-            for _, move in StateMachine.get_all_legal_mutations(state, player)
-            if move[:2] == pos
-        }
+        return state.get_moves_from(*pos)
 
     @staticmethod
     def get_random_mutation(state: State, player: int):
-        mutations = list(StateMachine.get_all_legal_mutations(state, player))
-        return choice(mutations)[0] if mutations else None
+        moves = list(StateMachine.get_all_legal_moves(state))
+        if not moves:
+            return None
+        x, y, nx, ny = choice(moves)
+        return state.apply_move((x, y), (nx, ny)).board
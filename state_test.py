@@ -1,13 +1,95 @@
 import unittest
 
-from state import State
+from board import INITIAL_STATE, Code, to_board, to_matrix
+from state import SearchBoard, State, StateMachine, piece_lists
 
 
 class StateTest(unittest.TestCase):
     def test_state_hash(self):
-        state = State([["a", "b"], ["c", "d"]], 1)
+        state = State(INITIAL_STATE, 1)
         _hash = hash(state)
-        self.assertEqual(_hash, hash("a,b,c,d"))
+        self.assertEqual(_hash, hash(state.key))
+        self.assertEqual(state, State(to_board(INITIAL_STATE), 1))
+        self.assertNotEqual(state, State(INITIAL_STATE, -1))
+        self.assertLess(state.key, 1 << 64)
+
+    def test_incremental_key(self):
+        state = State(INITIAL_STATE, 1)
+        a = state.apply_move((7, 1), (7, 4)).apply_move((2, 1), (2, 4))
+        a = a.apply_move((9, 1), (7, 2)).apply_move((3, 4), (4, 4))
+        b = state.apply_move((9, 1), (7, 2)).apply_move((3, 4), (4, 4))
+        b = b.apply_move((7, 1), (7, 4)).apply_move((2, 1), (2, 4))
+        self.assertEqual(a.key, b.key)
+        self.assertEqual(a, b)
+        self.assertEqual(len({a, b}), 1)
+        captured = a.apply_move((7, 4), (3, 4))
+        self.assertEqual(captured.key, State(captured.board, captured.player).key)
+
+    def test_board_round_trip(self):
+        board = to_board(INITIAL_STATE)
+        self.assertEqual(len(board), 90)
+        self.assertEqual(board[4], Code.RED_GENERAL)
+        self.assertEqual(board[85], Code.BLACK_GENERAL)
+        self.assertEqual(to_matrix(board), INITIAL_STATE)
+        self.assertEqual(State(board, 1).state, INITIAL_STATE)
+
+    def test_apply_move(self):
+        state = State(INITIAL_STATE, 1)
+        next_state = state.apply_move((7, 1), (7, 4))
+        self.assertEqual(next_state.player, -1)
+        self.assertEqual(next_state.state[7][4], "黑炮")
+        self.assertEqual(next_state.state[7][1], "一一")
+        self.assertEqual(state.state[7][1], "黑炮")
+
+    def test_legal_moves(self):
+        state = State(INITIAL_STATE, 1)
+        self.assertEqual(len(state.get_legal_moves()), 44)
+        self.assertEqual(len(State(INITIAL_STATE, -1).get_legal_moves()), 44)
+
+    def test_make_unmake_move(self):
+        state = State(INITIAL_STATE, 1)
+        board = SearchBoard(state)
+        moves = list(board.moves())
+        self.assertEqual(len(moves), 44)
+        for move in moves:
+            undo = board.make_move(move)
+            child = state.apply_move(move[:2], move[2:])
+            self.assertEqual(board.to_state(), child)
+            board.unmake_move(undo)
+        self.assertEqual(board.to_state(), state)
+
+    def test_legal_moves_from_pos(self):
+        state = State(INITIAL_STATE, 1)
+        moves = StateMachine.get_legal_moves_from_pos(state, (7, 1), 1)
+        expect_moves = {(8, 1), (6, 1), (5, 1), (4, 1), (3, 1), (0, 1)}
+        expect_moves |= {(7, 0), (7, 2), (7, 3), (7, 4), (7, 5), (7, 6)}
+        self.assertEqual(moves, expect_moves)
+
+    def test_get_moves_from(self):
+        state = State(INITIAL_STATE, 1)
+        self.assertEqual(state.get_moves_from(9, 1), {(7, 0), (7, 2)})
+        self.assertIs(state.get_moves_from(9, 1), state.get_moves_from(9, 1))
+        # 红方的棋子和空格没有落点
+        self.assertEqual(state.get_moves_from(0, 1), frozenset())
+        self.assertEqual(state.get_moves_from(5, 5), frozenset())
+
+    def test_piece_lists(self):
+        state = State(INITIAL_STATE, 1)
+        self.assertEqual(state.generals, [4, 85])
+        self.assertEqual(len(state.pieces[0]), 16)
+        # 黑炮打马, 红车吃炮, 再把黑车直接放到红帅的位置
+        state = state.apply_move((7, 1), (0, 1)).apply_move((0, 0), (0, 1))
+        self.assertEqual(len(state.pieces[0]), 15)
+        self.assertEqual(len(state.pieces[1]), 15)
+        state = state.apply_move((9, 0), (0, 4))
+        self.assertEqual(state.generals, [-1, 85])
+        self.assertFalse(state.valid())
+        self.assertTrue(state.is_terminal())
+        self.assertEqual(state.get_result(), 1)
+        pieces, generals = piece_lists(state.board)
+        self.assertEqual(sorted(state.pieces[0]), pieces[0])
+        self.assertEqual(sorted(state.pieces[1]), pieces[1])
+        self.assertEqual(state.generals, generals)
 
 
 unittest.main()
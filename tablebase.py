@@ -0,0 +1,552 @@
+"""
+Endgame tablebases for small material, built by retrograde analysis.
+
+An ending is named by the pieces besides the generals, red first:
+"KRvKA" is general and car against general and advisor (gurdian). Letters:
+R car, C cannon, H horse, P minion, A gurdian, E elephant. A table holds
+every position of its ending with either side to move, one byte each:
+
+    0        draw
+    1..254   distance to mate + 1, in plies; odd distances are wins for
+             the side to move, even ones losses (0 = mated now)
+    255      not a legal position
+
+Positions are indexed by the squares each piece can ever stand on (a
+minion only ahead of its starting row, an advisor only on its five palace
+points, ...), so the tables stay small. Files are mapped with mmap and
+probed in place; an ending and its color mirror share one file.
+
+Generation scans every position once in a process pool, recording its
+legal moves; captures lead into smaller endings, which are generated first
+and probed. The results are then propagated backwards from the mates, one
+distance at a time. Checkmate and stalemate both lose, as in the rest of
+this repo; repetitions are not scored, so only forced mates count as wins.
+
+    python tablebase.py --dir tablebases KRvK KHPvK
+    tablebase = Tablebase("tablebases")
+    wdl, dtm = tablebase.probe_position(state)
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import multiprocessing as mp
+import os
+import struct
+from collections import defaultdict
+
+import numpy as np
+
+from attack import in_check
+from board import BLACK, COLS, KIND_MASK, ROWS, SQUARES, Kind
+from pieces_move import ELEPHANT_TABLE, GENERAL_TABLE, GURDIAN_TABLE, MINION_TABLE, piece_moves
+from state import side_of
+
+MAGIC = b"XQTB1\0\0\0"
+HEADER = struct.Struct("<8sI16s")
+SUFFIX = ".xqtb"
+DRAW = 0
+INVALID = 255
+# 超过这个局面数的残局不生成, 限制生成时的内存
+MAX_POSITIONS = 2_000_000
+DEFAULT_ENDINGS = ("KRvK", "KRvKA", "KHvK", "KCvKA", "KPvK", "KHPvK", "KRvKH")
+
+LETTERS = {
+    "R": Kind.CAR,
+    "C": Kind.CANNON,
+    "H": Kind.HORSE,
+    "P": Kind.MINION,
+    "A": Kind.GURDIAN,
+    "E": Kind.ELEPHANT,
+}
+KIND_LETTERS = {kind: letter for letter, kind in LETTERS.items()}
+ORDER = "RCHPAE"
+
+# 红方的起始位置, 黑方上下翻转; 其余棋子可以到任何格子
+_RED_STARTS = {
+    Kind.GENERAL: [(0, 4)],
+    Kind.GURDIAN: [(0, 3), (0, 5)],
+    Kind.ELEPHANT: [(0, 2), (0, 6)],
+    Kind.MINION: [(3, y) for y in range(0, COLS, 2)],
+}
+_STEP_TABLES = {
+    Kind.GENERAL: GENERAL_TABLE,
+    Kind.GURDIAN: GURDIAN_TABLE,
+    Kind.MINION: MINION_TABLE,
+}
+
+
+def parse(ending):
+    """
+    "KRvKA" -> ((red piece kinds), (black piece kinds)), generals left out.
+    """
+    red, black = ending.upper().split("V")
+    if not (red.startswith("K") and black.startswith("K")):
+        raise ValueError(f"bad ending name {ending!r}")
+    return tuple(LETTERS[c] for c in red[1:]), tuple(LETTERS[c] for c in black[1:])
+
+
+def ending_name(red, black):
+    def letters(kinds):
+        return "".join(sorted((KIND_LETTERS[kind] for kind in kinds), key=ORDER.index))
+
+    return f"K{letters(red)}vK{letters(black)}"
+
+
+def mirror_name(ending):
+    red, black = parse(ending)
+    return ending_name(black, red)
+
+
+def board_ending(board):
+    """
+    Ending name of a position, from its pieces.
+    """
+    red, black = [], []
+    for code in board:
+        kind = code & KIND_MASK
+        if code and kind != Kind.GENERAL:
+            (black if code & BLACK else red).append(kind)
+    return ending_name(red, black)
+
+
+def mirror_board(board):
+    """
+    The same position with colors swapped and the board turned upside down.
+    """
+    mirrored = bytearray(SQUARES)
+    for sq, code in enumerate(board):
+        if code:
+            x, y = divmod(sq, COLS)
+            mirrored[(ROWS - 1 - x) * COLS + y] = code ^ BLACK
+    return mirrored
+
+
+def domain(code):
+    """
+    Sorted squares a piece can ever stand on.
+    """
+    kind = code & KIND_MASK
+    color = code & BLACK
+    if kind not in _RED_STARTS:
+        return tuple(range(SQUARES))
+    seen = set()
+    frontier = [
+        (ROWS - 1 - x if color else x) * COLS + y for x, y in _RED_STARTS[kind]
+    ]
+    while frontier:
+        sq = frontier.pop()
+        if sq in seen:
+            continue
+        seen.add(sq)
+        if kind == Kind.ELEPHANT:
+            frontier.extend(to for to, _ in ELEPHANT_TABLE[color][sq])
+        else:
+            frontier.extend(_STEP_TABLES[kind][color][sq])
+    return tuple(sorted(seen))
+
+
+class Layout:
+    """
+    Index of the positions of one ending: side to move, then the square of
+    every piece within its domain, as one mixed radix number. Pieces of
+    the same code are stored in increasing square order, other orders are
+    not legal positions.
+    """
+
+    def __init__(self, ending):
+        red, black = parse(ending)
+        self.ending = ending_name(red, black)
+        red, black = parse(self.ending)
+        self.codes = (
+            [Kind.GENERAL, BLACK | Kind.GENERAL]
+            + [int(kind) for kind in red]
+            + [BLACK | kind for kind in black]
+        )
+        self.domains = [domain(code) for code in self.codes]
+        self.radices = [len(squares) for squares in self.domains]
+        self.positions = []
+        for squares in self.domains:
+            position = [-1] * SQUARES
+            for i, sq in enumerate(squares):
+                position[sq] = i
+            self.positions.append(position)
+        self.size = 2 * math.prod(self.radices)
+        # 同种棋子在 codes 里相邻, runs 为其中有多个棋子的 (起, 止)
+        self.runs = []
+        start = 0
+        for i in range(1, len(self.codes) + 1):
+            if i == len(self.codes) or self.codes[i] != self.codes[start]:
+                if i - start > 1:
+                    self.runs.append((start, i))
+                start = i
+
+    @property
+    def men(self):
+        return len(self.codes)
+
+    def subendings(self):
+        """
+        Endings one capture away.
+        """
+        red, black = parse(self.ending)
+        names = set()
+        for i in range(len(red)):
+            names.add(ending_name(red[:i] + red[i + 1 :], black))
+        for i in range(len(black)):
+            names.add(ending_name(red, black[:i] + black[i + 1 :]))
+        return sorted(names)
+
+    def decode(self, index):
+        """
+        index -> (player, squares in code order).
+        """
+        squares = []
+        for squares_of, radix in zip(reversed(self.domains), reversed(self.radices)):
+            index, i = divmod(index, radix)
+            squares.append(squares_of[i])
+        squares.reverse()
+        return (1 if index else -1), squares
+
+    def encode(self, player, squares):
+        """
+        (player, squares in code order) -> index, or -1 if a piece is off
+        its domain.
+        """
+        index = 1 if player == 1 else 0
+        for position, radix, sq in zip(self.positions, self.radices, squares):
+            i = position[sq]
+            if i < 0:
+                return -1
+            index = index * radix + i
+        return index
+
+    def squares(self, board):
+        """
+        Squares of the pieces of `board` in code order.
+        """
+        by_code = defaultdict(list)
+        for sq, code in enumerate(board):
+            if code:
+                by_code[code].append(sq)
+        squares = []
+        for code in self.codes:
+            squares.append(by_code[code].pop(0))
+        return squares
+
+    def index(self, board, player):
+        return self.encode(player, self.squares(board))
+
+    def canonical(self, squares):
+        return all(squares[start:end] == sorted(squares[start:end]) for start, end in self.runs)
+
+    def normalize(self, squares):
+        """
+        Puts pieces of the same code back in increasing square order.
+        """
+        for start, end in self.runs:
+            squares[start:end] = sorted(squares[start:end])
+        return squares
+
+
+# 每个进程按目录缓存一个 Tablebase, 生成时用来查被吃子后的小残局
+_PROCESS_TABLEBASES = {}
+
+
+def _process_tablebase(directory) -> Tablebase:
+    tablebase = _PROCESS_TABLEBASES.get(directory)
+    if tablebase is None:
+        tablebase = _PROCESS_TABLEBASES[directory] = Tablebase(directory)
+    else:
+        # 进程可能是生成上一个残局时留下的
+        tablebase.refresh()
+    return tablebase
+
+
+def _scan(args):
+    """
+    Plays every legal move of the positions in [start, stop) of an ending.
+    Returns per position arrays: whether it is legal, its number of legal
+    moves, its children in the same ending (as a flat array with counts),
+    and what its captures lead to in smaller endings: the shortest win
+    (child lost in d plies -> d + 1), the number of captures that lose and
+    the longest of those losses.
+    """
+    ending, directory, start, stop = args
+    layout = Layout(ending)
+    tablebase = _process_tablebase(directory)
+    codes = layout.codes
+    count = stop - start
+    valid = np.zeros(count, dtype=np.bool_)
+    moves = np.zeros(count, dtype=np.int16)
+    child_counts = np.zeros(count, dtype=np.int16)
+    wins = np.full(count, -1, dtype=np.int16)
+    losses = np.zeros(count, dtype=np.int16)
+    longest = np.zeros(count, dtype=np.int16)
+    children = []
+    board = bytearray(SQUARES)
+    for offset in range(count):
+        player, squares = layout.decode(start + offset)
+        if len(set(squares)) < len(squares) or not layout.canonical(squares):
+            continue
+        for code, sq in zip(codes, squares):
+            board[sq] = code
+        generals = squares[:2]
+        side = side_of(player)
+        pieces = [[], []]
+        for code, sq in zip(codes, squares):
+            pieces[1 if code & BLACK else 0].append(sq)
+        # 刚走完棋的一方被将军 (或将帅照面) 的局面不合法
+        if not in_check(board, generals, 1 - side):
+            valid[offset] = True
+            for src, dst in list(piece_moves(board, pieces[side])):
+                piece, captured = board[src], board[dst]
+                board[dst], board[src] = piece, 0
+                moved = generals
+                if piece & KIND_MASK == Kind.GENERAL:
+                    moved = generals[:]
+                    moved[side] = dst
+                if not in_check(board, moved, side):
+                    moves[offset] += 1
+                    if captured:
+                        hit = tablebase.probe(board, -player)
+                        if hit is None:
+                            raise LookupError(f"{board_ending(board)} has not been generated")
+                        wdl, dtm = hit
+                        if wdl < 0 and (wins[offset] < 0 or dtm + 1 < wins[offset]):
+                            wins[offset] = dtm + 1
+                        elif wdl > 0:
+                            losses[offset] += 1
+                            longest[offset] = max(longest[offset], dtm + 1)
+                    else:
+                        moved_squares = layout.normalize(
+                            [dst if sq == src else sq for sq in squares]
+                        )
+                        children.append(layout.encode(-player, moved_squares))
+                        child_counts[offset] += 1
+                board[src], board[dst] = piece, captured
+        for sq in squares:
+            board[sq] = 0
+    return valid, moves, child_counts, np.array(children, dtype=np.int32), wins, losses, longest
+
+
+def _retrograde(valid, moves, child_counts, children, wins, losses, longest):
+    """
+    Distances to mate from the scan of _scan, by increasing distance: a
+    position lost in d plies makes its parents won in d + 1, and a
+    position all of whose moves reach won positions is lost in one more
+    than the longest of them. Returns the table bytes.
+    """
+    n = len(valid)
+    owners = np.repeat(np.arange(n, dtype=np.int32), child_counts)
+    order = np.argsort(children, kind="stable")
+    parents = owners[order]
+    starts = np.searchsorted(children[order], np.arange(n + 1)).tolist()
+    del owners, order
+    remaining = (moves - losses).tolist()
+    longest = longest.tolist()
+    values = [0] * n
+    buckets = defaultdict(list)
+    for p in np.flatnonzero(valid).tolist():
+        if not moves[p]:
+            buckets[0].append(p)
+        elif wins[p] >= 0:
+            buckets[int(wins[p])].append(p)
+        elif not remaining[p]:
+            buckets[longest[p]].append(p)
+    level = 0
+    while buckets:
+        for p in buckets.pop(level, ()):
+            if values[p]:
+                continue
+            if level + 1 >= INVALID:
+                raise ValueError("distance to mate does not fit in a byte")
+            values[p] = level + 1
+            for q in parents[starts[p] : starts[p + 1]].tolist():
+                if values[q]:
+                    continue
+                if level % 2 == 0:
+                    buckets[level + 1].append(q)
+                    continue
+                remaining[q] -= 1
+                if level + 1 > longest[q]:
+                    longest[q] = level + 1
+                if not remaining[q]:
+                    buckets[longest[q]].append(q)
+        level += 1
+    table = np.array(values, dtype=np.uint8)
+    table[~valid] = INVALID
+    return table
+
+
+def table_path(directory, ending):
+    return os.path.join(directory, ending + SUFFIX)
+
+
+def generate(ending, directory, workers=None, max_positions=MAX_POSITIONS, chunk=1 << 14):
+    """
+    Writes the table of `ending` into `directory`, after the endings its
+    captures lead to, and returns its path. Tables already there (or their
+    mirrors) are kept. The scan runs in `workers` processes (default one
+    per CPU); endings over `max_positions` positions are refused to bound
+    memory.
+    """
+    layout = Layout(ending)
+    os.makedirs(directory, exist_ok=True)
+    for name in (layout.ending, mirror_name(layout.ending)):
+        if os.path.exists(table_path(directory, name)):
+            return table_path(directory, name)
+    if layout.size > max_positions:
+        raise ValueError(f"{layout.ending} has {layout.size} positions, over {max_positions}")
+    for sub in layout.subendings():
+        generate(sub, directory, workers, max_positions, chunk)
+    jobs = [
+        (layout.ending, directory, start, min(start + chunk, layout.size))
+        for start in range(0, layout.size, chunk)
+    ]
+    if workers == 1:
+        parts = [_scan(job) for job in jobs]
+    else:
+        with mp.Pool(workers) as pool:
+            parts = pool.map(_scan, jobs)
+    arrays = [np.concatenate(column) for column in zip(*parts)]
+    del parts
+    table = _retrograde(*arrays)
+    path = table_path(directory, layout.ending)
+    # 先写临时文件再改名, 读的进程不会看到写了一半的表
+    with open(path + ".tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, layout.size, layout.ending.encode()))
+        f.write(table.tobytes())
+    os.replace(path + ".tmp", path)
+    return path
+
+
+class Tablebase:
+    """
+    The tables in one directory. Tables are mapped on first use.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._tables = {}
+        self.refresh()
+
+    def __getstate__(self):
+        # 随 Mct 的设置传给工作进程时只带目录, 各进程自己映射文件
+        return {"directory": self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"])
+
+    def refresh(self):
+        """
+        Picks up tables written since the last look at the directory.
+        """
+        names = []
+        if os.path.isdir(self.directory):
+            names = [
+                name[: -len(SUFFIX)] for name in os.listdir(self.directory) if name.endswith(SUFFIX)
+            ]
+        self.endings = set(names)
+        self.max_men = max((Layout(name).men for name in names), default=0)
+
+    def __contains__(self, ending):
+        return ending in self.endings or mirror_name(ending) in self.endings
+
+    def _table(self, ending):
+        table = self._tables.get(ending)
+        if table is None:
+            path = table_path(self.directory, ending)
+            with open(path, "rb") as f:
+                magic, size, name = HEADER.unpack(f.read(HEADER.size))
+            layout = Layout(ending)
+            if magic != MAGIC or size != layout.size or name.rstrip(b"\0").decode() != ending:
+                raise ValueError(f"{path} is not a tablebase of {ending}")
+            values = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER.size, shape=(size,))
+            table = self._tables[ending] = (layout, values)
+        return table
+
+    def probe(self, board, player):
+        """
+        (wdl, dtm) of a compact board with `player` to move: wdl is 1 if
+        the side to move wins, -1 if it loses and 0 for a draw, dtm the
+        plies to mate (None for draws). None if the position is not in
+        the tables.
+        """
+        ending = board_ending(board)
+        if ending not in self.endings:
+            ending = mirror_name(ending)
+            if ending not in self.endings:
+                return None
+            board = mirror_board(board)
+            player = -player
+        layout, values = self._table(ending)
+        index = layout.index(board, player)
+        if index < 0:
+            return None
+        value = int(values[index])
+        if value == INVALID:
+            return None
+        if value == DRAW:
+            return 0, None
+        dtm = value - 1
+        return (1 if dtm % 2 else -1), dtm
+
+    def probe_position(self, position):
+        """
+        probe for a State or SearchBoard; positions with more pieces than
+        any table are turned away without looking at the board.
+        """
+        if len(position.pieces[0]) + len(position.pieces[1]) > self.max_men:
+            return None
+        return self.probe(position.board, position.player)
+
+    def best_move(self, state):
+        """
+        The move that mates fastest, holds the draw, or loses slowest; None
+        if the position is not in the tables.
+        """
+        from state import SearchBoard
+
+        if self.probe_position(state) is None:
+            return None
+        board = SearchBoard(state)
+        best, best_rank = None, None
+        for move in board.legal_moves():
+            undo = board.make_move(move)
+            hit = self.probe(board.board, board.player)
+            board.unmake_move(undo)
+            if hit is None:
+                return None
+            wdl, dtm = hit
+            # 对方输就是我方赢
+            rank = (2, -dtm) if wdl < 0 else (1, 0) if wdl == 0 else (0, dtm)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best
+
+
+def main(argv=None):
+    import time
+
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases")
+    parser.add_argument("endings", nargs="*", default=list(DEFAULT_ENDINGS))
+    parser.add_argument("--dir", default="tablebases")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    for ending in args.endings:
+        start = time.time()
+        path = generate(ending, args.dir, args.workers)
+        values = np.fromfile(path, dtype=np.uint8, offset=HEADER.size)
+        decisive = values[(values != DRAW) & (values != INVALID)].astype(np.int16) - 1
+        print(
+            f"{ending}: {len(values)} positions, {np.sum(decisive % 2 == 1)} wins, "
+            f"{np.sum(decisive % 2 == 0)} losses, {np.sum(values == DRAW)} draws, "
+            f"longest mate {decisive.max(initial=0)} plies, {time.time() - start:.1f}s"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from alphabeta import MATE, AlphaBeta
+from mcts import Mct
+from state import SearchBoard, State
+from tablebase import HEADER, INVALID, Layout, Tablebase, generate, mirror_board, mirror_name
+from testutil import make_state
+
+
+def layout_state(layout, index):
+    player, squares = layout.decode(index)
+    board = bytearray(90)
+    for code, sq in zip(layout.codes, squares):
+        board[sq] = code
+    return State(board, player)
+
+
+class TablebaseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        generate("KRvK", cls.directory, workers=1)
+        generate("KPvK", cls.directory, workers=1)
+        cls.tablebase = Tablebase(cls.directory)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def values(self, ending):
+        return np.fromfile(os.path.join(self.directory, ending + ".xqtb"), np.uint8, offset=HEADER.size)
+
+    def test_layout_round_trip(self):
+        layout = Layout("KHPvKA")
+        self.assertEqual(layout.ending, "KHPvKA")
+        self.assertEqual(layout.radices, [9, 9, 90, 55, 5])
+        self.assertEqual(layout.subendings(), ["KHPvK", "KHvKA", "KPvKA"])
+        for index in random.Random(1).sample(range(layout.size), 50):
+            self.assertEqual(layout.encode(*layout.decode(index)), index)
+        self.assertEqual(mirror_name("KHPvKA"), "KAvKHP")
+
+    def test_subendings_generated(self):
+        self.assertIn("KvK", self.tablebase)
+        self.assertEqual(self.tablebase.max_men, 3)
+
+    def test_agrees_with_alpha_beta(self):
+        rng = random.Random(2)
+        for ending in ("KRvK", "KPvK"):
+            layout = Layout(ending)
+            values = self.values(ending)
+            short = np.flatnonzero((values > 0) & (values <= 5))
+            draws = np.flatnonzero(values == 0)
+            for index in rng.sample(list(short), 8) + rng.sample(list(draws), 4):
+                state = layout_state(layout, int(index))
+                wdl, dtm = self.tablebase.probe_position(state)
+                engine = AlphaBeta(state, render=False)
+                engine.search(depth=5)
+                if wdl:
+                    self.assertEqual(engine.score, wdl * (MATE - dtm))
+                else:
+                    self.assertLess(abs(engine.score), MATE - 1000)
+
+    def test_mirrored_probe(self):
+        state = make_state({(0, 3): "红帅", (8, 4): "红车", (9, 5): "黑帅"}, 1)
+        mirrored = State(mirror_board(state.board), -state.player)
+        self.assertEqual(self.tablebase.probe_position(state), (-1, 0))
+        self.assertEqual(self.tablebase.probe_position(mirrored), (-1, 0))
+
+    def test_best_move_shortens_mate(self):
+        layout = Layout("KPvK")
+        values = self.values("KPvK")
+        wins = np.flatnonzero((values != INVALID) & (values % 2 == 0) & (values > 10))
+        state = layout_state(layout, int(wins[0]))
+        wdl, dtm = self.tablebase.probe_position(state)
+        self.assertEqual(wdl, 1)
+        while dtm:
+            x, y, nx, ny = self.tablebase.best_move(state)
+            state = state.apply_move((x, y), (nx, ny))
+            wdl, next_dtm = self.tablebase.probe_position(state)
+            self.assertEqual(next_dtm, dtm - 1)
+            dtm = next_dtm
+        self.assertTrue(state.is_terminal())
+
+    def test_pool_matches_serial(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = generate("KPvK", directory, workers=2, chunk=1000)
+            with open(path, "rb") as f:
+                pooled = f.read()
+            with open(os.path.join(self.directory, "KPvK.xqtb"), "rb") as f:
+                self.assertEqual(pooled, f.read())
+            with self.assertRaises(ValueError):
+                generate("KRRvKHH", directory, max_positions=10**6)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_mct_stops_at_tablebase(self):
+        winning = make_state({(0, 3): "红帅", (8, 0): "红车", (7, 4): "黑帅"}, -1)
+        mct = Mct(winning, render=False, tablebase=self.tablebase)
+        # 红方必胜, 随机对局一开始就结束
+        self.assertEqual(mct.simulate(SearchBoard(winning)), -1)
+        x, y, nx, ny = self.tablebase.best_move(winning)
+        mct.do_best_move()
+        self.assertEqual(mct.last_move, (x, y, nx, ny))
+        self.assertEqual(mct.playouts, 0)
+
+
+unittest.main()
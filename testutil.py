@@ -0,0 +1,35 @@
+"""
+Helpers shared by the *_test.py files.
+"""
+
+import random
+
+from board import EMPTY_NAME
+from state import SearchBoard, State
+
+
+def make_state(pieces, player):
+    """
+    State of a board holding only `pieces`, {(x, y): name}.
+    """
+    matrix = [[EMPTY_NAME] * 9 for _ in range(10)]
+    for (x, y), name in pieces.items():
+        matrix[x][y] = name
+    return State(matrix, player)
+
+
+def random_moves(state, plies, seed):
+    """
+    Up to `plies` random legal moves from `state`, fewer if the game ends.
+    """
+    rng = random.Random(seed)
+    board = SearchBoard(state)
+    moves = []
+    for _ in range(plies):
+        legal = board.legal_moves()
+        if not legal:
+            break
+        move = rng.choice(legal)
+        board.make_move(move)
+        moves.append(move)
+    return moves
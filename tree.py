@@ -0,0 +1,408 @@
+"""
+Monte Carlo search graph stored as parallel NumPy arrays.
+
+Nodes are positions and are shared between every path that reaches them: a
+transposition table keyed by the 64-bit Zobrist key maps positions to node
+indices, so the search is a DAG rather than a tree. Each node's outgoing
+moves are edges in the contiguous range [first_edge, first_edge + num_edges);
+an edge stores its move code (src * 90 + dst), the child node once it has
+been reached, and how often it was taken.
+
+Node statistics are shared: `values` is the sum of results from the point of
+view of the player who moved into the position. Exploration uses the visit
+count of the edge. Results are backed up along the path actually taken, so a
+node with several parents only updates the parent that led to it.
+
+The arrays form a node pool. Re-rooting compacts the pool around the new root
+and recycles the slots of every node it can no longer reach. When the pool is
+full, by node count or by a memory ceiling in bytes, the least visited leaves
+are pruned the same way.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from board import COLS, SQUARES
+
+# 一个局面的合法走法数的上限, 一次展开最多占用这么多条边
+MAX_MOVES = 256
+# 按内存上限缩小节点池时的最小容量
+MIN_CAPACITY = 16
+
+
+def encode_move(move) -> int:
+    x, y, nx, ny = move
+    return (x * COLS + y) * SQUARES + nx * COLS + ny
+
+
+def decode_move(code):
+    src, dst = divmod(int(code), SQUARES)
+    return src // COLS, src % COLS, dst // COLS, dst % COLS
+
+
+class ArrayTree:
+    NODE_ARRAYS = ("visits", "values", "key", "first_edge", "num_edges")
+    EDGE_ARRAYS = ("edge_move", "edge_child", "edge_visits", "edge_prior")
+
+    def __init__(self, capacity=1 << 12, max_nodes=None, max_bytes=None):
+        """
+        With `max_bytes` the initial `capacity` is halved until the empty
+        pool fits under it; a ceiling too low even for MIN_CAPACITY nodes
+        is a ValueError.
+        """
+        self.max_nodes = max_nodes
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.edge_size = 0
+        self.evictions = 0
+        while True:
+            self._allocate_nodes(capacity)
+            self._allocate_edges(capacity * 8)
+            self._table = np.full(self._table_size(capacity), -1, dtype=np.int32)
+            # 上限低于初始数组时, 一开始就是满的, 每次模拟都会回收
+            if not self._over_memory() or capacity <= MIN_CAPACITY:
+                break
+            capacity //= 2
+        if self._over_memory():
+            raise ValueError(
+                f"max_bytes {max_bytes} is below the {self.nbytes()} bytes of the smallest pool"
+            )
+
+    def _allocate_nodes(self, capacity):
+        self.visits = np.zeros(capacity, dtype=np.int32)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.key = np.zeros(capacity, dtype=np.uint64)
+        self.first_edge = np.full(capacity, -1, dtype=np.int32)
+        self.num_edges = np.zeros(capacity, dtype=np.int32)
+
+    def _allocate_edges(self, capacity):
+        self.edge_move = np.zeros(capacity, dtype=np.int16)
+        self.edge_child = np.full(capacity, -1, dtype=np.int32)
+        self.edge_visits = np.zeros(capacity, dtype=np.int32)
+        self.edge_prior = np.zeros(capacity, dtype=np.float32)
+
+    def __len__(self):
+        return self.size
+
+    @staticmethod
+    def _table_size(capacity):
+        # 开放寻址, 保持装载因子不超过 1/2
+        size = 16
+        while size < capacity * 2:
+            size *= 2
+        return size
+
+    @staticmethod
+    def _grow(arrays, owner, used, needed):
+        capacity = len(getattr(owner, arrays[0]))
+        if needed <= capacity:
+            return False
+        while capacity < needed:
+            capacity *= 2
+        for name in arrays:
+            old = getattr(owner, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:used] = old[:used]
+            setattr(owner, name, new)
+        return True
+
+    # 置换表
+
+    def lookup(self, key) -> int:
+        """
+        Node index of the position with Zobrist key `key`, or -1.
+        """
+        table = self._table
+        mask = len(table) - 1
+        slot = int(key) & mask
+        while True:
+            node = table[slot]
+            if node < 0:
+                return -1
+            if int(self.key[node]) == key:
+                return int(node)
+            slot = (slot + 1) & mask
+
+    def _insert(self, node):
+        table = self._table
+        mask = len(table) - 1
+        slot = int(self.key[node]) & mask
+        while table[slot] >= 0:
+            slot = (slot + 1) & mask
+        table[slot] = node
+
+    def _rebuild_table(self):
+        size = self._table_size(len(self.visits))
+        if len(self._table) == size:
+            self._table[:] = -1
+        else:
+            self._table = np.full(size, -1, dtype=np.int32)
+        for node in range(self.size):
+            self._insert(node)
+
+    def add_node(self, key) -> int:
+        """
+        New node for the position `key`, registered in the transposition table.
+        """
+        if self._grow(self.NODE_ARRAYS, self, self.size, self.size + 1):
+            self._rebuild_table()
+        node = self.size
+        self.visits[node] = 0
+        self.values[node] = 0
+        self.key[node] = key
+        self.first_edge[node] = -1
+        self.num_edges[node] = 0
+        self.size += 1
+        self._insert(node)
+        return node
+
+    def get_or_add(self, key) -> int:
+        node = self.lookup(key)
+        return node if node >= 0 else self.add_node(key)
+
+    # 展开与选择
+
+    def is_expanded(self, node):
+        return self.first_edge[node] >= 0
+
+    def expand(self, node, moves, priors=None) -> int:
+        """
+        Stores one edge per move under `node` and returns the first edge index.
+        Child nodes are created when an edge is first taken. `priors` are the
+        move probabilities used by PUCT, uniform if not given.
+        """
+        count = len(moves)
+        self._grow(self.EDGE_ARRAYS, self, self.edge_size, self.edge_size + count)
+        start, end = self.edge_size, self.edge_size + count
+        self.edge_move[start:end] = [encode_move(move) for move in moves]
+        self.edge_child[start:end] = -1
+        self.edge_visits[start:end] = 0
+        self.edge_prior[start:end] = 1 / count if priors is None else priors
+        self.first_edge[node] = start
+        self.num_edges[node] = count
+        self.edge_size = end
+        return start
+
+    def edges(self, node) -> range:
+        start = self.first_edge[node]
+        return range(start, start + self.num_edges[node]) if start >= 0 else range(0)
+
+    def edge_move_of(self, edge):
+        """
+        The move of `edge`, as (x, y, nx, ny).
+        """
+        return decode_move(self.edge_move[edge])
+
+    def child(self, edge, key) -> int:
+        """
+        Node reached through `edge`, linked through the transposition table
+        the first time the edge is taken. `key` is the key of that position.
+        """
+        node = self.edge_child[edge]
+        if node < 0:
+            node = self.get_or_add(key)
+            self.edge_child[edge] = node
+        return int(node)
+
+    def open_edges(self, node, widening=None) -> int:
+        """
+        How many of the edges of `node` selection may consider. With
+        progressive widening `(k, alpha)` only the first k * visits ** alpha
+        edges are open, so edges should be stored best prior first.
+        """
+        count = int(self.num_edges[node])
+        if widening is None:
+            return count
+        k, alpha = widening
+        return min(count, max(1, int(k * max(self.visits[node], 1) ** alpha)))
+
+    def select_edge(self, node, c=2.0, widening=None) -> int:
+        """
+        Edge with the highest UCT score among the open edges, untried edges
+        first. The mean value comes from the shared child node, exploration
+        from the edge count.
+        """
+        start = self.first_edge[node]
+        end = start + self.open_edges(node, widening)
+        edge_visits = self.edge_visits[start:end]
+        untried = np.flatnonzero(edge_visits == 0)
+        if len(untried):
+            return start + int(untried[0])
+        children = self.edge_child[start:end]
+        child_visits = np.maximum(self.visits[children], 1)
+        scores = self.values[children] / child_visits + np.sqrt(
+            c * np.log(max(self.visits[node], 1)) / edge_visits
+        )
+        return start + int(scores.argmax())
+
+    def select_edge_puct(self, node, c_puct=1.5) -> int:
+        """
+        Edge maximising Q + c_puct * P * sqrt(N) / (1 + n), with the prior P
+        of the edge and Q from the shared child node (0 if not visited yet).
+        """
+        start = self.first_edge[node]
+        end = start + self.num_edges[node]
+        children = self.edge_child[start:end]
+        reached = children >= 0
+        visits = np.where(reached, self.visits[children], 0)
+        values = np.where(reached, self.values[children], 0)
+        q = values / np.maximum(visits, 1)
+        u = (
+            c_puct
+            * self.edge_prior[start:end]
+            * np.sqrt(max(self.visits[node], 1))
+            / (1 + self.edge_visits[start:end])
+        )
+        return start + int((q + u).argmax())
+
+    def backpropagate(self, nodes, edges, value, player):
+        """
+        Adds a result (1 black wins, -1 red wins) along a path.
+        `nodes` runs from the root to the leaf, `edges[i]` leads from
+        nodes[i] to nodes[i + 1], and `player` is the side to move at the leaf.
+        """
+        for i in range(len(nodes) - 1, -1, -1):
+            node = nodes[i]
+            self.visits[node] += 1
+            # 节点的价值从走进这个节点的一方 (-player) 来看
+            self.values[node] -= value * player
+            if i < len(edges):
+                self.edge_visits[edges[i]] += 1
+            player = -player
+
+    def add_virtual_loss(self, nodes, edges, loss=1.0):
+        """
+        Counts a pending playout on a path as a loss for every mover on it,
+        so that other selections running before its result arrives turn to
+        other branches. Undone by remove_virtual_loss with the same arguments.
+        """
+        np.add.at(self.visits, nodes, 1)
+        np.add.at(self.values, nodes, -loss)
+        np.add.at(self.edge_visits, edges, 1)
+
+    def remove_virtual_loss(self, nodes, edges, loss=1.0):
+        np.add.at(self.visits, nodes, -1)
+        np.add.at(self.values, nodes, loss)
+        np.add.at(self.edge_visits, edges, -1)
+
+    def best_edge(self, node) -> int:
+        """
+        Most visited edge of `node`, ties broken by the mean value of the
+        child. -1 if no edge has been taken.
+        """
+        best, best_score = -1, None
+        for edge in self.edges(node):
+            child = self.edge_child[edge]
+            if child < 0 or not self.edge_visits[edge]:
+                continue
+            score = (self.edge_visits[edge], self.values[child] / max(self.visits[child], 1))
+            if best_score is None or score > best_score:
+                best, best_score = edge, score
+        return best
+
+    def find_edge(self, node, move) -> int:
+        code = encode_move(move)
+        for edge in self.edges(node):
+            if self.edge_move[edge] == code:
+                return edge
+        return -1
+
+    def nbytes(self):
+        """
+        Memory held by the arrays, used or not.
+        """
+        arrays = self.NODE_ARRAYS + self.EDGE_ARRAYS + ("_table",)
+        return sum(getattr(self, name).nbytes for name in arrays)
+
+    def is_full(self):
+        """
+        Whether the pool has hit `max_nodes`, or one more iteration might
+        need to grow the arrays past `max_bytes`.
+        """
+        if self.max_nodes is not None and self.size >= self.max_nodes:
+            return True
+        return self._over_memory()
+
+    def _over_memory(self):
+        if self.max_bytes is None:
+            return False
+        extra = 0
+        if self.size + 1 >= len(self.visits):
+            extra += sum(getattr(self, name).nbytes for name in self.NODE_ARRAYS)
+            extra += self._table.nbytes
+        if self.edge_size + MAX_MOVES > len(self.edge_move):
+            extra += sum(getattr(self, name).nbytes for name in self.EDGE_ARRAYS)
+        return self.nbytes() + extra > self.max_bytes
+
+    # 回收
+
+    def compact(self, root, min_visits=0) -> int:
+        """
+        Keeps the nodes reachable from `root` whose visit count is at least
+        `min_visits` (the root is always kept), recycles every other slot and
+        renumbers the nodes with `root` as node 0. Edges into dropped nodes
+        are reset. The arrays are reused, so the pool does not grow.
+        Returns the number of nodes kept.
+        """
+        remap = {root: 0}
+        order = [root]
+        for node in order:
+            start = self.first_edge[node]
+            if start < 0:
+                continue
+            for edge in range(start, start + self.num_edges[node]):
+                child = int(self.edge_child[edge])
+                if child >= 0 and child not in remap and self.visits[child] >= min_visits:
+                    remap[child] = len(order)
+                    order.append(child)
+
+        old_nodes = np.array(order, dtype=np.int64)
+        first_edge = self.first_edge[old_nodes]
+        num_edges = np.where(first_edge >= 0, self.num_edges[old_nodes], 0)
+        offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(num_edges, out=offsets[1:])
+        old_edges = (
+            np.repeat(first_edge.astype(np.int64) - offsets[:-1], num_edges)
+            + np.arange(offsets[-1])
+        )
+
+        # 右边的花式索引先复制出来, 原地写回前面的槽位是安全的
+        for name in self.NODE_ARRAYS:
+            array = getattr(self, name)
+            array[: len(order)] = array[old_nodes]
+        self.first_edge[: len(order)] = np.where(first_edge >= 0, offsets[:-1], -1)
+        for name in self.EDGE_ARRAYS:
+            array = getattr(self, name)
+            array[: len(old_edges)] = array[old_edges]
+        children = self.edge_child[: len(old_edges)]
+        mapped = np.array([remap.get(int(child), -1) for child in children], dtype=np.int32)
+        self.edge_child[: len(old_edges)] = mapped
+        self.edge_visits[: len(old_edges)][mapped < 0] = 0
+
+        self.size = len(order)
+        self.edge_size = len(old_edges)
+        self._rebuild_table()
+        return self.size
+
+    def reset(self, key) -> int:
+        """
+        Recycles every node and starts over from the root position `key`.
+        """
+        self.size = 0
+        self.edge_size = 0
+        self._table[:] = -1
+        return self.add_node(key)
+
+    def evict(self, root=0, keep=0.5) -> int:
+        """
+        Prunes the least visited leaves until about `keep` of the pool is in
+        use. Visit counts only shrink going down a path, so raising a visit
+        threshold cuts the graph from the leaves upwards; nodes cut off from
+        the root go with them. Returns the number of nodes kept.
+        """
+        self.evictions += 1
+        target = int(min(self.max_nodes or self.size, self.size) * keep)
+        visits = np.sort(self.visits[: self.size])[::-1]
+        min_visits = int(visits[target]) + 1 if self.size > target else 0
+        return self.compact(root, min_visits)
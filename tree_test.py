@@ -0,0 +1,140 @@
+import unittest
+
+from tree import ArrayTree, decode_move, encode_move
+
+
+class ArrayTreeTest(unittest.TestCase):
+    def test_move_codes(self):
+        for move in [(0, 0, 1, 0), (9, 8, 0, 0), (7, 1, 0, 1)]:
+            self.assertEqual(decode_move(encode_move(move)), move)
+
+    def test_expand_select_backpropagate(self):
+        tree = ArrayTree(capacity=2)
+        root = tree.add_node(100)
+        moves = [(6, 0, 5, 0), (6, 2, 5, 2), (6, 4, 5, 4)]
+        first = tree.expand(root, moves)
+        self.assertEqual(list(tree.edges(root)), [first, first + 1, first + 2])
+        self.assertEqual(tree.select_edge(root), first)
+        children = [tree.child(first + i, 200 + i) for i in range(3)]
+        self.assertEqual(children, [1, 2, 3])
+        # 根节点黑方走, 黑胜对走进子节点的黑方记 +1
+        tree.backpropagate([root, 1], [first], 1, -1)
+        tree.backpropagate([root, 2], [first + 1], -1, -1)
+        tree.backpropagate([root, 3], [first + 2], 0, -1)
+        self.assertEqual(tree.visits[root], 3)
+        self.assertEqual(list(tree.values[1:4]), [1, -1, 0])
+        self.assertEqual(tree.select_edge(root), first)
+        self.assertEqual(tree.best_edge(root), first)
+        self.assertEqual(tree.find_edge(root, (6, 4, 5, 4)), first + 2)
+        self.assertEqual(tree.find_edge(root, (6, 6, 5, 6)), -1)
+        self.assertEqual(tree.edge_move_of(first + 1), (6, 2, 5, 2))
+
+    def test_progressive_widening(self):
+        tree = ArrayTree()
+        root = tree.add_node(1)
+        first = tree.expand(root, [(6, 0, 5, 0), (6, 2, 5, 2), (6, 4, 5, 4), (6, 6, 5, 6)])
+        self.assertEqual(tree.open_edges(root), 4)
+        self.assertEqual(tree.open_edges(root, (1.0, 0.5)), 1)
+        child = tree.child(first, 2)
+        tree.backpropagate([root, child], [first], 1, -1)
+        # 只开放了第一个走法, 即使其余走法都没试过
+        self.assertEqual(tree.select_edge(root, widening=(1.0, 0.5)), first)
+        for _ in range(3):
+            tree.backpropagate([root, child], [first], 1, -1)
+        self.assertEqual(tree.open_edges(root, (1.0, 0.5)), 2)
+        self.assertEqual(tree.select_edge(root, widening=(1.0, 0.5)), first + 1)
+
+    def test_puct(self):
+        tree = ArrayTree()
+        root = tree.add_node(1)
+        first = tree.expand(root, [(6, 0, 5, 0), (6, 2, 5, 2)], [0.2, 0.8])
+        self.assertEqual(tree.select_edge_puct(root), first + 1)
+        child = tree.child(first + 1, 2)
+        for _ in range(5):
+            tree.backpropagate([root, child], [first + 1], 1, 1)
+        # 走进子节点的红方一直输, 先验小的走法也会被选中
+        self.assertEqual(tree.select_edge_puct(root), first)
+        self.assertAlmostEqual(float(tree.edge_prior[tree.expand(child, [(3, 0, 4, 0)])]), 1)
+
+    def test_transposition_shares_node(self):
+        tree = ArrayTree()
+        root = tree.add_node(1)
+        tree.expand(root, [(6, 0, 5, 0), (6, 2, 5, 2)])
+        left = tree.child(tree.first_edge[root], 10)
+        right = tree.child(tree.first_edge[root] + 1, 11)
+        a = tree.expand(left, [(6, 2, 5, 2)])
+        b = tree.expand(right, [(6, 0, 5, 0)])
+        # 两种走法次序到达同一局面
+        self.assertEqual(tree.child(a, 12), tree.child(b, 12))
+        shared = tree.lookup(12)
+        self.assertEqual(len(tree), 4)
+        tree.backpropagate([root, left, shared], [tree.first_edge[root], a], 1, 1)
+        tree.backpropagate([root, right, shared], [tree.first_edge[root] + 1, b], 1, 1)
+        self.assertEqual(tree.visits[shared], 2)
+        # 只有走过的父节点和边被更新
+        self.assertEqual((tree.visits[left], tree.visits[right]), (1, 1))
+        self.assertEqual((tree.edge_visits[a], tree.edge_visits[b]), (1, 1))
+        self.assertEqual(tree.lookup(99), -1)
+
+    def test_compact_and_evict(self):
+        tree = ArrayTree(capacity=2, max_nodes=4)
+        root = tree.add_node(1)
+        first = tree.expand(root, [(6, 0, 5, 0), (6, 2, 5, 2), (6, 4, 5, 4)])
+        for i, wins in enumerate([3, 1, 0]):
+            child = tree.child(first + i, 10 + i)
+            for _ in range(wins + 1):
+                tree.backpropagate([root, child], [first + i], 1, -1)
+        grandchild = tree.expand(tree.lookup(10), [(3, 0, 4, 0)])
+        tree.child(grandchild, 20)
+        self.assertTrue(tree.is_full())
+        tree.evict()
+        self.assertEqual(tree.evictions, 1)
+        self.assertLessEqual(len(tree), 2)
+        self.assertEqual(tree.key[0], 1)
+        self.assertEqual(tree.lookup(10), 1)
+        self.assertEqual(tree.lookup(12), -1)
+        # 被回收的子节点的边保留走法, 下次经过时重新建立
+        edge = tree.find_edge(0, (6, 4, 5, 4))
+        self.assertEqual((tree.edge_child[edge], tree.edge_visits[edge]), (-1, 0))
+
+        node = tree.lookup(10)
+        kept = tree.compact(node)
+        self.assertEqual(kept, 1)
+        self.assertEqual(tree.key[0], 10)
+        self.assertEqual(tree.edge_move_of(tree.first_edge[0]), (3, 0, 4, 0))
+
+    def test_pool_is_reused(self):
+        tree = ArrayTree(capacity=16)
+        root = tree.add_node(1)
+        first = tree.expand(root, [(6, 0, 5, 0), (6, 2, 5, 2)])
+        for i in range(2):
+            child = tree.child(first + i, 10 + i)
+            tree.expand(child, [(3, 0, 4, 0)])
+            tree.backpropagate([root, child], [first + i], 1, -1)
+        visits = tree.visits
+        tree.compact(tree.lookup(11))
+        self.assertIs(tree.visits, visits)
+        self.assertEqual((len(tree), tree.edge_size), (1, 1))
+        self.assertEqual(tree.visits[0], 1)
+        self.assertEqual(tree.reset(5), 0)
+        self.assertEqual((len(tree), tree.edge_size, tree.lookup(11)), (1, 0, -1))
+
+    def test_memory_ceiling(self):
+        with self.assertRaises(ValueError):
+            ArrayTree(capacity=16, max_bytes=1)
+        # 上限低于初始数组时按上限缩小容量, 空的节点池不能一开始就满
+        full = ArrayTree().nbytes()
+        tree = ArrayTree(max_bytes=full // 2)
+        self.assertLessEqual(tree.nbytes(), full // 2)
+        tree.add_node(1)
+        self.assertFalse(tree.is_full())
+        tree = ArrayTree(capacity=16)
+        # 只够边数组再扩一次, 节点数组和边数组都要扩时就满了
+        tree.max_bytes = tree.nbytes() * 2 - 1
+        self.assertFalse(tree.is_full())
+        for key in range(15):
+            tree.add_node(key)
+        self.assertTrue(tree.is_full())
+
+
+unittest.main()
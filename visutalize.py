@@ -1,3 +1,4 @@
+import random
 import time
 from PIL import Image
 import numpy as np
@@ -10,7 +11,7 @@ class MoveSeries:
         """
         Initializes the MoveSeries with the initial state of the board.
 
-        :param init_state: The initial state of the board.
+        :param init_state: The initial State of the board.
         """
         self.state = init_state
         self.move_series = []
@@ -23,6 +24,30 @@ class MoveSeries:
         """
         self.move_series.append(move)
 
+    def save(self, path, result=None, metadata=None):
+        """
+        Appends the series to a game record file (see game_record.py).
+
+        :return: The number of the game in the file.
+        """
+        from game_record import GameWriter
+
+        with GameWriter(path) as writer:
+            return writer.write(self.state, self.move_series, result, metadata)
+
+    @classmethod
+    def load(cls, path, index):
+        """
+        Reads game `index` of a game record file back into a MoveSeries.
+        """
+        from game_record import GameReader
+
+        record = GameReader(path)[index]
+        series = cls(record.start)
+        for x, y, nx, ny in record.moves:
+            series.add_move(((x, y), (nx, ny)))
+        return series
+
     def make_video(self):
         """
         Generates a video of the move series.
@@ -33,10 +58,11 @@ class MoveSeries:
         video_folder = f"/tmp/{time_stamp}"
         os.makedirs(video_folder, exist_ok=True)
         video_filename = f"{video_folder}/chess_video.mp4"
+        state = self.state
         for ind, (from_pos, to_pos) in enumerate(self.move_series):
-            self.state = StateMachine.make_move(self.state, from_pos, to_pos)
+            state = state.apply_move(from_pos, to_pos)
             Visualize.render_board_with_state(
-                self.state, filename=f"{video_folder}/frame_{ind:03d}.png"
+                state.state, filename=f"{video_folder}/frame_{ind:03d}.png"
             )
             print(f"Frame {ind} generated.")
         # Generate video from images
@@ -108,30 +134,19 @@ if __name__ == "__main__":
         ["黑车", "黑马", "一一", "一一", "黑帅", "一一", "一一", "一一", "一一"],
         ["一一", "一一", "一一", "黑士", "一一", "黑士", "黑象", "黑马", "一一"],
     ]
-    init_state_matrix = [
-        ["红车", "红马", "红象", "红士", "红帅", "红士", "红象", "红马", "红车"],
-        ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
-        ["一一", "红炮", "一一", "一一", "一一", "一一", "一一", "红炮", "一一"],
-        ["红兵", "一一", "红兵", "一一", "红兵", "一一", "红兵", "一一", "红兵"],
-        ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
-        ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
-        ["黑兵", "一一", "黑兵", "一一", "黑兵", "一一", "黑兵", "一一", "黑兵"],
-        ["一一", "黑炮", "一一", "一一", "一一", "一一", "一一", "黑炮", "一一"],
-        ["一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一", "一一"],
-        ["黑车", "黑马", "黑象", "黑士", "黑帅", "黑士", "黑象", "黑马", "黑车"],
-    ]
-    # steps = 120
-    # move_series = MoveSeries(init_state_matrix)
-    # players = ["红", "黑"]
-    # for _ in range(steps):
-    #     move = StateMachine.get_a_random_mutate(
-    #         init_state_matrix, players[[0, 1][_ % 2]]
-    #     )
-    #     if move:
-    #         from_pos, to_pos = move
-    #         move_series.add_move(move)
-    #         init_state_matrix = StateMachine.make_move(
-    #             init_state_matrix, from_pos, to_pos
-    #         )
-    # video_filename = move_series.make_video()
-    # print(f"Video saved as {video_filename}")
+    from board import INITIAL_PLAYER, INITIAL_STATE
+    from state import State, StateMachine
+
+    steps = 120
+    # 从标准开局起黑方先走, 双方随机走棋
+    state = State(INITIAL_STATE, INITIAL_PLAYER)
+    move_series = MoveSeries(state)
+    for _ in range(steps):
+        moves = list(StateMachine.get_all_legal_moves(state))
+        if not moves:
+            break
+        x, y, nx, ny = random.choice(moves)
+        move_series.add_move(((x, y), (nx, ny)))
+        state = state.apply_move((x, y), (nx, ny))
+    video_filename = move_series.make_video()
+    print(f"Video saved as {video_filename}")
@@ -0,0 +1,38 @@
+import random
+
+from board import SQUARES
+
+# 固定种子, 保证同一局面在不同进程里得到相同的 key
+_rng = random.Random(0x5EED)
+
+PIECE_KEYS = [[_rng.getrandbits(64) for _ in range(SQUARES)] for _ in range(16)]
+for _sq in range(SQUARES):
+    PIECE_KEYS[0][_sq] = 0
+SIDE_KEY = _rng.getrandbits(64)
+
+
+def board_key(board, player) -> int:
+    """
+    Computes the 64-bit Zobrist key of a position from scratch.
+    The side key is mixed in when black (player 1) is to move.
+    """
+    key = SIDE_KEY if player == 1 else 0
+    for sq, code in enumerate(board):
+        if code:
+            key ^= PIECE_KEYS[code][sq]
+    return key
+
+
+def move_key(key, board, src, dst) -> int:
+    """
+    Returns the key after moving the piece on `src` to `dst`, in O(1).
+    `board` is the position before the move.
+    """
+    piece = board[src]
+    return (
+        key
+        ^ PIECE_KEYS[piece][src]
+        ^ PIECE_KEYS[piece][dst]
+        ^ PIECE_KEYS[board[dst]][dst]
+        ^ SIDE_KEY
+    )